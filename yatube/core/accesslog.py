@@ -0,0 +1,221 @@
+"""Журнал запросов в формате JSONL.
+
+AccessLogMiddleware кладёт по одной компактной записи на запрос
+в очередь в памяти, а фоновый поток раз в ACCESS_LOG_FLUSH_INTERVAL
+секунд дописывает накопленное в ACCESS_LOG_FILE. Запрос не ждёт диска:
+если очередь переполнена, запись отбрасывается и считается.
+Файл открывается заново при каждой записи, поэтому его можно
+ротировать переименованием; пачка записей дописывается одним write
+в режиме O_APPEND, так что строки нескольких процессов не перемешиваются.
+Разбор — manage.py analyze_access_log.
+
+Поля записи: t — время начала (Unix), route — имя маршрута, m — метод,
+p — путь, s — статус, ms — время ответа, db_ms и q — время и число
+SQL-запросов, b — размер тела, u — anon/user/staff, c — кэш:
+hit, miss, partial или none.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+from django.conf import settings
+
+from .metrics import registry as metrics
+
+logger = logging.getLogger(__name__)
+
+
+class AccessLogWriter:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Начинает с чистого листа; вызывается в процессе после fork.
+
+        Поток писателя в дочерний процесс не переходит, а очередь
+        с записями родителя допишет сам родитель.
+        """
+        self.queue = None
+        self.lock = threading.Lock()
+        self.thread = None
+        self.dropped = 0
+        self.written = 0
+
+    def start(self):
+        with self.lock:
+            if self.thread is not None and self.thread.is_alive():
+                return
+            if self.queue is None:
+                self.queue = queue.Queue(
+                    maxsize=settings.ACCESS_LOG_QUEUE_SIZE
+                )
+            self.thread = threading.Thread(
+                target=self.run, name='access-log', daemon=True
+            )
+            self.thread.start()
+
+    def write(self, record):
+        thread = self.thread
+        if thread is None or not thread.is_alive():
+            self.start()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self.lock:
+                self.dropped += 1
+
+    def run(self):
+        while True:
+            time.sleep(settings.ACCESS_LOG_FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Журнал запросов не записан')
+
+    def flush(self):
+        """Дописывает накопленные записи в файл."""
+        if self.queue is None or not settings.ACCESS_LOG_FILE:
+            return 0
+        lines = []
+        while True:
+            try:
+                record = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            lines.append(
+                json.dumps(record, ensure_ascii=False, separators=(',', ':'))
+            )
+        if not lines:
+            return 0
+        data = ('\n'.join(lines) + '\n').encode()
+        fd = os.open(
+            settings.ACCESS_LOG_FILE,
+            os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+            0o644,
+        )
+        try:
+            while data:
+                data = data[os.write(fd, data):]
+        finally:
+            os.close(fd)
+        with self.lock:
+            self.written += len(lines)
+        return len(lines)
+
+
+access_log = AccessLogWriter()
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=access_log.reset)
+
+
+@atexit.register
+def flush_on_exit():
+    try:
+        access_log.flush()
+    except Exception:
+        pass
+
+
+@metrics.collector
+def collect_access_log():
+    yield (
+        'yatube_access_log_dropped',
+        'Записи журнала запросов, отброшенные при переполненной очереди',
+        {}, access_log.dropped,
+    )
+
+
+def user_kind(request):
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return 'anon'
+    return 'staff' if user.is_staff else 'user'
+
+
+def cache_outcome(stats):
+    if stats is None or not stats.cache_hits + stats.cache_misses:
+        return 'none'
+    if not stats.cache_misses:
+        return 'hit'
+    return 'partial' if stats.cache_hits else 'miss'
+
+
+class CountingIterator:
+    """Тело потокового ответа, которое считает байты и в конце пишет запись.
+
+    on_close вызывается один раз: когда тело отправлено целиком или
+    когда сервер закрыл ответ, не дочитав его.
+    """
+
+    def __init__(self, content, on_close):
+        self.content = content
+        self.on_close = on_close
+        self.size = 0
+        self.closed = False
+
+    def __iter__(self):
+        try:
+            for chunk in self.content:
+                self.size += len(chunk)
+                yield chunk
+        finally:
+            self.close()
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.on_close(self.size)
+
+
+class AccessLogMiddleware:
+    """Пишет запись о каждом запросе; включается заданием ACCESS_LOG_FILE.
+
+    Время SQL и обращения к кэшу берутся у core.metrics.MetricsMiddleware,
+    поэтому этот middleware должен стоять перед ним.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.ACCESS_LOG_FILE:
+            return self.get_response(request)
+        started_at = time.time()
+        started = time.perf_counter()
+        response = self.get_response(request)
+
+        def log(size):
+            access_log.write(self.record(
+                request, response, started_at,
+                time.perf_counter() - started, size,
+            ))
+
+        if response.streaming:
+            # Запись — когда тело отправлено целиком
+            response.streaming_content = CountingIterator(
+                response.streaming_content, log
+            )
+        else:
+            log(len(response.content))
+        return response
+
+    def record(self, request, response, started_at, elapsed, size):
+        stats = getattr(request, 'stats', None)
+        match = getattr(request, 'resolver_match', None)
+        return {
+            't': round(started_at, 3),
+            'route': match.view_name if match is not None else '',
+            'm': request.method,
+            'p': request.path,
+            's': response.status_code,
+            'ms': round(elapsed * 1000, 2),
+            'db_ms': round(stats.query_time * 1000, 2) if stats else None,
+            'q': stats.queries if stats else None,
+            'b': size,
+            'u': user_kind(request),
+            'c': cache_outcome(stats),
+        }
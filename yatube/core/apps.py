@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        # Подключаем обработчики сигналов настройки SQLite и сессий
+        from . import sessions, sqlite  # noqa: F401
@@ -0,0 +1,58 @@
+"""PostgreSQL с пулом соединений внутри процесса.
+
+Настройки пула задаются ключом POOL в DATABASES:
+size — максимум соединений, timeout — сколько ждать свободное,
+health_check — проверять ли соединение запросом перед выдачей.
+"""
+from django.db.backends.postgresql import base
+
+from core.pool import get_pool
+
+DEFAULT_POOL = {
+    'size': 10,
+    'timeout': 5.0,
+    'health_check': True,
+}
+
+
+def is_alive(connection):
+    if connection.closed:
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+    # Проверка не должна оставлять открытую транзакцию
+    connection.rollback()
+    return True
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def pool(self, conn_params):
+        options = dict(DEFAULT_POOL, **self.settings_dict.get('POOL', {}))
+        return get_pool(
+            self.alias,
+            lambda: super(DatabaseWrapper, self).get_new_connection(
+                conn_params
+            ),
+            size=options['size'],
+            timeout=options['timeout'],
+            check=is_alive if options['health_check'] else None,
+        )
+
+    def get_new_connection(self, conn_params):
+        self._pool = self.pool(conn_params)
+        return self._pool.checkout()
+
+    def _close(self):
+        """Возвращает соединение в пул вместо закрытия."""
+        if self.connection is None:
+            return
+        connection = self.connection
+        broken = bool(connection.closed)
+        if not broken:
+            try:
+                connection.rollback()
+                if not connection.autocommit:
+                    connection.autocommit = True
+            except base.Database.Error:
+                broken = True
+        self._pool.checkin(connection, discard=broken)
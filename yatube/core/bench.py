@@ -0,0 +1,103 @@
+import gc
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import (CaptureQueriesContext, setup_test_environment,
+                               teardown_test_environment)
+
+DEFAULT_BASELINE = os.path.join(
+    settings.BASE_DIR, 'benchmarks', 'baseline.json'
+)
+# Объём данных подобран так, чтобы прогон занимал десятки секунд
+SEED_OPTIONS = (
+    '--users=300', '--groups=10', '--posts=5000', '--comments=5000',
+    '--follows=2000', '--image-ratio=0.1', '--seed=1',
+)
+
+
+@contextmanager
+def seeded_database(seed_options=SEED_OPTIONS):
+    """Временная тестовая база с данными seed_data и отдельным MEDIA_ROOT."""
+    media_root = tempfile.mkdtemp()
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(
+        verbosity=0, autoclobber=True, serialize=False
+    )
+    try:
+        with override_settings(MEDIA_ROOT=media_root):
+            call_command('seed_data', *seed_options, stdout=StringIO())
+            yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+        shutil.rmtree(media_root, ignore_errors=True)
+
+
+def measure(func, repeat=20, warmup=3, clear_cache=True):
+    """Медиана времени вызова в миллисекундах и число SQL-запросов."""
+    for _ in range(warmup):
+        func()
+    timings = []
+    queries = 0
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            if clear_cache:
+                cache.clear()
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                func()
+                timings.append((time.perf_counter() - started) * 1000)
+            queries = len(captured)
+    finally:
+        gc.enable()
+    return {
+        'ms': round(statistics.median(timings), 3),
+        'queries': queries,
+    }
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as source:
+        return json.load(source)
+
+
+def save_baseline(path, results):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as target:
+        json.dump(results, target, indent=2, sort_keys=True)
+        target.write('\n')
+
+
+def find_regressions(baseline, results, time_tolerance, query_tolerance):
+    """Сравнивает замеры с базовыми и возвращает список регрессий."""
+    regressions = []
+    for name, current in sorted(results.items()):
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        time_limit = previous['ms'] * (1 + time_tolerance)
+        if current['ms'] > time_limit:
+            regressions.append(
+                f'{name}: {current["ms"]:.2f} мс > '
+                f'{previous["ms"]:.2f} мс + {time_tolerance:.0%}'
+            )
+        if current['queries'] > previous['queries'] + query_tolerance:
+            regressions.append(
+                f'{name}: {current["queries"]} запросов > '
+                f'{previous["queries"]}'
+            )
+    return regressions
@@ -0,0 +1,49 @@
+"""Бэкенды кэша, которые считают попадания и промахи для метрик.
+
+Метка cache в метриках — LOCATION из настроек кэша.
+"""
+import threading
+
+from django.core.cache import InvalidCacheBackendError, caches
+from django.core.cache.backends.locmem import LocMemCache as BaseLocMemCache
+
+from .metrics import record_cache
+
+MISSING = object()
+
+
+class InstrumentedCacheMixin:
+    def __init__(self, location, params):
+        super().__init__(location, params)
+        self.metrics_name = location or 'default'
+        # get_many базового класса вызывает get: не считаем дважды
+        self._nested = threading.local()
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, MISSING, version)
+        if not getattr(self._nested, 'active', False):
+            hit = value is not MISSING
+            record_cache(self.metrics_name, int(hit), int(not hit))
+        return default if value is MISSING else value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        self._nested.active = True
+        try:
+            found = super().get_many(keys, version)
+        finally:
+            self._nested.active = False
+        record_cache(self.metrics_name, len(found), len(keys) - len(found))
+        return found
+
+
+class LocMemCache(InstrumentedCacheMixin, BaseLocMemCache):
+    pass
+
+
+def fragment_cache():
+    """Кэш, в который пишет тег {% cache %}."""
+    try:
+        return caches['template_fragments']
+    except InvalidCacheBackendError:
+        return caches['default']
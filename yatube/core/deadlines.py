@@ -0,0 +1,135 @@
+"""Ограничение времени SQL-запросов в рамках одного HTTP-запроса.
+
+У каждого view есть бюджет времени: атрибут query_deadline, заданный
+декоратором, значение из QUERY_DEADLINES по имени маршрута или
+QUERY_DEADLINE_DEFAULT. Для SQLite бюджет соблюдается через
+progress handler, который прерывает запрос, вышедший за срок. Обработчик
+стоит до конца запроса, а не только на время execute: строки большой
+выборки SQLite вычисляет уже при fetchmany.
+"""
+import logging
+import sqlite3
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import OperationalError, connections
+from django.shortcuts import render
+
+logger = logging.getLogger(__name__)
+
+# Через сколько инструкций виртуальной машины SQLite проверять время
+PROGRESS_STEPS = 1000
+
+
+class QueryDeadlineExceeded(Exception):
+    def __init__(self, sql, budget):
+        super().__init__(f'Запрос прерван после {budget} с: {sql}')
+        self.sql = sql
+        self.budget = budget
+
+
+def interrupted(error):
+    """Прервал ли SQLite запрос по progress handler."""
+    return isinstance(error, OperationalError) and 'interrupted' in str(error)
+
+
+def query_deadline(seconds):
+    """Задаёт бюджет времени на SQL для view."""
+    def decorator(view):
+        view.query_deadline = seconds
+        return view
+    return decorator
+
+
+def deadline_for(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return settings.QUERY_DEADLINE_DEFAULT
+    budget = getattr(match.func, 'query_deadline', None)
+    if budget is None:
+        budget = settings.QUERY_DEADLINES.get(
+            match.view_name, settings.QUERY_DEADLINE_DEFAULT
+        )
+    return budget
+
+
+class DeadlineWrapper:
+    """execute_wrapper, прерывающий запросы после наступления срока.
+
+    get_budget возвращает пару (начало отсчёта, бюджет в секундах);
+    бюджет None отключает ограничение.
+    """
+
+    def __init__(self, get_budget):
+        self.get_budget = get_budget
+        self.installed = set()
+
+    def __call__(self, execute, sql, params, many, context):
+        started, budget = self.get_budget()
+        db = context['connection']
+        if db.vendor != 'sqlite':
+            return execute(sql, params, many, context)
+        raw = db.connection
+        if budget is None:
+            raw.set_progress_handler(None, 0)
+            return execute(sql, params, many, context)
+        deadline = started + budget
+        raw.set_progress_handler(
+            lambda: time.monotonic() > deadline, PROGRESS_STEPS
+        )
+        self.installed.add(raw)
+        try:
+            return execute(sql, params, many, context)
+        except OperationalError as error:
+            if not interrupted(error):
+                raise
+            logger.warning(
+                'SQL прерван по сроку %s с: %s; параметры %r',
+                budget, sql, params,
+            )
+            raise QueryDeadlineExceeded(sql, budget) from error
+
+    def uninstall(self):
+        """Снимает обработчики; вызывается, когда выборки закончены."""
+        for raw in self.installed:
+            try:
+                raw.set_progress_handler(None, 0)
+            except sqlite3.ProgrammingError:
+                pass  # Соединение уже закрыто
+        self.installed.clear()
+
+
+class QueryDeadlineMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.monotonic()
+
+        def get_budget():
+            if getattr(request, 'query_deadline_exceeded', False):
+                return started, None
+            return started, deadline_for(request)
+
+        wrapper = DeadlineWrapper(get_budget)
+        with ExitStack() as stack:
+            stack.callback(wrapper.uninstall)
+            for alias in connections:
+                stack.enter_context(
+                    connections[alias].execute_wrapper(wrapper)
+                )
+            return self.get_response(request)
+
+    def process_exception(self, request, exception):
+        """Вместо 500 отдаёт облегчённую страницу с Retry-After."""
+        if interrupted(exception):
+            # Прервана выборка строк, а не execute
+            logger.warning('Выборка строк прервана по сроку: %s', request.path)
+        elif not isinstance(exception, QueryDeadlineExceeded):
+            return None
+        # Страницу-заглушку рендерим уже без ограничения
+        request.query_deadline_exceeded = True
+        response = render(request, 'core/503.html', status=503)
+        response['Retry-After'] = settings.QUERY_DEADLINE_RETRY_AFTER
+        return response
@@ -0,0 +1,97 @@
+"""Окружение Jinja2 для горячих шаблонов ленты (каталог jinja2/).
+
+Глобальные функции и фильтры повторяют теги Django, которыми пользуются
+шаблоны: url, static, thumbnail, date, linebreaksbr и addclass, а тег
+{% cache %} пишет в тот же кэш фрагментов, что и Django. Вывод
+экранируется функцией Django, чтобы HTML совпадал байт в байт.
+"""
+import logging
+
+from django.core.cache.utils import make_template_fragment_key
+from django.template import defaultfilters
+from django.templatetags.static import static
+from django.urls import reverse
+from django.utils.html import conditional_escape
+from jinja2 import ChainableUndefined, Environment, nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+from sorl.thumbnail import get_thumbnail
+
+from core.cache import fragment_cache
+from core.templatetags.user_filters import addclass
+
+logger = logging.getLogger(__name__)
+
+
+def url(name, *args, **kwargs):
+    return reverse(name, args=args or None, kwargs=kwargs or None)
+
+
+def thumbnail(image, geometry, **options):
+    """Миниатюра как у {% thumbnail %}: None, если картинки нет."""
+    if not image:
+        return None
+    try:
+        return get_thumbnail(image, geometry, **options)
+    except Exception:
+        logger.exception('Не удалось построить миниатюру %s', image)
+        return None
+
+
+def linebreaksbr(value):
+    # Строки, уже помеченные как безопасные, не экранируются повторно
+    return defaultfilters.linebreaksbr(
+        value, autoescape=not isinstance(value, Markup)
+    )
+
+
+def finalize(value):
+    """Экранирует вывод как Django: &#39; и &quot; вместо &#34;."""
+    return conditional_escape(value)
+
+
+class FragmentCacheExtension(Extension):
+    """{% cache 20 'index_page' %}...{% endcache %} с ключами Django."""
+
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        timeout = parser.parse_expression()
+        name = parser.parse_expression()
+        vary_on = []
+        while parser.stream.current.type != 'block_end':
+            vary_on.append(parser.parse_expression())
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        call = self.call_method(
+            '_cache', [timeout, name, nodes.List(vary_on)]
+        )
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _cache(self, timeout, name, vary_on, caller):
+        cache = fragment_cache()
+        key = make_template_fragment_key(name, vary_on)
+        value = cache.get(key)
+        if value is None:
+            value = str(caller())
+            cache.set(key, value, timeout)
+        return Markup(value)
+
+
+def environment(**options):
+    # Пустые переменные и их атрибуты выводятся пустой строкой, как в Django
+    options['undefined'] = ChainableUndefined
+    options['finalize'] = finalize
+    options.setdefault('extensions', []).append(FragmentCacheExtension)
+    env = Environment(**options)
+    env.globals.update({
+        'url': url,
+        'static': static,
+        'thumbnail': thumbnail,
+    })
+    env.filters.update({
+        'addclass': addclass,
+        'date': defaultfilters.date,
+        'linebreaksbr': linebreaksbr,
+    })
+    return env
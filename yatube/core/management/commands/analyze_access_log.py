@@ -0,0 +1,213 @@
+import gzip
+import heapq
+import json
+import re
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.stats import summarize
+
+RELATIVE_TIME = re.compile(r'^(\d+(?:\.\d+)?)([smhd])$')
+UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+SORT_KEYS = ('p50', 'p95', 'p99', 'max', 'count', 'total')
+REQUIRED = ('t', 'ms', 's')  # Без этих полей запись не учитывается
+
+
+def parse_time(value):
+    """'15m', '2h', '1d' — столько назад от текущего момента, иначе ISO."""
+    match = RELATIVE_TIME.match(value)
+    if match:
+        return time.time() - float(match.group(1)) * UNITS[match.group(2)]
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise CommandError(f'Не удалось разобрать время: {value}')
+
+
+def parse_record(line):
+    """Запись журнала или None, если строка повреждена."""
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return None
+    if not isinstance(record, dict):
+        return None
+    if any(not isinstance(record.get(key), (int, float)) for key in REQUIRED):
+        return None
+    return record
+
+
+def open_log(path):
+    if path == '-':
+        return sys.stdin
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, encoding='utf-8')
+
+
+class RouteStats:
+    def __init__(self, top):
+        self.top = top
+        self.latencies = []
+        self.errors = 0
+        self.db_ms = 0.0
+        self.queries = 0
+        self.cache_hits = 0
+        self.slowest = []  # Куча из top самых медленных запросов
+
+    def add(self, record):
+        ms = record['ms']
+        self.latencies.append(ms)
+        if record['s'] >= 500:
+            self.errors += 1
+        self.db_ms += record.get('db_ms') or 0
+        self.queries += record.get('q') or 0
+        if record.get('c') == 'hit':
+            self.cache_hits += 1
+        if self.top <= 0:
+            return
+        item = (ms, len(self.latencies), record)
+        if len(self.slowest) < self.top:
+            heapq.heappush(self.slowest, item)
+        elif ms > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, item)
+
+    def summary(self):
+        summary = summarize(self.latencies)
+        count = summary['count']
+        summary.update(
+            total=sum(self.latencies),
+            errors=self.errors,
+            db_ms=self.db_ms / count,
+            queries=self.queries / count,
+            cache_hits=self.cache_hits / count * 100,
+        )
+        return summary
+
+
+class Command(BaseCommand):
+    help = (
+        'Разбирает журнал запросов (ACCESS_LOG_FILE): p50/p95/p99 по '
+        'маршрутам и самые медленные запросы каждого маршрута за период'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths', nargs='+',
+            help='Файлы журнала, в том числе .gz; «-» — стандартный ввод',
+        )
+        parser.add_argument(
+            '--since', type=parse_time,
+            help='Начало периода: 15m, 2h, 1d назад или дата ISO',
+        )
+        parser.add_argument(
+            '--until', type=parse_time, help='Конец периода, как --since',
+        )
+        parser.add_argument('--route', help='Только этот маршрут')
+        parser.add_argument(
+            '--top', type=int, default=5,
+            help=(
+                'Сколько самых медленных запросов показать на маршрут; '
+                '0 — не показывать'
+            ),
+        )
+        parser.add_argument(
+            '--sort', choices=SORT_KEYS, default='p95',
+            help='Порядок маршрутов; total — суммарное время',
+        )
+        parser.add_argument(
+            '--min-count', type=int, default=1,
+            help='Не показывать маршруты с меньшим числом запросов',
+        )
+
+    def handle(self, *args, **options):
+        if options['top'] < 0:
+            raise CommandError('--top не может быть меньше нуля')
+        routes = defaultdict(lambda: RouteStats(options['top']))
+        first = last = None
+        skipped = 0
+        for record in self.records(options):
+            if record is None:
+                skipped += 1
+                continue
+            routes[record.get('route') or '-'].add(record)
+            first = record['t'] if first is None else min(first, record['t'])
+            last = record['t'] if last is None else max(last, record['t'])
+        if first is None:
+            self.stdout.write('Нет записей за указанный период')
+            return
+        summaries = {
+            route: stats.summary() for route, stats in routes.items()
+            if len(stats.latencies) >= options['min_count']
+        }
+        self.report(summaries, routes, first, last, skipped, options)
+
+    def records(self, options):
+        """Записи из периода; None — для строк, которые не разобрать."""
+        for path in options['paths']:
+            try:
+                source = open_log(path)
+            except OSError as error:
+                raise CommandError(f'{path}: {error}')
+            with source:
+                for line in source:
+                    if not line.strip():
+                        continue
+                    record = parse_record(line)
+                    if record is None or self.selected(record, options):
+                        yield record
+
+    def selected(self, record, options):
+        return not (
+            options['since'] and record['t'] < options['since']
+            or options['until'] and record['t'] > options['until']
+            or options['route'] and record.get('route') != options['route']
+        )
+
+    def report(self, summaries, routes, first, last, skipped, options):
+        period = ' — '.join(
+            time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(moment))
+            for moment in (first, last)
+        )
+        total = sum(row['count'] for row in summaries.values())
+        self.stdout.write(
+            f'{total} запросов за {period}, маршрутов: {len(summaries)}'
+            + (f', неразобранных строк: {skipped}' if skipped else '')
+        )
+        self.stdout.write(
+            f'{"маршрут":<28}{"запросов":>9}{"5xx":>6}{"p50":>9}'
+            f'{"p95":>9}{"p99":>9}{"max":>9}{"SQL мс":>9}{"SQL":>6}'
+            f'{"кэш %":>7}'
+        )
+        order = sorted(
+            summaries.items(),
+            key=lambda item: item[1][options['sort']],
+            reverse=True,
+        )
+        for route, row in order:
+            self.stdout.write(
+                f'{route:<28}{row["count"]:>9}{row["errors"]:>6}'
+                f'{row["p50"]:>9.1f}{row["p95"]:>9.1f}{row["p99"]:>9.1f}'
+                f'{row["max"]:>9.1f}{row["db_ms"]:>9.1f}'
+                f'{row["queries"]:>6.1f}{row["cache_hits"]:>7.0f}'
+            )
+        if not options['top']:
+            return
+        self.stdout.write('Самые медленные запросы:')
+        for route, row in order:
+            self.stdout.write(f'{route}:')
+            slowest = sorted(routes[route].slowest, reverse=True)
+            for ms, _, record in slowest:
+                moment = time.strftime(
+                    '%Y-%m-%d %H:%M:%S', time.localtime(record['t'])
+                )
+                self.stdout.write(
+                    f'  {ms:>9.1f} мс  {record.get("m", "")} '
+                    f'{record.get("p", "")}  {record["s"]}  '
+                    f'SQL {record.get("q") or 0} '
+                    f'за {record.get("db_ms") or 0:.1f} мс  {moment}'
+                )
@@ -0,0 +1,78 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.template import engines
+from django.test import Client, override_settings
+
+from core.bench import measure, seeded_database
+
+from .benchmark import benchmark_pages, page_context
+
+# Страницы, для которых есть шаблоны в jinja2/, и их view
+HOT_PAGES = {
+    'index': 'posts:index',
+    'index_page_5': 'posts:index',
+    'group_list': 'posts:group_list',
+    'profile': 'posts:profile',
+    'follow_index': 'posts:follow_index',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность горячих страниц ленты '
+        'с шаблонами Django и Jinja2'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        if not settings.JINJA2_AVAILABLE:
+            raise CommandError('Пакет jinja2 не установлен')
+        with seeded_database():
+            self.compare(options)
+
+    def compare(self, options):
+        self.stdout.write(
+            f'{"страница":<14}{"":<10}{"Django":>12}{"Jinja2":>12}'
+            f'{"ускорение":>12}'
+        )
+        pages = benchmark_pages()
+        for name, view_name in HOT_PAGES.items():
+            user, url = pages[name]
+            client = Client()
+            if user is not None:
+                client.force_login(user)
+            view_rates, template_rates = [], []
+            for using in ('django', 'jinja2'):
+                with override_settings(
+                    TEMPLATE_ENGINE_VIEWS={view_name: using}
+                ):
+                    response = client.get(url)
+                    if response.status_code != 200:
+                        raise CommandError(
+                            f'{url}: код ответа {response.status_code}'
+                        )
+                    result = measure(
+                        lambda: client.get(url), repeat=options['repeat']
+                    )
+                view_rates.append(1000 / result['ms'])
+                if using == 'django':
+                    # Контекст берём из ответа, отрендеренного Django
+                    template_name = response.templates[0].name
+                    context = page_context(response)
+                    request = response.wsgi_request
+                template = engines[using].get_template(template_name)
+                result = measure(
+                    lambda: template.render(context, request),
+                    repeat=options['repeat'],
+                )
+                template_rates.append(1000 / result['ms'])
+            for kind, (django_rate, jinja2_rate) in (
+                ('view', view_rates), ('шаблон', template_rates),
+            ):
+                self.stdout.write(
+                    f'{name:<14}{kind:<10}{django_rate:>8.0f} в/с'
+                    f'{jinja2_rate:>8.0f} в/с'
+                    f'{jinja2_rate / django_rate:>11.1f}x'
+                )
@@ -0,0 +1,121 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.sqlite import apply_pragmas
+from core.stats import summarize
+
+ROWS = 20000  # Начальный размер таблицы
+
+
+def prepare(path, pragmas):
+    db = sqlite3.connect(path)
+    apply_pragmas(db.cursor(), pragmas)
+    db.execute(
+        'CREATE TABLE post (id INTEGER PRIMARY KEY, author INTEGER, '
+        'text TEXT, pub_date REAL)'
+    )
+    db.execute('CREATE INDEX post_author ON post (author)')
+    db.executemany(
+        'INSERT INTO post (author, text, pub_date) VALUES (?, ?, ?)',
+        ((i % 100, 'x' * 200, time.time()) for i in range(ROWS)),
+    )
+    db.commit()
+    db.close()
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает SQLite с настройками по умолчанию и с SQLITE_PRAGMAS '
+        'при одновременной работе читателей и писателей'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--duration', type=float, default=5)
+
+    def handle(self, *args, **options):
+        for title, pragmas in (
+            ('по умолчанию', {}),
+            ('SQLITE_PRAGMAS', settings.SQLITE_PRAGMAS),
+        ):
+            directory = tempfile.mkdtemp()
+            path = os.path.join(directory, 'bench.sqlite3')
+            try:
+                prepare(path, pragmas)
+                self.report(title, self.run(path, pragmas, options))
+            finally:
+                shutil.rmtree(directory, ignore_errors=True)
+
+    def run(self, path, pragmas, options):
+        stop = time.monotonic() + options['duration']
+        stats = {
+            'read': [], 'write': [], 'read_errors': 0, 'write_errors': 0,
+        }
+        lock = threading.Lock()
+
+        def worker(kind, number):
+            # Своё соединение на поток, как у Django при CONN_MAX_AGE;
+            # ожидание блокировки задаёт только PRAGMA busy_timeout
+            db = sqlite3.connect(path, timeout=0, isolation_level=None)
+            apply_pragmas(db.cursor(), pragmas)
+            latencies, errors = [], 0
+            while time.monotonic() < stop:
+                started = time.perf_counter()
+                try:
+                    if kind == 'read':
+                        db.execute(
+                            'SELECT id, text FROM post WHERE author = ? '
+                            'ORDER BY pub_date DESC LIMIT 10',
+                            (number % 100,),
+                        ).fetchall()
+                    else:
+                        db.execute('BEGIN IMMEDIATE')
+                        db.execute(
+                            'INSERT INTO post (author, text, pub_date) '
+                            'VALUES (?, ?, ?)',
+                            (number, 'y' * 200, time.time()),
+                        )
+                        db.execute('COMMIT')
+                except sqlite3.OperationalError:
+                    errors += 1
+                    if db.in_transaction:
+                        db.execute('ROLLBACK')
+                    continue
+                latencies.append((time.perf_counter() - started) * 1000)
+            db.close()
+            with lock:
+                stats[kind].extend(latencies)
+                stats[f'{kind}_errors'] += errors
+
+        threads = [
+            threading.Thread(target=worker, args=('read', n))
+            for n in range(options['readers'])
+        ] + [
+            threading.Thread(target=worker, args=('write', n))
+            for n in range(options['writers'])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats['duration'] = options['duration']
+        return stats
+
+    def report(self, title, stats):
+        self.stdout.write(self.style.MIGRATE_HEADING(title))
+        for kind in ('read', 'write'):
+            summary = summarize(stats[kind])
+            rate = summary['count'] / stats['duration']
+            self.stdout.write(
+                f'  {kind:<6}{rate:>10.0f} оп/с'
+                f'  p50 {summary["p50"]:.2f} мс  p99 {summary["p99"]:.2f} мс'
+                f'  ошибок «database is locked»: {stats[f"{kind}_errors"]}'
+            )
@@ -0,0 +1,79 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.template.backends.django import DjangoTemplates
+from django.test import Client, override_settings
+
+from core.bench import measure, seeded_database
+from core.templates import precompile_templates
+from yatube import settings as development
+from yatube import settings_production as production
+
+from .benchmark import benchmark_pages, page_context
+
+
+def make_backend(module):
+    """Движок шаблонов с настройками TEMPLATES из модуля настроек."""
+    params = dict(module.TEMPLATES[0])
+    params.pop('BACKEND')
+    params['NAME'] = module.__name__
+    options = dict(params['OPTIONS'])
+    options.setdefault('debug', module.DEBUG)
+    params['OPTIONS'] = options
+    return DjangoTemplates(params)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает время рендеринга шаблонов каждой страницы с настройками '
+        'разработки (settings) и боевыми (settings_production)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with seeded_database():
+            self.compare(options)
+
+    def compare(self, options):
+        profiles = []
+        for module in (development, production):
+            backend = make_backend(module)
+            started = time.perf_counter()
+            count = 0
+            if getattr(module, 'PRECOMPILE_TEMPLATES', False):
+                count = precompile_templates([backend])
+            elapsed = (time.perf_counter() - started) * 1000
+            self.stdout.write(
+                f'{module.__name__}: debug={backend.engine.debug}, '
+                f'заранее скомпилировано {count} шаблонов за {elapsed:.0f} мс'
+            )
+            profiles.append((module, backend))
+        self.stdout.write(
+            f'{"страница":<16}{"разработка":>14}'
+            f'{"боевые":>12}{"ускорение":>12}'
+        )
+        for name, (user, url) in benchmark_pages().items():
+            client = Client()
+            if user is not None:
+                client.force_login(user)
+            response = client.get(url)
+            if response.status_code != 200:
+                raise CommandError(f'{url}: код ответа {response.status_code}')
+            template_name = response.templates[0].name
+            context = page_context(response)
+            request = response.wsgi_request
+            timings = []
+            for module, backend in profiles:
+                template = backend.get_template(template_name)
+                with override_settings(DEBUG=module.DEBUG):
+                    timings.append(measure(
+                        lambda: template.render(context, request),
+                        repeat=options['repeat'],
+                    )['ms'])
+            development_ms, production_ms = timings
+            self.stdout.write(
+                f'{name:<16}{development_ms:>11.2f} мс{production_ms:>9.2f} мс'
+                f'{development_ms / production_ms:>11.1f}x'
+            )
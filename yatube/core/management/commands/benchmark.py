@@ -0,0 +1,141 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.template.loader import get_template
+from django.test import Client
+from django.test.utils import ContextList
+from django.urls import reverse
+
+from core.bench import (DEFAULT_BASELINE, find_regressions, load_baseline,
+                        measure, save_baseline, seeded_database)
+from posts.models import Group, Post, User
+
+
+def page_context(response):
+    """Плоский контекст шаблона страницы из ответа тестового клиента."""
+    context = response.context
+    if isinstance(context, ContextList):
+        context = context[0]
+    return context.flatten()
+
+
+def benchmark_pages():
+    """Страницы для замера: самые тяжёлые объекты из тестовых данных."""
+    author = User.objects.annotate(
+        count=Count('posts')
+    ).order_by('-count').first()
+    reader = User.objects.annotate(
+        count=Count('follower')
+    ).order_by('-count').first()
+    group = Group.objects.annotate(
+        count=Count('posts')
+    ).order_by('-count').first()
+    post = Post.objects.annotate(
+        count=Count('comment')
+    ).order_by('-count').first()
+    own_post = author.posts.first()
+    return {
+        'index': (None, reverse('posts:index')),
+        'index_page_5': (None, reverse('posts:index') + '?page=5'),
+        'group_list': (
+            None, reverse('posts:group_list', args=(group.slug,))
+        ),
+        'profile': (
+            None, reverse('posts:profile', args=(author.username,))
+        ),
+        'post_detail': (
+            reader, reverse('posts:post_detail', args=(post.id,))
+        ),
+        'follow_index': (reader, reverse('posts:follow_index')),
+        'post_create': (author, reverse('posts:post_create')),
+        'post_edit': (
+            author, reverse('posts:post_edit', args=(own_post.id,))
+        ),
+        'about_author': (None, reverse('about:author')),
+        'signup': (None, reverse('users:signup')),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет время и число запросов каждой страницы и её шаблона '
+        'на тестовых данных и сравнивает с сохранёнными базовыми значениями'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+        parser.add_argument(
+            '--update', action='store_true',
+            help='Записать текущие замеры как новые базовые',
+        )
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument(
+            '--time-tolerance', type=float, default=0.5,
+            help='Допустимый рост времени, доля от базового',
+        )
+        parser.add_argument(
+            '--query-tolerance', type=int, default=0,
+            help='Допустимое число лишних SQL-запросов',
+        )
+        parser.add_argument(
+            '--filter', default='',
+            help='Запускать только замеры, имя которых содержит строку',
+        )
+
+    def handle(self, *args, **options):
+        with seeded_database():
+            results = self.run_cases(options)
+
+        baseline = load_baseline(options['baseline'])
+        for name, result in sorted(results.items()):
+            previous = baseline.get(name, {})
+            self.stdout.write(
+                f'{name:<40}{result["ms"]:>9.2f} мс'
+                f'{result["queries"]:>5} SQL'
+                f'   (было {previous.get("ms", 0):.2f} мс, '
+                f'{previous.get("queries", "-")} SQL)'
+            )
+        if options['update']:
+            baseline.update(results)
+            save_baseline(options['baseline'], baseline)
+            self.stdout.write(self.style.SUCCESS('Базовые значения обновлены'))
+            return
+        regressions = find_regressions(
+            baseline, results,
+            options['time_tolerance'], options['query_tolerance'],
+        )
+        if regressions:
+            raise CommandError(
+                'Регрессии производительности:\n' + '\n'.join(regressions)
+            )
+        self.stdout.write(self.style.SUCCESS('Регрессий нет'))
+
+    def run_cases(self, options):
+        results = {}
+        for name, (user, url) in benchmark_pages().items():
+            client = Client()
+            if user is not None:
+                client.force_login(user)
+            response = client.get(url)
+            if response.status_code != 200:
+                raise CommandError(f'{url}: код ответа {response.status_code}')
+            view_name = f'view:{name}'
+            if options['filter'] in view_name:
+                results[view_name] = measure(
+                    lambda: client.get(url), repeat=options['repeat']
+                )
+            # Тот же шаблон отдельно от view, с контекстом из ответа
+            template_name = response.templates[0].name
+            template_key = f'template:{template_name}'
+            if (
+                template_key in results
+                or options['filter'] not in template_key
+            ):
+                continue
+            template = get_template(template_name)
+            context = page_context(response)
+            request = response.wsgi_request
+            results[template_key] = measure(
+                lambda: template.render(context, request),
+                repeat=options['repeat'],
+            )
+        return results
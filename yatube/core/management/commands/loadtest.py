@@ -0,0 +1,323 @@
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlsplit
+
+import requests
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import Resolver404, resolve, reverse
+
+from core.stats import summarize
+from posts.models import Group, Post
+
+User = get_user_model()
+
+SAMPLE_SIZE = 1000  # Сколько id и имён берём из базы для запросов
+# Доля каждого сценария в общем потоке; ключ — имя сценария
+DEFAULT_MIX = {
+    'index': 30,
+    'group_list': 10,
+    'profile': 15,
+    'post_detail': 20,
+    'about': 5,
+    'follow_index': 8,
+    'profile_follow': 4,
+    'profile_unfollow': 3,
+    'add_comment': 5,
+}
+AUTH_ONLY = {
+    'follow_index',
+    'profile_follow',
+    'profile_unfollow',
+    'add_comment',
+}
+# Какие данные из базы нужны сценарию
+SAMPLE_NEEDS = {
+    'group_list': 'groups',
+    'profile': 'users',
+    'post_detail': 'posts',
+    'profile_follow': 'users',
+    'profile_unfollow': 'users',
+    'add_comment': 'posts',
+}
+
+
+def parse_mix(value):
+    """Разбирает строку вида 'index=30,post_detail=20'."""
+    mix = {}
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        if name not in DEFAULT_MIX:
+            raise CommandError(f'Неизвестный сценарий: {name}')
+        try:
+            mix[name] = float(weight or 1)
+        except ValueError:
+            raise CommandError(f'Вес сценария {name} — не число: {weight}')
+        if mix[name] < 0:
+            raise CommandError(f'Вес сценария {name} меньше нуля')
+    return mix
+
+
+def effective_mix(mix, logged_in):
+    """Сценарии с ненулевым весом, доступные воркеру."""
+    return {
+        name: weight for name, weight in mix.items()
+        if weight > 0 and (logged_in or name not in AUTH_ONLY)
+    }
+
+
+class Worker:
+    """Один виртуальный пользователь со своей HTTP-сессией."""
+
+    def __init__(self, command, credentials, seed=None):
+        self.command = command
+        self.rng = random.Random(seed)
+        self.session = requests.Session()
+        self.logged_in = False
+        if credentials:
+            self.logged_in = self.login(*credentials)
+
+    def url(self, name, *args):
+        return urljoin(self.command.base_url, reverse(name, args=args))
+
+    def login(self, username, password):
+        url = self.url('users:login')
+        self.session.get(url)
+        response = self.session.post(url, data={
+            'username': username,
+            'password': password,
+            'csrfmiddlewaretoken': self.session.cookies.get('csrftoken', ''),
+        }, headers={'Referer': url}, allow_redirects=False)
+        return response.status_code == 302
+
+    def pick(self, values):
+        return self.rng.choice(values)
+
+    def page(self):
+        return {'page': self.rng.randint(1, 5)}
+
+    def request(self, scenario):
+        """Возвращает аргументы запроса для сценария."""
+        sample = self.command.sample
+        if scenario == 'index':
+            return 'get', self.url('posts:index'), self.page()
+        if scenario == 'group_list':
+            slug = self.pick(sample['groups'])
+            return 'get', self.url('posts:group_list', slug), self.page()
+        if scenario == 'profile':
+            username = self.pick(sample['users'])
+            return 'get', self.url('posts:profile', username), self.page()
+        if scenario == 'post_detail':
+            post_id = self.pick(sample['posts'])
+            return 'get', self.url('posts:post_detail', post_id), None
+        if scenario == 'about':
+            name = self.pick(('about:author', 'about:tech'))
+            return 'get', self.url(name), None
+        if scenario == 'follow_index':
+            return 'get', self.url('posts:follow_index'), self.page()
+        if scenario in ('profile_follow', 'profile_unfollow'):
+            username = self.pick(sample['users'])
+            return 'get', self.url(f'posts:{scenario}', username), None
+        post_id = self.pick(sample['posts'])
+        return 'post', self.url('posts:add_comment', post_id), {
+            'text': 'Нагрузочный комментарий',
+            'csrfmiddlewaretoken': self.session.cookies.get('csrftoken', ''),
+        }
+
+    def run_once(self, scenario):
+        method, url, params = self.request(scenario)
+        started = time.perf_counter()
+        if method == 'get':
+            response = self.session.get(
+                url, params=params, allow_redirects=False
+            )
+        else:
+            response = self.session.post(
+                url, data=params, headers={'Referer': url},
+                allow_redirects=False,
+            )
+        elapsed = time.perf_counter() - started
+        self.command.record(url, response.status_code, elapsed)
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест запущенного сервера: смешанный поток анонимных '
+        'и авторизованных запросов, RPS и p50/p95/p99 по имени маршрута'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--base-url', default='http://127.0.0.1:8000/',
+        )
+        parser.add_argument('--workers', type=int, default=16)
+        parser.add_argument(
+            '--duration', type=float, default=30,
+            help='Длительность теста в секундах',
+        )
+        parser.add_argument(
+            '--auth-ratio', type=float, default=0.3,
+            help='Доля авторизованных воркеров',
+        )
+        parser.add_argument(
+            '--password', default='yatube-seed',
+            help='Общий пароль пользователей (см. seed_data)',
+        )
+        parser.add_argument(
+            '--mix', type=parse_mix,
+            help='Веса сценариев, например index=30,post_detail=20',
+        )
+        parser.add_argument(
+            '--seed', type=int,
+            help='Зерно случайных чисел; воркер N получает seed + N',
+        )
+        parser.add_argument(
+            '--output', help='Куда сохранить результаты в JSON',
+        )
+        parser.add_argument(
+            '--compare', help='JSON предыдущего прогона для сравнения',
+        )
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError('--workers должен быть больше нуля')
+        self.base_url = options['base_url']
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.sample = self.load_sample()
+        rng = random.Random(options['seed'])
+        mix = options['mix'] or DEFAULT_MIX
+        if not effective_mix(mix, logged_in=True):
+            raise CommandError('У всех сценариев в --mix нулевой вес')
+
+        workers = []
+        users = self.sample['users']
+        for number in range(options['workers']):
+            credentials = None
+            if users and rng.random() < options['auth_ratio']:
+                credentials = (users[number % len(users)], options['password'])
+            seed = options['seed']
+            workers.append(Worker(
+                self, credentials, None if seed is None else seed + number
+            ))
+        self.check_mix(mix, workers)
+
+        deadline = time.monotonic() + options['duration']
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=len(workers)) as pool:
+            futures = [
+                pool.submit(self.loop, worker, mix, deadline)
+                for worker in workers
+            ]
+            for future in futures:
+                future.result()
+        elapsed = time.monotonic() - started
+
+        results = self.results(elapsed, options)
+        self.report(results)
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as source:
+                self.compare(json.load(source), results)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as target:
+                json.dump(results, target, indent=2)
+
+    def load_sample(self):
+        sample = {
+            'users': list(
+                User.objects.filter(posts__isnull=False)
+                .values_list('username', flat=True)
+                .distinct()[:SAMPLE_SIZE]
+            ),
+            'groups': list(
+                Group.objects.values_list('slug', flat=True)[:SAMPLE_SIZE]
+            ),
+            'posts': list(
+                Post.objects.values_list('id', flat=True)[:SAMPLE_SIZE]
+            ),
+        }
+        return sample
+
+    def check_mix(self, mix, workers):
+        """Проверяет, что каждому воркеру есть что запрашивать."""
+        for logged_in in {worker.logged_in for worker in workers}:
+            if not effective_mix(mix, logged_in):
+                raise CommandError(
+                    'В --mix нет сценариев для анонимных воркеров; '
+                    'добавьте их или поднимите --auth-ratio'
+                )
+            for name in effective_mix(mix, logged_in):
+                needs = SAMPLE_NEEDS.get(name)
+                if needs and not self.sample[needs]:
+                    raise CommandError(
+                        f'Сценарию {name} нужны {needs}, а в базе их нет; '
+                        'заполните её командой seed_data'
+                    )
+
+    def loop(self, worker, mix, deadline):
+        mix = effective_mix(mix, worker.logged_in)
+        scenarios = list(mix)
+        weights = list(mix.values())
+        while time.monotonic() < deadline:
+            scenario = worker.rng.choices(scenarios, weights)[0]
+            try:
+                worker.run_once(scenario)
+            except requests.RequestException:
+                self.record(None, 'error', 0)
+
+    def record(self, url, status, elapsed):
+        try:
+            route = resolve(urlsplit(url).path).view_name if url else '-'
+        except Resolver404:
+            route = '-'
+        with self.lock:
+            if status != 'error':
+                self.latencies[route].append(elapsed * 1000)
+            self.statuses[route][str(status)] += 1
+
+    def results(self, elapsed, options):
+        routes = {}
+        for route, statuses in self.statuses.items():
+            summary = summarize(self.latencies[route])
+            summary['rps'] = sum(statuses.values()) / elapsed
+            summary['statuses'] = dict(statuses)
+            routes[route] = summary
+        total = sum(sum(s.values()) for s in self.statuses.values())
+        return {
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'base_url': self.base_url,
+            'workers': options['workers'],
+            'duration': elapsed,
+            'requests': total,
+            'rps': total / elapsed,
+            'routes': routes,
+        }
+
+    def report(self, results):
+        self.stdout.write(
+            f'{results["requests"]} запросов, '
+            f'{results["rps"]:.1f} RPS за {results["duration"]:.1f} с'
+        )
+        self.stdout.write(
+            f'{"маршрут":<28}{"RPS":>8}{"p50":>9}{"p95":>9}{"p99":>9}'
+            '  статусы'
+        )
+        for route, row in sorted(results['routes'].items()):
+            self.stdout.write(
+                f'{route:<28}{row["rps"]:>8.1f}{row["p50"]:>9.1f}'
+                f'{row["p95"]:>9.1f}{row["p99"]:>9.1f}  {row["statuses"]}'
+            )
+
+    def compare(self, previous, results):
+        self.stdout.write('Изменение p95 относительно прошлого прогона:')
+        for route, row in sorted(results['routes'].items()):
+            old = previous['routes'].get(route)
+            if not old or not old['p95']:
+                continue
+            change = (row['p95'] - old['p95']) / old['p95'] * 100
+            self.stdout.write(f'{route:<28}{change:>+8.1f}%')
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from core.sessions import CHUNK_SIZE, purge_expired, write_behind
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет просроченные сессии из базы порциями, не блокируя запись '
+        'надолго. Запускается по расписанию'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+        parser.add_argument(
+            '--sleep', type=float, default=0.1,
+            help='Пауза между порциями в секундах',
+        )
+
+    def handle(self, *args, **options):
+        write_behind.flush()
+        deleted = purge_expired(
+            chunk_size=options['chunk_size'], pause=options['sleep']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено просроченных сессий: {deleted}'
+        ))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core.sqlite import optimize
+
+
+class Command(BaseCommand):
+    help = (
+        'Обслуживание SQLite: ANALYZE, PRAGMA optimize и сброс WAL в основной '
+        'файл. Запускается по расписанию'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+        parser.add_argument(
+            '--skip-analyze', action='store_true',
+            help='Только PRAGMA optimize, без полного ANALYZE',
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'sqlite':
+            self.stdout.write('База не SQLite, обслуживание не требуется')
+            return
+        optimize(connection, analyze=not options['skip_analyze'])
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            busy, log, checkpointed = cursor.fetchone()
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: страниц в WAL {log}, перенесено {checkpointed}'
+        ))
@@ -0,0 +1,32 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует основную базу SQLite в файлы реплик из DATABASE_REPLICAS '
+        'через backup API без остановки записи'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pages', type=int, default=1024,
+            help='Сколько страниц копировать за шаг backup',
+        )
+
+    def handle(self, *args, **options):
+        primary = connections['default']
+        if primary.vendor != 'sqlite':
+            raise CommandError('Синхронизируется только SQLite')
+        primary.ensure_connection()
+        for alias in settings.DATABASE_REPLICAS:
+            path = connections[alias].settings_dict['NAME']
+            target = sqlite3.connect(path)
+            try:
+                primary.connection.backup(target, pages=options['pages'])
+            finally:
+                target.close()
+            self.stdout.write(self.style.SUCCESS(f'{alias}: {path} обновлена'))
@@ -0,0 +1,494 @@
+"""Метрики приложения в формате Prometheus.
+
+Каждый процесс копит счётчики и гистограммы в памяти (registry). Если
+задан METRICS_DIR, процесс раз в METRICS_FLUSH_INTERVAL секунд пишет
+снимок своих значений в файл; /metrics складывает снимки всех
+процессов, поэтому ответ не зависит от того, какой воркер его отдал.
+Датчики (gauge) процессов, которые давно не обновляли снимок,
+не учитываются: такие процессы считаются завершёнными.
+
+Сборщики (collector) вызываются при снимке или выгрузке и отдают
+текущие значения подсистем: пула соединений, очереди записи и т. п.
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def escape(value):
+    return (
+        str(value).replace('\\', r'\\').replace('\n', r'\n')
+        .replace('"', r'\"')
+    )
+
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{escape(v)}"' for k, v in pairs) + '}'
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labels)
+
+    def describe(self):
+        return {
+            'kind': self.kind,
+            'help': self.documentation,
+            'labels': self.labels,
+        }
+
+    def snapshot(self):
+        with self.lock:
+            values = [[list(key), value] for key, value in self.values.items()]
+        return dict(self.describe(), values=values)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[self.key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    """Гистограмма; значение — число наблюдений в каждой корзине и сумма."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=None):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets or settings.METRICS_LATENCY_BUCKETS)
+
+    def describe(self):
+        return dict(super().describe(), buckets=self.buckets)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        index = len(self.buckets)
+        for position, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = position
+                break
+        with self.lock:
+            counts = self.values.get(key)
+            if counts is None:
+                # Корзины по границам, корзина +Inf и сумма значений
+                counts = self.values[key] = [0] * (len(self.buckets) + 1)
+                counts.append(0.0)
+            counts[index] += 1
+            counts[-1] += value
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+        self.collectors = []
+        self.last_flush = 0.0
+
+    def _get(self, cls, name, documentation, labels=(), **options):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(
+                    name, documentation, labels, **options
+                )
+            return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self._get(Counter, name, documentation, labels)
+
+    def gauge(self, name, documentation, labels=()):
+        return self._get(Gauge, name, documentation, labels)
+
+    def histogram(self, name, documentation, labels=(), buckets=None):
+        return self._get(
+            Histogram, name, documentation, labels, buckets=buckets
+        )
+
+    def collector(self, func=None, scope='process'):
+        """Регистрирует сборщик.
+
+        Сборщик возвращает кортежи (имя, описание, {метки}, значение),
+        которые выгружаются как gauge. scope='process' — значения
+        процесса, попадают в снимок; 'global' — общие для всех процессов
+        (например, из базы), вызываются один раз при выгрузке.
+        """
+        def decorator(func):
+            with self.lock:
+                self.collectors.append((scope, func))
+            return func
+        if func is not None:
+            return decorator(func)
+        return decorator
+
+    def collect(self, scope):
+        metrics = {}
+        for collector_scope, func in list(self.collectors):
+            if collector_scope != scope:
+                continue
+            try:
+                samples = list(func())
+            except Exception:
+                logger.exception('Сборщик метрик %s упал', func.__name__)
+                continue
+            for name, documentation, labels, value in samples:
+                metric = metrics.get(name)
+                if metric is None:
+                    metric = metrics[name] = Gauge(
+                        name, documentation, sorted(labels)
+                    )
+                metric.set(value, **labels)
+        return {name: metric.snapshot() for name, metric in metrics.items()}
+
+    def snapshot(self):
+        with self.lock:
+            metrics = list(self.metrics.values())
+        result = {metric.name: metric.snapshot() for metric in metrics}
+        result.update(self.collect('process'))
+        return {'time': time.time(), 'metrics': result}
+
+    def snapshot_path(self):
+        name = f'{socket.gethostname()}-{os.getpid()}.json'
+        return os.path.join(settings.METRICS_DIR, name)
+
+    def flush(self):
+        """Записывает снимок процесса в METRICS_DIR."""
+        if not settings.METRICS_DIR:
+            return
+        self.last_flush = time.monotonic()
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        path = self.snapshot_path()
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w') as snapshot_file:
+            json.dump(self.snapshot(), snapshot_file)
+        os.replace(temporary, path)
+
+    def maybe_flush(self):
+        interval = settings.METRICS_FLUSH_INTERVAL
+        if time.monotonic() - self.last_flush < interval:
+            return
+        try:
+            self.flush()
+        except OSError:
+            logger.exception('Снимок метрик не записан')
+
+    def snapshots(self):
+        """Снимки всех процессов; свой берётся из памяти."""
+        own = self.snapshot()
+        if not settings.METRICS_DIR:
+            return [own]
+        own_path = self.snapshot_path()
+        result = [own]
+        try:
+            names = os.listdir(settings.METRICS_DIR)
+        except FileNotFoundError:
+            names = []
+        for name in names:
+            path = os.path.join(settings.METRICS_DIR, name)
+            if not name.endswith('.json') or path == own_path:
+                continue
+            try:
+                with open(path) as snapshot_file:
+                    result.append(json.load(snapshot_file))
+            except (OSError, ValueError):
+                continue
+        return result
+
+    def render(self):
+        """Сводка всех процессов в текстовом формате Prometheus."""
+        merged = merge(self.snapshots())
+        merged.update(self.collect('global'))
+        lines = []
+        for name in sorted(merged):
+            lines.extend(render_metric(name, merged[name]))
+        return '\n'.join(lines) + '\n'
+
+
+def merge(snapshots):
+    """Складывает значения метрик из снимков разных процессов."""
+    stale_before = time.time() - settings.METRICS_STALE_AFTER
+    merged = {}
+    for snapshot in snapshots:
+        stale = snapshot['time'] < stale_before
+        for name, metric in snapshot['metrics'].items():
+            if metric['kind'] == 'gauge' and stale:
+                continue
+            target = merged.setdefault(name, dict(metric, values={}))
+            values = target['values']
+            for key, value in metric['values']:
+                key = tuple(key)
+                if key not in values:
+                    values[key] = value
+                elif metric['kind'] == 'histogram':
+                    values[key] = [a + b for a, b in zip(values[key], value)]
+                else:
+                    values[key] += value
+    return {
+        name: dict(metric, values=list(metric['values'].items()))
+        for name, metric in merged.items()
+    }
+
+
+def render_metric(name, metric):
+    labels = metric['labels']
+    yield f'# HELP {name} {metric["help"]}'
+    yield f'# TYPE {name} {metric["kind"]}'
+    for key, value in sorted(metric['values'], key=lambda item: item[0]):
+        if metric['kind'] != 'histogram':
+            yield f'{name}{format_labels(labels, key)} {format_value(value)}'
+            continue
+        cumulative = 0
+        bounds = list(metric['buckets']) + [float('inf')]
+        for bound, count in zip(bounds, value):
+            cumulative += count
+            le = format_labels(labels, key, [('le', format_value(bound))])
+            yield f'{name}_bucket{le} {cumulative}'
+        yield f'{name}_sum{format_labels(labels, key)} {value[-1]}'
+        yield f'{name}_count{format_labels(labels, key)} {cumulative}'
+
+
+registry = Registry()
+
+REQUEST_LATENCY = registry.histogram(
+    'yatube_request_duration_seconds',
+    'Время обработки запроса до ответа',
+    ('view', 'method', 'status'),
+)
+REQUESTS_ACTIVE = registry.gauge(
+    'yatube_requests_active', 'Запросы, которые обрабатываются сейчас'
+)
+DB_QUERIES = registry.counter(
+    'yatube_db_queries_total', 'SQL-запросы по view', ('view', 'database')
+)
+DB_TIME = registry.counter(
+    'yatube_db_query_seconds_total',
+    'Суммарное время SQL-запросов по view',
+    ('view', 'database'),
+)
+CACHE_REQUESTS = registry.counter(
+    'yatube_cache_requests_total',
+    'Чтения из кэша: попадания (hit) и промахи (miss)',
+    ('cache', 'result'),
+)
+THUMBNAIL_TIME = registry.histogram(
+    'yatube_thumbnail_seconds',
+    'Получение миниатюры: из хранилища (stored) или с генерацией',
+    ('result',),
+)
+
+
+class RequestStats:
+    """Счётчики одного запроса: SQL и обращения к кэшу."""
+
+    def __init__(self):
+        self.queries = 0
+        self.query_time = 0.0
+        self.by_database = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def add_query(self, database, elapsed):
+        self.queries += 1
+        self.query_time += elapsed
+        count, total = self.by_database.get(database, (0, 0.0))
+        self.by_database[database] = (count + 1, total + elapsed)
+
+
+_local = threading.local()
+
+
+def current_stats():
+    """Счётчики запроса, который обрабатывает текущий поток, или None."""
+    return getattr(_local, 'stats', None)
+
+
+def record_cache(cache_name, hits, misses):
+    if hits:
+        CACHE_REQUESTS.inc(hits, cache=cache_name, result='hit')
+    if misses:
+        CACHE_REQUESTS.inc(misses, cache=cache_name, result='miss')
+    stats = current_stats()
+    if stats is not None:
+        stats.cache_hits += hits
+        stats.cache_misses += misses
+
+
+class QueryTimer:
+    """execute_wrapper, который считает SQL-запросы и их время."""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.stats.add_query(
+                context['connection'].alias, time.perf_counter() - started
+            )
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else ''
+
+
+class MetricsMiddleware:
+    """Время ответа по view, активные запросы, SQL и кэш.
+
+    Время потокового ответа считается до начала отправки тела.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = request.stats = _local.stats = RequestStats()
+        timer = QueryTimer(stats)
+        REQUESTS_ACTIVE.inc()
+        started = time.perf_counter()
+        status = 500
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(
+                        connections[alias].execute_wrapper(timer)
+                    )
+                response = self.get_response(request)
+            status = response.status_code
+            return response
+        finally:
+            elapsed = time.perf_counter() - started
+            request.elapsed = elapsed
+            _local.stats = None
+            REQUESTS_ACTIVE.dec()
+            view = view_name(request)
+            REQUEST_LATENCY.observe(
+                elapsed,
+                view=view,
+                method=request.method,
+                status=f'{status // 100}xx',
+            )
+            for database, (count, total) in stats.by_database.items():
+                DB_QUERIES.inc(count, view=view, database=database)
+                DB_TIME.inc(total, view=view, database=database)
+            registry.maybe_flush()
+
+
+def metrics_allowed(request):
+    # client_ip за прокси берёт адрес, дописанный прокси, поэтому
+    # подставленный клиентом X-Forwarded-For: 127.0.0.1 не поможет
+    from .ratelimit import client_ip
+
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_staff:
+        return True
+    return client_ip(request) in settings.METRICS_ALLOWED_IPS
+
+
+def metrics_view(request):
+    """Метрики для Prometheus: сотрудникам и с адресов METRICS_ALLOWED_IPS."""
+    if not metrics_allowed(request):
+        return HttpResponseForbidden(content_type=CONTENT_TYPE)
+    return HttpResponse(registry.render(), content_type=CONTENT_TYPE)
+
+
+POOL_FIELDS = {
+    'size': 'Размер пула соединений',
+    'in_use': 'Выданные соединения пула',
+    'idle': 'Свободные соединения пула',
+    'waits': 'Ожидания свободного соединения',
+    'wait_time': 'Суммарное ожидание соединения, секунды',
+}
+
+
+@registry.collector
+def collect_core():
+    from .pool import pools
+    from .ratelimit import concurrency_limiter
+    from .sessions import write_behind
+    from .writes import write_coordinator
+
+    writes = write_coordinator.stats()
+    yield (
+        'yatube_write_queue_waiting', 'Транзакции в очереди на запись',
+        {}, writes['waiting'],
+    )
+    yield (
+        'yatube_write_wait_seconds', 'Суммарное ожидание очереди записи',
+        {}, writes['wait_time'],
+    )
+    yield (
+        'yatube_write_retries', 'Повторы записи при занятой базе',
+        {}, writes['retries'],
+    )
+    yield (
+        'yatube_write_failures', 'Записи, не выполненные после повторов',
+        {}, writes['failures'],
+    )
+    for alias, pool in list(pools.items()):
+        pool_stats = pool.stats()
+        for field, documentation in POOL_FIELDS.items():
+            yield (
+                f'yatube_pool_{field}', documentation,
+                {'database': alias}, pool_stats[field],
+            )
+    limiter = concurrency_limiter.stats()
+    yield (
+        'yatube_requests_shed', 'Запросы, отклонённые по лимиту '
+        'одновременных', {}, limiter['rejected'],
+    )
+    yield (
+        'yatube_session_writes_pending', 'Сессии, ожидающие записи в базу',
+        {}, len(write_behind.pending),
+    )
@@ -0,0 +1,128 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Пулы по псевдониму базы: один пул на процесс
+pools = {}
+_pools_lock = threading.Lock()
+
+
+class PoolTimeout(Exception):
+    """Свободное соединение не появилось за отведённое время."""
+
+
+class ConnectionPool:
+    """Пул переиспользуемых соединений с ограничением размера.
+
+    connect() создаёт новое соединение, check(connection) возвращает
+    True, если соединение живо; его вызывают при каждой выдаче из пула.
+    """
+
+    def __init__(self, connect, size=10, timeout=5.0, check=None):
+        self.connect = connect
+        self.size = size
+        self.timeout = timeout
+        self.check = check
+        self.idle = []  # Последнее возвращённое соединение выдаётся первым
+        self.lock = threading.Lock()
+        # Будит ожидающих, когда соединение вернули или место освободилось
+        self.available = threading.Condition(self.lock)
+        self.created = 0
+        self.in_use = 0
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+        self.failed_checks = 0
+
+    def checkout(self):
+        started = time.monotonic()
+        while True:
+            connection = self._take(started)
+            if self.check is None or self._healthy(connection):
+                break
+            with self.lock:
+                self.failed_checks += 1
+            self._discard(connection)
+        waited = time.monotonic() - started
+        with self.lock:
+            self.in_use += 1
+            self.checkouts += 1
+            self.wait_time += waited
+            self.max_wait = max(self.max_wait, waited)
+        return connection
+
+    def checkin(self, connection, discard=False):
+        with self.lock:
+            self.in_use -= 1
+            if not discard:
+                self.idle.append(connection)
+                self.available.notify()
+        if discard:
+            self._discard(connection)
+
+    def _take(self, started):
+        with self.lock:
+            waited = False
+            while not self.idle and self.created >= self.size:
+                if not waited:
+                    self.waits += 1
+                    waited = True
+                remaining = self.timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    raise PoolTimeout(
+                        f'Нет свободных соединений за {self.timeout} с '
+                        f'(размер пула {self.size})'
+                    )
+                self.available.wait(remaining)
+            if self.idle:
+                return self.idle.pop()
+            self.created += 1
+        try:
+            return self.connect()
+        except Exception:
+            self._release_slot()
+            raise
+
+    def _healthy(self, connection):
+        try:
+            return self.check(connection)
+        except Exception:
+            logger.warning('Соединение из пула не прошло проверку')
+            return False
+
+    def _release_slot(self):
+        with self.lock:
+            self.created -= 1
+            self.available.notify()
+
+    def _discard(self, connection):
+        self._release_slot()
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def stats(self):
+        with self.lock:
+            return {
+                'size': self.size,
+                'created': self.created,
+                'in_use': self.in_use,
+                'idle': len(self.idle),
+                'checkouts': self.checkouts,
+                'waits': self.waits,
+                'wait_time': self.wait_time,
+                'max_wait': self.max_wait,
+                'failed_checks': self.failed_checks,
+            }
+
+
+def get_pool(alias, connect, **options):
+    """Возвращает пул для псевдонима базы, создавая его при первом вызове."""
+    with _pools_lock:
+        if alias not in pools:
+            pools[alias] = ConnectionPool(connect, **options)
+        return pools[alias]
@@ -0,0 +1,204 @@
+"""Ограничение частоты пишущих запросов и сброс нагрузки.
+
+RateLimitMiddleware ведёт в кэше корзину токенов на пару «маршрут —
+пользователь» (для анонимов — IP-адрес). Лимиты задаются в RATELIMITS
+по имени маршрута: (запросов, за секунд[, методы]). Корзина вмещает
+«запросов» токенов и пополняется равномерно за «секунд»; запрос без
+токена получает 429 с Retry-After. Разом можно потратить не больше
+полной корзины, дальше запросы идут не чаще, чем она пополняется.
+
+Корзина читается и записывается под блокировкой: внутри процесса
+threading.Lock, между процессами flock на RATELIMIT_LOCK_FILE. Поэтому
+подходит любой общий кэш, в том числе файловый, где incr не атомарен.
+
+ConcurrencyLimitMiddleware не даёт процессу взять больше
+MAX_CONCURRENT_REQUESTS запросов одновременно: лишние сразу получают
+503 с Retry-After, не дожидаясь очереди к базе. Потоковый ответ
+занимает место, пока его тело не отправлено целиком.
+"""
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.shortcuts import render
+
+from .accesslog import CountingIterator
+
+try:
+    import fcntl
+except ImportError:  # Windows: остаётся только блокировка внутри процесса
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+_bucket_lock = threading.Lock()
+
+
+def limit_for(request):
+    """(ёмкость, период, методы) для маршрута запроса или None."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None
+    limit = settings.RATELIMITS.get(match.view_name)
+    if limit is None:
+        return None
+    capacity, period, *methods = limit
+    return capacity, period, methods[0] if methods else ('POST',)
+
+
+def client_ip(request):
+    """Адрес клиента; за прокси — тот, что дописал доверенный прокси.
+
+    Прокси дописывают адреса в X-Forwarded-For справа, а всё левее
+    прислал сам клиент и может подделать. Поэтому берётся адрес
+    RATELIMIT_TRUSTED_PROXIES-й справа.
+    """
+    if settings.RATELIMIT_IP_HEADER:
+        forwarded = request.META.get(settings.RATELIMIT_IP_HEADER, '')
+        addresses = [
+            address.strip() for address in forwarded.split(',')
+            if address.strip()
+        ]
+        if addresses:
+            hops = max(settings.RATELIMIT_TRUSTED_PROXIES, 1)
+            return addresses[-min(hops, len(addresses))]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def client_key(request):
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f'user:{user.pk}'
+    return f'ip:{client_ip(request)}'
+
+
+@contextmanager
+def bucket_lock():
+    """Блокировка на чтение и запись корзин для всех процессов."""
+    with _bucket_lock:
+        path = settings.RATELIMIT_LOCK_FILE
+        if fcntl is None or path is None:
+            yield
+            return
+        descriptor = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(descriptor, fcntl.LOCK_EX)
+            yield
+        finally:
+            fcntl.flock(descriptor, fcntl.LOCK_UN)
+            os.close(descriptor)
+
+
+def take_token(key, capacity, period, cache=None):
+    """Забирает токен из корзины; возвращает 0 или сколько секунд ждать."""
+    cache = cache or caches[settings.RATELIMIT_CACHE]
+    rate = capacity / period
+    with bucket_lock():
+        now = time.time()
+        tokens, updated = cache.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * rate)
+        if tokens < 1:
+            return (1 - tokens) / rate
+        cache.set(key, (tokens - 1, now), period)
+    return 0
+
+
+class RateLimitMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not settings.RATELIMIT_ENABLED:
+            return None
+        limit = limit_for(request)
+        if limit is None:
+            return None
+        capacity, period, methods = limit
+        if request.method not in methods:
+            return None
+        key = f'ratelimit:{request.resolver_match.view_name}:'
+        key += client_key(request)
+        wait = take_token(key, capacity, period)
+        if not wait:
+            return None
+        logger.warning('Превышен лимит запросов: %s', key)
+        response = render(request, 'core/429.html', status=429)
+        response['Retry-After'] = math.ceil(wait)
+        return response
+
+
+class ConcurrencyLimiter:
+    """Счётчик запросов, которые процесс обрабатывает прямо сейчас."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.rejected = 0
+
+    def acquire(self, capacity):
+        with self.lock:
+            if self.in_flight >= capacity:
+                self.rejected += 1
+                return False
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            return True
+
+    def release(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                'in_flight': self.in_flight,
+                'max_in_flight': self.max_in_flight,
+                'rejected': self.rejected,
+            }
+
+
+concurrency_limiter = ConcurrencyLimiter()
+
+
+class ConcurrencyLimitMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        capacity = settings.MAX_CONCURRENT_REQUESTS
+        if capacity is None:
+            return self.get_response(request)
+        if not concurrency_limiter.acquire(capacity):
+            # Без шаблона и сессии: ответ должен стоить как можно меньше
+            response = HttpResponse(
+                'Сервер перегружен, повторите запрос позже',
+                status=503,
+                content_type='text/plain; charset=utf-8',
+            )
+            response['Retry-After'] = settings.CONCURRENCY_RETRY_AFTER
+            return response
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            concurrency_limiter.release()
+            raise
+        if response.streaming:
+            # Тело ещё не сформировано: место освобождается, когда
+            # оно отправлено или ответ закрыт
+            response.streaming_content = CountingIterator(
+                response.streaming_content,
+                lambda size: concurrency_limiter.release(),
+            )
+        else:
+            concurrency_limiter.release()
+        return response
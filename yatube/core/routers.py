@@ -0,0 +1,77 @@
+import random
+import threading
+from functools import wraps
+
+from django.conf import settings
+
+_state = threading.local()
+
+
+class ReplicaRouter:
+    """Отправляет чтение из разрешённых view на реплики, запись — на primary.
+
+    Реплики используются только внутри view, обёрнутых в replica_reads,
+    и только если клиент недавно ничего не записывал (см. middleware).
+    """
+
+    def db_for_read(self, model, **hints):
+        if (
+            not settings.DATABASE_REPLICAS
+            or not getattr(_state, 'replica_reads', False)
+            or getattr(_state, 'wrote', False)
+            or model._meta.app_label not in settings.REPLICA_READ_APPS
+        ):
+            return 'default'
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        _state.wrote = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # На репликах те же данные, что и на primary
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db not in settings.DATABASE_REPLICAS
+
+
+def replica_reads(view):
+    """Разрешает view читать данные с реплик."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        _state.replica_reads = not getattr(request, 'use_primary', False)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _state.replica_reads = False
+    return wrapper
+
+
+class PrimaryStickinessMiddleware:
+    """Закрепляет клиента за primary на время после его записи.
+
+    Пока жива кука, все чтения клиента идут в primary, поэтому
+    редирект после post_create, add_comment или profile_follow
+    показывает только что записанные данные.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        cookie = settings.REPLICA_STICKY_COOKIE
+        request.use_primary = cookie in request.COOKIES
+        _state.wrote = False
+        try:
+            response = self.get_response(request)
+        finally:
+            wrote = _state.wrote
+            _state.wrote = False
+        if wrote and settings.DATABASE_REPLICAS:
+            response.set_cookie(
+                cookie, '1',
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True,
+            )
+        return response
@@ -0,0 +1,285 @@
+"""Сессии в кэше с отложенной записью в базу (SESSION_ENGINE).
+
+Чтение идёт из кэша SESSION_CACHE_ALIAS, в базу — только при промахе.
+Сохранение пишет в кэш сразу, а в базу — пачкой раз в
+SESSION_WRITE_BEHIND_INTERVAL секунд по окончании запроса. Сессия,
+данные которой не изменились, не сохраняется вовсе, даже если
+SessionMiddleware считает её изменённой. Просроченные строки удаляются
+порциями: понемногу после запросов и командой purge_sessions.
+
+Удаление (выход, смена ключа при входе) пишется в базу сразу, а в кэше
+остаётся метка DELETED: ни чтение, ни запоздалая запись из очереди
+другого процесса не вернут удалённую сессию. Всё это работает только
+с кэшем, общим для процессов, — settings_production это проверяет.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.sessions.backends.base import CreateError
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+from django.contrib.sessions.models import Session
+from django.core.cache import caches
+from django.core.signals import request_finished
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .writes import write_coordinator
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'core.sessions'
+DELETED = 'core.sessions.deleted'  # Метка удалённой сессии в кэше
+CHUNK_SIZE = 500  # Ключей в одном запросе к базе (лимит переменных SQLite)
+
+
+class WriteBehindQueue:
+    """Изменения сессий, ещё не записанные в базу.
+
+    Значение — (session_data, expire_date) или None для удаления.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.last_flush = time.monotonic()
+        self.flushes = 0
+        self.written = 0
+
+    def put(self, session_key, session_data, expire_date):
+        with self.lock:
+            self.pending[session_key] = (session_data, expire_date)
+
+    def discard(self, session_key):
+        with self.lock:
+            self.pending.pop(session_key, None)
+
+    def get(self, session_key):
+        """(session_data, expire_date), None для удалённой, KeyError."""
+        with self.lock:
+            return self.pending[session_key]
+
+    def due(self):
+        with self.lock:
+            if not self.pending:
+                return False
+            return (
+                len(self.pending) >= settings.SESSION_WRITE_BEHIND_BATCH
+                or time.monotonic() - self.last_flush
+                >= settings.SESSION_WRITE_BEHIND_INTERVAL
+            )
+
+    def flush(self):
+        """Записывает накопленные изменения в базу одной транзакцией."""
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            self.last_flush = time.monotonic()
+        if not pending:
+            return 0
+        try:
+            self._skip_deleted(pending)
+            write_coordinator.run(self._write, pending)
+        except Exception:
+            # Возвращаем в очередь всё, что не перезаписано за это время
+            with self.lock:
+                for key, value in pending.items():
+                    self.pending.setdefault(key, value)
+            raise
+        with self.lock:
+            self.flushes += 1
+            self.written += len(pending)
+        return len(pending)
+
+    def _skip_deleted(self, pending):
+        """Не даёт записать сессии, которые другой процесс уже удалил."""
+        cache = caches[settings.SESSION_CACHE_ALIAS]
+        keys = [key for key, value in pending.items() if value is not None]
+        for start in range(0, len(keys), CHUNK_SIZE):
+            chunk = keys[start:start + CHUNK_SIZE]
+            found = cache.get_many([KEY_PREFIX + key for key in chunk])
+            for key in chunk:
+                if found.get(KEY_PREFIX + key) == DELETED:
+                    pending[key] = None
+
+    def _write(self, pending):
+        keys = list(pending)
+        for start in range(0, len(keys), CHUNK_SIZE):
+            Session.objects.filter(
+                session_key__in=keys[start:start + CHUNK_SIZE]
+            ).delete()
+        Session.objects.bulk_create(
+            [
+                Session(
+                    session_key=key,
+                    session_data=value[0],
+                    expire_date=value[1],
+                )
+                for key, value in pending.items()
+                if value is not None
+            ],
+            batch_size=CHUNK_SIZE,
+        )
+
+
+write_behind = WriteBehindQueue()
+
+
+class SessionStore(DBStore):
+    cache_key_prefix = KEY_PREFIX
+
+    def __init__(self, session_key=None):
+        self._cache = caches[settings.SESSION_CACHE_ALIAS]
+        # Сериализованные данные на момент загрузки или сохранения
+        self._snapshot = None
+        super().__init__(session_key)
+
+    @property
+    def cache_key(self):
+        return self.cache_key_prefix + self._get_or_create_session_key()
+
+    def load(self):
+        try:
+            data = self._cache.get(self.cache_key)
+        except Exception:
+            data = None
+        if data == DELETED:
+            self._session_key = None
+            data = {}
+        elif data is None:
+            data = self._load_uncached()
+        self._snapshot = self.serializer().dumps(data)
+        return data
+
+    def _load_uncached(self):
+        # Сначала ещё не записанные изменения этого процесса, потом база
+        try:
+            pending = write_behind.get(self.session_key)
+        except KeyError:
+            pass
+        else:
+            if pending is None or pending[1] <= timezone.now():
+                self._session_key = None
+                return {}
+            data = self.decode(pending[0])
+            self._cache.set(
+                self.cache_key, data, self.get_expiry_age(expiry=pending[1])
+            )
+            return data
+        session = self._get_session_from_db()
+        if session is None:
+            return {}
+        data = self.decode(session.session_data)
+        self._cache.set(
+            self.cache_key, data,
+            self.get_expiry_age(expiry=session.expire_date),
+        )
+        return data
+
+    def exists(self, session_key):
+        # Ключ удалённой сессии тоже занят: метка DELETED лежит в кэше
+        if not session_key:
+            return False
+        if self.cache_key_prefix + session_key in self._cache:
+            return True
+        try:
+            return write_behind.get(session_key) is not None
+        except KeyError:
+            return super().exists(session_key)
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+        data = self._get_session(no_load=must_create)
+        snapshot = self.serializer().dumps(data)
+        if not must_create and snapshot == self._snapshot:
+            return
+        expiry = self.get_expiry_age()
+        if must_create:
+            if not self._cache.add(self.cache_key, data, expiry):
+                raise CreateError
+        else:
+            self._cache.set(self.cache_key, data, expiry)
+        write_behind.put(
+            self.session_key, self.encode(data), self.get_expiry_date()
+        )
+        self._snapshot = snapshot
+
+    def delete(self, session_key=None):
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        self._cache.set(
+            self.cache_key_prefix + session_key, DELETED,
+            settings.SESSION_COOKIE_AGE,
+        )
+        write_behind.discard(session_key)
+        write_coordinator.run(
+            lambda: Session.objects.filter(session_key=session_key).delete()
+        )
+
+    @classmethod
+    def clear_expired(cls):
+        purge_expired()
+
+
+def purge_expired(chunk_size=CHUNK_SIZE, max_chunks=None, pause=0):
+    """Удаляет просроченные сессии порциями; возвращает число удалённых.
+
+    Каждая порция — отдельная короткая транзакция, чтобы не держать
+    блокировку записи SQLite всё время очистки.
+    """
+    deleted = 0
+    chunks = 0
+    while max_chunks is None or chunks < max_chunks:
+        keys = list(
+            Session.objects.filter(expire_date__lt=timezone.now())
+            .values_list('session_key', flat=True)[:chunk_size]
+        )
+        if not keys:
+            break
+        write_coordinator.run(
+            lambda: Session.objects.filter(session_key__in=keys).delete()
+        )
+        deleted += len(keys)
+        chunks += 1
+        if len(keys) < chunk_size:
+            break
+        if pause:
+            time.sleep(pause)
+    return deleted
+
+
+_last_purge = [time.monotonic()]
+
+
+@receiver(request_finished)
+def write_sessions_periodically(sender, **kwargs):
+    """После запроса сбрасывает очередь сессий и чистит одну порцию."""
+    if settings.SESSION_ENGINE != __name__:
+        return
+    if write_behind.due():
+        try:
+            write_behind.flush()
+        except Exception:
+            logger.exception('Сессии не записаны в базу')
+    if time.monotonic() - _last_purge[0] < settings.SESSION_PURGE_INTERVAL:
+        return
+    try:
+        if purge_expired(max_chunks=1) < CHUNK_SIZE:
+            # Порция неполная: всё удалено, следующая очистка через интервал
+            _last_purge[0] = time.monotonic()
+    except Exception:
+        logger.exception('Просроченные сессии не удалены')
+        _last_purge[0] = time.monotonic()
+
+
+def write_sessions_on_exit():
+    """Записывает очередь при остановке процесса (см. wsgi.py)."""
+    if not write_behind.pending:
+        return
+    try:
+        write_behind.flush()
+    except Exception:
+        logger.exception('Сессии не записаны в базу при завершении')
@@ -0,0 +1,57 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+# Время последнего PRAGMA optimize для каждого псевдонима БД в процессе
+_last_optimize = {}
+
+
+def apply_pragmas(cursor, pragmas):
+    for name, value in pragmas.items():
+        cursor.execute(f'PRAGMA {name} = {value}')
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    """Настраивает каждое новое соединение с SQLite."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        apply_pragmas(cursor, settings.SQLITE_PRAGMAS)
+    _last_optimize.setdefault(connection.alias, time.monotonic())
+
+
+def optimize(connection, analyze=False):
+    """Обновляет статистику планировщика запросов."""
+    with connection.cursor() as cursor:
+        if analyze:
+            cursor.execute('ANALYZE')
+        cursor.execute('PRAGMA optimize')
+    _last_optimize[connection.alias] = time.monotonic()
+
+
+@receiver(request_finished)
+def optimize_periodically(sender, **kwargs):
+    """Раз в SQLITE_OPTIMIZE_INTERVAL секунд выполняет PRAGMA optimize.
+
+    Соединения живут CONN_MAX_AGE секунд, поэтому рекомендованный
+    вызов optimize перед закрытием соединения происходит редко.
+    """
+    now = time.monotonic()
+    for alias, last in list(_last_optimize.items()):
+        if now - last < settings.SQLITE_OPTIMIZE_INTERVAL:
+            continue
+        connection = connections[alias]
+        if connection.connection is None or connection.in_atomic_block:
+            continue
+        try:
+            optimize(connection)
+        except Exception:
+            logger.exception('PRAGMA optimize для %s не выполнен', alias)
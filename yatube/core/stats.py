@@ -0,0 +1,32 @@
+import math
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(sorted_values, q):
+    """Перцентиль с линейной интерполяцией по отсортированному списку."""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * q / 100
+    lower = math.floor(position)
+    upper = math.ceil(position)
+    if lower == upper:
+        return sorted_values[lower]
+    fraction = position - lower
+    return (
+        sorted_values[lower] * (1 - fraction)
+        + sorted_values[upper] * fraction
+    )
+
+
+def summarize(values):
+    """Сводка по выборке: количество, среднее, p50/p95/p99 и максимум."""
+    values = sorted(values)
+    summary = {
+        'count': len(values),
+        'mean': sum(values) / len(values) if values else 0.0,
+        'max': values[-1] if values else 0.0,
+    }
+    for q in PERCENTILES:
+        summary[f'p{q}'] = percentile(values, q)
+    return summary
@@ -0,0 +1,137 @@
+"""Потоковый рендеринг длинных страниц.
+
+render() собирает всю страницу в памяти, и браузер не видит <head>
+со стилями, пока не отрисована последняя карточка поста. В потоковом
+режиме страница рендерится один раз с меткой на месте списка, часть
+до метки (head и шапка) отправляется сразу, затем по одной карточке,
+затем остаток страницы. Режим включается для view из STREAMING_VIEWS.
+
+Карточки выбираются из базы уже после отправки head. База для чтения
+и бюджет времени SQL определяются заранее, пока работают настройки
+view, а при отправке применяются к запросу карточек.
+"""
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache.utils import make_template_fragment_key
+from django.db import OperationalError, connections, router
+from django.db.models.query import QuerySet
+from django.http import StreamingHttpResponse
+from django.shortcuts import render
+from django.template import loader
+from django.utils.safestring import mark_safe
+
+from .cache import fragment_cache
+from .deadlines import (DeadlineWrapper, QueryDeadlineExceeded, deadline_for,
+                        interrupted)
+
+
+class StreamingPageResponse(StreamingHttpResponse):
+    """Потоковый ответ, который по требованию отдаёт тело целиком.
+
+    Middleware, проверяющие response.streaming, пропускают его как любой
+    потоковый ответ, а те, что читают или заменяют response.content,
+    получают собранное тело; дальше ответ отдаётся уже из него.
+    """
+
+    @property
+    def content(self):
+        content = b''.join(self.streaming_content)
+        self.streaming_content = [content]
+        return content
+
+    @content.setter
+    def content(self, value):
+        self.streaming_content = [value]
+
+
+def streaming_enabled(request):
+    match = request.resolver_match
+    return match is not None and match.view_name in settings.STREAMING_VIEWS
+
+
+def loop_context(index, length):
+    """Аналог forloop для карточки, отрендеренной вне цикла."""
+    return {
+        'counter': index + 1,
+        'counter0': index,
+        'revcounter': length - index,
+        'revcounter0': length - index - 1,
+        'first': index == 0,
+        'last': index == length - 1,
+    }
+
+
+def deferred_items(request, items):
+    """Функция, выбирающая items позже с базой и бюджетом этого view."""
+    objects = getattr(items, 'object_list', items)
+    if not isinstance(objects, QuerySet):
+        return lambda: list(objects)
+    alias = router.db_for_read(objects.model)
+    objects = objects.using(alias)
+    budget = deadline_for(request)
+
+    def fetch():
+        started = time.monotonic()
+        wrapper = DeadlineWrapper(lambda: (started, budget))
+        try:
+            with connections[alias].execute_wrapper(wrapper):
+                return list(objects)
+        except OperationalError as error:
+            if not interrupted(error):
+                raise
+            raise QueryDeadlineExceeded(str(objects.query), budget) from error
+        finally:
+            wrapper.uninstall()
+    return fetch
+
+
+def render_streaming(request, template_name, context, item_template,
+                     items='page_obj', item_name='post', using=None,
+                     fragment=None):
+    """render() или потоковый ответ, если view есть в STREAMING_VIEWS.
+
+    Шаблон страницы выводит {{ stream_marker }} вместо цикла по items,
+    если переменная задана; item_template рендерит один элемент.
+    fragment — (время, имя) {% cache %}, в который шаблон заключает
+    цикл: готовый фрагмент отдаётся из кэша, новый туда сохраняется.
+    """
+    if not streaming_enabled(request):
+        return render(request, template_name, context, using=using)
+    fetch = deferred_items(request, context[items])
+    marker = f'<!-- stream:{uuid.uuid4().hex} -->'
+    page = loader.render_to_string(
+        template_name,
+        dict(context, stream_marker=mark_safe(marker)),
+        request,
+        using=using,
+    )
+    head, tail = page.split(marker, 1)
+    item = loader.get_template(item_template, using=using)
+
+    def chunks():
+        yield head
+        if fragment is not None:
+            timeout, name = fragment
+            key = make_template_fragment_key(name)
+            cached = fragment_cache().get(key)
+            if cached is not None:
+                yield cached
+                yield tail
+                return
+        objects = fetch()
+        rendered = []
+        for index, obj in enumerate(objects):
+            card = item.render(dict(
+                context,
+                forloop=loop_context(index, len(objects)),
+                **{item_name: obj}
+            ))
+            rendered.append(card)
+            yield card
+        if fragment is not None:
+            fragment_cache().set(key, ''.join(rendered), timeout)
+        yield tail
+
+    return StreamingPageResponse(chunks())
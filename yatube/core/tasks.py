@@ -0,0 +1,11 @@
+from django.conf import settings
+
+from tasks.queue import task
+
+from .sessions import purge_expired
+
+
+@task(every=settings.SESSION_PURGE_INTERVAL, priority=-10)
+def purge_sessions():
+    """Удаляет просроченные сессии порциями с паузами между ними."""
+    purge_expired(pause=0.1)
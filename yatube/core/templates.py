@@ -0,0 +1,66 @@
+"""Выбор движка шаблонов и предварительная компиляция шаблонов.
+
+С кэширующим загрузчиком шаблон разбирается один раз на процесс,
+но этот раз приходится на первый запрос к странице. Чтобы первые
+запросы после перезапуска не были медленнее остальных, все шаблоны
+загружаются заранее, при импорте WSGI-приложения.
+"""
+import logging
+import os
+
+from django.conf import settings
+from django.template import TemplateDoesNotExist, TemplateSyntaxError
+from django.template import engines
+from django.template.backends.django import DjangoTemplates
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_EXTENSIONS = ('.html', '.txt')
+
+
+def template_names(engine):
+    """Имена всех шаблонов во всех каталогах загрузчиков движка."""
+    names = set()
+    for loader in engine.template_loaders:
+        for inner in getattr(loader, 'loaders', [loader]):
+            for directory in inner.get_dirs():
+                for root, _, files in os.walk(str(directory)):
+                    for filename in files:
+                        if filename.endswith(TEMPLATE_EXTENSIONS):
+                            path = os.path.join(root, filename)
+                            names.add(os.path.relpath(path, str(directory)))
+    return sorted(name.replace(os.sep, '/') for name in names)
+
+
+def engine_for(request):
+    """Имя движка из TEMPLATE_ENGINE_VIEWS для текущего view или None."""
+    match = request.resolver_match
+    if match is None:
+        return None
+    using = settings.TEMPLATE_ENGINE_VIEWS.get(match.view_name)
+    if using not in engines.templates:
+        return None
+    return using
+
+
+def precompile_templates(backends=None):
+    """Загружает все шаблоны Django и Jinja2; возвращает их число."""
+    count = 0
+    for backend in backends or engines.all():
+        if isinstance(backend, DjangoTemplates):
+            names = template_names(backend.engine)
+        elif hasattr(backend, 'env'):  # Jinja2
+            names = backend.env.list_templates(
+                filter_func=lambda name: name.endswith(TEMPLATE_EXTENSIONS)
+            )
+        else:
+            continue
+        for name in names:
+            try:
+                backend.get_template(name)
+            except (TemplateDoesNotExist, TemplateSyntaxError) as error:
+                # Например, файлы .txt, которые не являются шаблонами
+                logger.debug('Шаблон %s пропущен: %s', name, error)
+                continue
+            count += 1
+    return count
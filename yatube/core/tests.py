@@ -0,0 +1,704 @@
+import json
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import (RequestFactory, SimpleTestCase, TestCase,
+                         override_settings)
+from django.urls import reverse
+from django.utils import timezone
+from posts.models import Group, Post, User
+from yatube import settings_production
+
+from .accesslog import AccessLogWriter, access_log
+from .bench import find_regressions
+from .deadlines import (DeadlineWrapper, QueryDeadlineExceeded,
+                        QueryDeadlineMiddleware, interrupted)
+from .management.commands.bench_templates import make_backend
+from .metrics import Registry, merge
+from .pool import ConnectionPool, PoolTimeout
+from .ratelimit import (ConcurrencyLimitMiddleware, client_ip,
+                        concurrency_limiter, take_token)
+from .routers import ReplicaRouter, _state
+from .sessions import SessionStore, purge_expired, write_behind
+from .stats import percentile, summarize
+from .templates import precompile_templates
+from .writes import WriteCoordinator
+
+
+class StatsTest(SimpleTestCase):
+    def test_percentile_interpolates(self):
+        """Перцентиль считается с интерполяцией между соседями."""
+        values = [1, 2, 3, 4]
+        self.assertEqual(percentile(values, 50), 2.5)
+        self.assertEqual(percentile(values, 100), 4)
+        self.assertEqual(summarize([])['p99'], 0.0)
+
+
+class BenchTest(SimpleTestCase):
+    def test_find_regressions(self):
+        """Регрессией считается рост времени сверх допуска или запросов."""
+        baseline = {
+            'view:index': {'ms': 10, 'queries': 5},
+            'view:profile': {'ms': 10, 'queries': 5},
+        }
+        results = {
+            'view:index': {'ms': 14, 'queries': 5},
+            'view:profile': {'ms': 16, 'queries': 6},
+            'view:new': {'ms': 100, 'queries': 100},
+        }
+        regressions = find_regressions(baseline, results, 0.5, 0)
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(all('view:profile' in r for r in regressions))
+
+
+class FakeResponse:
+    status_code = 200
+
+
+class FakeSession:
+    """HTTP-сессия нагрузочного теста без сети: запоминает запросы."""
+
+    created = []
+
+    def __init__(self):
+        self.cookies = {}
+        self.urls = []
+        self.created.append(self)
+
+    def get(self, url, params=None, **kwargs):
+        self.urls.append((url, params))
+        return FakeResponse()
+
+    def post(self, url, data=None, **kwargs):
+        self.urls.append((url, None))
+        return FakeResponse()
+
+
+@mock.patch('core.management.commands.loadtest.requests.Session',
+            FakeSession)
+class LoadtestCommandTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(username='author')
+        Group.objects.create(title='Группа', slug='group', description='')
+        Post.objects.bulk_create(
+            Post(author=author, text=f'Пост {i}') for i in range(20)
+        )
+
+    def run_loadtest(self, *args):
+        FakeSession.created = []
+        out = StringIO()
+        call_command(
+            'loadtest', '--base-url=http://testserver/', '--duration=0.1',
+            '--auth-ratio=0', *args, stdout=out,
+        )
+        return out.getvalue()
+
+    def test_seed_reproduces_traffic(self):
+        """С одним --seed воркеры делают одинаковые запросы."""
+        self.run_loadtest('--workers=2', '--seed=7')
+        first = [session.urls[:20] for session in FakeSession.created]
+        report = self.run_loadtest('--workers=2', '--seed=7')
+        second = [session.urls[:20] for session in FakeSession.created]
+        self.assertEqual(first, second)
+        self.assertNotEqual(first[0], first[1])
+        self.assertIn('posts:index', report)
+
+    def test_workers_must_be_positive(self):
+        with self.assertRaises(CommandError):
+            self.run_loadtest('--workers=0')
+
+    def test_unusable_mix_is_rejected(self):
+        """Смесь, в которой воркерам нечего запрашивать, — ошибка команды."""
+        for mix in ('add_comment=5', 'index=0', 'index=abc', 'index=-1'):
+            with self.subTest(mix=mix), self.assertRaises(CommandError):
+                self.run_loadtest(f'--mix={mix}')
+
+    def test_groups_are_needed_only_for_group_list(self):
+        """Без групп в базе тест идёт, если group_list не в смеси."""
+        Group.objects.all().delete()
+        report = self.run_loadtest('--mix=index=1')
+        self.assertIn('posts:index', report)
+        with self.assertRaises(CommandError):
+            self.run_loadtest('--mix=group_list=1')
+
+
+class SqlitePragmasTest(TestCase):
+    def test_pragmas_applied_on_connect(self):
+        """Новое соединение получает настройки из SQLITE_PRAGMAS."""
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            timeout, = cursor.fetchone()
+        self.assertEqual(timeout, settings.SQLITE_PRAGMAS['busy_timeout'])
+
+
+class ReplicaRouterTest(TestCase):
+    def tearDown(self):
+        _state.replica_reads = False
+        _state.wrote = False
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_reads_go_to_replica_only_inside_allowed_views(self):
+        """Реплика используется только в разрешённых view и до записи."""
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_read(Post), 'default')
+        _state.replica_reads = True
+        _state.wrote = False
+        self.assertEqual(router.db_for_read(Post), 'replica')
+        router.db_for_write(Post)
+        self.assertEqual(router.db_for_read(Post), 'default')
+
+    @override_settings(DATABASE_REPLICAS=['default'])
+    def test_write_pins_client_to_primary(self):
+        """После записи клиент получает куку привязки к primary."""
+        reader = User.objects.create_user(username='reader')
+        author = User.objects.create_user(username='author')
+        self.client.force_login(reader)
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotIn(settings.REPLICA_STICKY_COOKIE, response.cookies)
+        response = self.client.get(
+            reverse('posts:profile_follow', args=(author.username,))
+        )
+        self.assertIn(settings.REPLICA_STICKY_COOKIE, response.cookies)
+
+    @override_settings(DATABASE_REPLICAS=['default'])
+    def test_post_detail_respects_sticky_cookie(self):
+        """С кукой привязки пост и комментарии читаются только с primary."""
+        author = User.objects.create_user(username='author')
+        post = Post.objects.create(author=author, text='Текст')
+        url = reverse('posts:post_detail', args=(post.id,))
+        with mock.patch('core.routers.random.choice',
+                        wraps=random.choice) as choice:
+            self.client.get(url)
+            self.assertTrue(choice.called)
+            choice.reset_mock()
+            self.client.cookies[settings.REPLICA_STICKY_COOKIE] = '1'
+            self.client.get(url)
+            self.assertFalse(choice.called)
+
+
+class ConnectionPoolTest(SimpleTestCase):
+    def make_pool(self, **options):
+        return ConnectionPool(
+            lambda: sqlite3.connect(':memory:', check_same_thread=False),
+            check=lambda connection: bool(connection.execute('SELECT 1')),
+            **options,
+        )
+
+    def test_pool_reuses_connections_and_limits_size(self):
+        """Пул переиспользует соединения и не превышает размер."""
+        pool = self.make_pool(size=1, timeout=0.01)
+        first = pool.checkout()
+        with self.assertRaises(PoolTimeout):
+            pool.checkout()
+        pool.checkin(first)
+        self.assertIs(pool.checkout(), first)
+        stats = pool.stats()
+        self.assertEqual(stats['created'], 1)
+        self.assertEqual(stats['waits'], 1)
+
+    def test_pool_replaces_dead_connection(self):
+        """Соединение, не прошедшее проверку, заменяется новым."""
+        pool = self.make_pool(size=1)
+        connection = pool.checkout()
+        connection.close()
+        pool.checkin(connection)
+        self.assertIsNot(pool.checkout(), connection)
+        self.assertEqual(pool.stats()['failed_checks'], 1)
+
+    def test_discard_wakes_waiter(self):
+        """Ожидающий получает новое соединение, когда старое выброшено."""
+        pool = self.make_pool(size=1, timeout=5)
+        broken = pool.checkout()
+        taken = []
+        waiter = threading.Thread(target=lambda: taken.append(pool.checkout()))
+        waiter.start()
+        while not pool.stats()['waits']:
+            time.sleep(0.001)
+        pool.checkin(broken, discard=True)
+        waiter.join(timeout=1)
+        self.assertFalse(waiter.is_alive())
+        self.assertIsNot(taken[0], broken)
+        self.assertEqual(pool.stats()['created'], 1)
+
+
+@override_settings(WRITE_RETRY_BACKOFF=0, WRITE_RETRIES=2)
+class WriteCoordinatorTest(TestCase):
+    def test_busy_write_is_retried(self):
+        """Запись при занятой базе повторяется ограниченное число раз."""
+        coordinator = WriteCoordinator()
+        calls = []
+
+        def write():
+            calls.append(1)
+            if len(calls) < 3:
+                raise OperationalError('database is locked')
+            return 'ok'
+
+        self.assertEqual(coordinator.run(write), 'ok')
+        self.assertEqual(coordinator.stats()['retries'], 2)
+
+    def test_write_fails_after_retries(self):
+        """После исчерпания повторов ошибка пробрасывается дальше."""
+        coordinator = WriteCoordinator()
+
+        def write():
+            raise OperationalError('database is locked')
+
+        with self.assertRaises(OperationalError):
+            coordinator.run(write)
+        stats = coordinator.stats()
+        self.assertEqual(stats['failures'], 1)
+        self.assertEqual(stats['waiting'], 0)
+
+    def test_nested_run_reuses_slot(self):
+        """Вложенный run в том же потоке не ждёт сам себя."""
+        coordinator = WriteCoordinator()
+        result = coordinator.run(lambda: coordinator.run(lambda: 'ok'))
+        self.assertEqual(result, 'ok')
+        self.assertEqual(coordinator.stats()['acquired'], 1)
+
+
+class QueryDeadlineTest(TestCase):
+    HEAVY_SQL = (
+        'WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL '
+        'SELECT i + 1 FROM n WHERE i < 10000000) SELECT count(*) FROM n'
+    )
+
+    def test_long_query_is_interrupted(self):
+        """Запрос, вышедший за бюджет, прерывается."""
+        wrapper = DeadlineWrapper(lambda: (time.monotonic(), 0.01))
+        self.addCleanup(wrapper.uninstall)
+        with connection.execute_wrapper(wrapper):
+            with self.assertRaises(QueryDeadlineExceeded):
+                with connection.cursor() as cursor:
+                    cursor.execute(self.HEAVY_SQL)
+        # После прерывания соединение остаётся рабочим
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+
+    def test_slow_fetch_is_interrupted(self):
+        """Бюджет действует и на строки, которые вычисляет fetchmany."""
+        # Первая строка готова сразу, до второй — миллионы шагов
+        sql = (
+            'WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL '
+            'SELECT i + 1 FROM n WHERE i < 10000000) '
+            'SELECT i FROM n WHERE i IN (1, 10000000)'
+        )
+        wrapper = DeadlineWrapper(lambda: (time.monotonic(), 0.05))
+        try:
+            with connection.execute_wrapper(wrapper):
+                with connection.cursor() as cursor:
+                    cursor.execute(sql)
+                    with self.assertRaises(OperationalError) as caught:
+                        cursor.fetchmany(10)
+        finally:
+            wrapper.uninstall()
+        self.assertTrue(interrupted(caught.exception))
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        response = QueryDeadlineMiddleware(None).process_exception(
+            request, caught.exception
+        )
+        self.assertEqual(response.status_code, 503)
+        # Срок прошёл, но обработчик снят: запрос без бюджета выполняется
+        with connection.cursor() as cursor:
+            cursor.execute(self.HEAVY_SQL.replace('10000000', '100000'))
+
+    def test_middleware_returns_degraded_response(self):
+        """Прерванный запрос превращается в 503 с Retry-After."""
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        middleware = QueryDeadlineMiddleware(lambda request: None)
+        response = middleware.process_exception(
+            request, QueryDeadlineExceeded('SELECT 1', 1)
+        )
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response)
+
+
+class RateLimitTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_bucket_refills_over_time(self):
+        """Пустая корзина говорит, сколько ждать следующего токена."""
+        self.assertEqual(take_token('bucket', 2, 60), 0)
+        self.assertEqual(take_token('bucket', 2, 60), 0)
+        self.assertAlmostEqual(take_token('bucket', 2, 60), 30, delta=1)
+
+    def test_concurrent_requests_do_not_exceed_bucket(self):
+        """Одновременные запросы не получают токенов больше ёмкости."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        lock_file = os.path.join(directory, 'ratelimit.lock')
+        granted = []
+
+        def hammer():
+            for _ in range(25):
+                granted.append(take_token('shared', 50, 3600) == 0)
+
+        with override_settings(RATELIMIT_LOCK_FILE=lock_file):
+            threads = [threading.Thread(target=hammer) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(granted.count(True), 50)
+
+    @override_settings(RATELIMITS={'users:signup': (2, 60)})
+    def test_write_endpoint_is_throttled(self):
+        """Сверх лимита запись получает 429, чтение не ограничено."""
+        url = reverse('users:signup')
+        for _ in range(2):
+            self.assertEqual(self.client.post(url).status_code, 200)
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+        self.assertEqual(self.client.get(url).status_code, 200)
+        # У другого клиента своя корзина
+        response = self.client.post(url, REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(RATELIMIT_IP_HEADER='HTTP_X_FORWARDED_FOR')
+    def test_forwarded_address_cannot_be_spoofed(self):
+        """Клиентом считается адрес, который дописал доверенный прокси."""
+        request = RequestFactory().get(
+            '/', HTTP_X_FORWARDED_FOR='1.2.3.4, 10.0.0.7'
+        )
+        self.assertEqual(client_ip(request), '10.0.0.7')
+        with self.settings(RATELIMIT_TRUSTED_PROXIES=2):
+            request.META['HTTP_X_FORWARDED_FOR'] += ', 172.16.0.1'
+            self.assertEqual(client_ip(request), '10.0.0.7')
+        del request.META['HTTP_X_FORWARDED_FOR']
+        self.assertEqual(client_ip(request), '127.0.0.1')
+
+    @override_settings(MAX_CONCURRENT_REQUESTS=1)
+    def test_excess_concurrent_request_is_shed(self):
+        """Запрос сверх лимита одновременных сразу получает 503."""
+        request = RequestFactory().get('/')
+        inner = ConcurrencyLimitMiddleware(lambda request: HttpResponse())
+        outer = ConcurrencyLimitMiddleware(inner)
+        response = outer(request)
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(inner(request).status_code, 200)
+
+    @override_settings(MAX_CONCURRENT_REQUESTS=1)
+    def test_streaming_response_holds_slot_until_sent(self):
+        """Потоковый ответ занимает место, пока тело не отправлено."""
+        request = RequestFactory().get('/')
+        middleware = ConcurrencyLimitMiddleware(
+            lambda request: StreamingHttpResponse(iter([b'head', b'body']))
+        )
+        response = middleware(request)
+        self.assertEqual(middleware(request).status_code, 503)
+        self.assertEqual(b''.join(response.streaming_content), b'headbody')
+        response = middleware(request)
+        self.assertEqual(response.status_code, 200)
+        # Сервер закрыл ответ, не дочитав тело, — место тоже свободно
+        response.close()
+        self.assertEqual(concurrency_limiter.stats()['in_flight'], 0)
+
+
+class MetricsTest(TestCase):
+    def test_histogram_is_rendered_cumulatively(self):
+        """Гистограмма выгружается накопительными корзинами."""
+        metrics = Registry()
+        latency = metrics.histogram(
+            'latency', 'Задержка', ('view',), buckets=(0.1, 1)
+        )
+        for value in (0.05, 0.5, 5):
+            latency.observe(value, view='index')
+        text = metrics.render()
+        self.assertIn('latency_bucket{view="index",le="0.1"} 1', text)
+        self.assertIn('latency_bucket{view="index",le="1"} 2', text)
+        self.assertIn('latency_bucket{view="index",le="+Inf"} 3', text)
+        self.assertIn('latency_count{view="index"} 3', text)
+
+    def test_snapshots_of_processes_are_summed(self):
+        """Счётчики процессов складываются, старые датчики отбрасываются."""
+        now = time.time()
+
+        def snapshot(at, value):
+            return {'time': at, 'metrics': {
+                'hits': {
+                    'kind': 'counter', 'help': '', 'labels': ['cache'],
+                    'values': [[['default'], value]],
+                },
+                'active': {
+                    'kind': 'gauge', 'help': '', 'labels': [],
+                    'values': [[[], value]],
+                },
+            }}
+
+        merged = merge([snapshot(now, 2), snapshot(now - 3600, 3)])
+        self.assertEqual(merged['hits']['values'], [(('default',), 5)])
+        self.assertEqual(merged['active']['values'], [((), 2)])
+
+    def test_snapshot_files_are_aggregated(self):
+        """Выгрузка учитывает снимки других процессов из METRICS_DIR."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        other = {'time': time.time(), 'metrics': {
+            'yatube_test_total': {
+                'kind': 'counter', 'help': 'Тест', 'labels': [],
+                'values': [[[], 40]],
+            },
+        }}
+        with open(os.path.join(directory, 'other-1.json'), 'w') as file:
+            json.dump(other, file)
+        metrics = Registry()
+        metrics.counter('yatube_test_total', 'Тест').inc(2)
+        with override_settings(METRICS_DIR=directory):
+            metrics.flush()
+            self.assertIn('yatube_test_total 42', metrics.render())
+
+    def test_requests_and_cache_are_measured(self):
+        """Запрос к view и обращения к кэшу видны в /metrics."""
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        text = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn(
+            'yatube_request_duration_seconds_count'
+            '{view="posts:index",method="GET",status="2xx"}',
+            text,
+        )
+        self.assertIn('yatube_db_queries_total{view="posts:index"', text)
+        self.assertIn(
+            'yatube_cache_requests_total{cache="default",result="hit"}', text
+        )
+        self.assertIn('yatube_requests_active 1', text)
+
+    @override_settings(METRICS_ALLOWED_IPS=())
+    def test_metrics_are_restricted(self):
+        """/metrics доступен только сотрудникам и с разрешённых адресов."""
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        staff = User.objects.create_user('admin', is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+
+    @override_settings(
+        METRICS_ALLOWED_IPS=('127.0.0.1',),
+        RATELIMIT_IP_HEADER='HTTP_X_FORWARDED_FOR',
+    )
+    def test_metrics_ignore_spoofed_forwarded_address(self):
+        """Подставленный клиентом X-Forwarded-For не открывает /metrics."""
+        url = reverse('metrics')
+        response = self.client.get(
+            url, HTTP_X_FORWARDED_FOR='127.0.0.1, 203.0.113.5'
+        )
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get(url, HTTP_X_FORWARDED_FOR='127.0.0.1')
+        self.assertEqual(response.status_code, 200)
+
+
+class AccessLogTest(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'access.jsonl')
+
+    def test_request_is_logged(self):
+        """Каждый запрос даёт одну строку JSON с временем и SQL."""
+        with override_settings(ACCESS_LOG_FILE=self.path):
+            self.client.get(reverse('posts:index'))
+            self.client.get('/nonexistent-page/')
+            access_log.flush()
+        with open(self.path) as log_file:
+            records = [json.loads(line) for line in log_file]
+        self.assertEqual(len(records), 2)
+        index, missing = records
+        self.assertEqual(index['route'], 'posts:index')
+        self.assertEqual(index['s'], 200)
+        self.assertEqual(index['u'], 'anon')
+        self.assertGreater(index['q'], 0)
+        self.assertGreater(index['b'], 0)
+        self.assertEqual(missing['s'], 404)
+        self.assertEqual(missing['route'], '')
+
+    @override_settings(ACCESS_LOG_FLUSH_INTERVAL=3600)
+    def test_writer_restarts_dead_thread(self):
+        """Мёртвый поток писателя запускается заново, записи не теряются."""
+        writer = AccessLogWriter()
+        writer.write({'p': '/first'})
+        dead = threading.Thread(target=lambda: None)
+        dead.start()
+        dead.join()
+        writer.thread = dead
+        writer.write({'p': '/second'})
+        self.assertTrue(writer.thread.is_alive())
+        with override_settings(ACCESS_LOG_FILE=self.path):
+            self.assertEqual(writer.flush(), 2)
+        with open(self.path) as log_file:
+            paths = [json.loads(line)['p'] for line in log_file]
+        self.assertEqual(paths, ['/first', '/second'])
+
+    def test_analyzer_reports_percentiles_and_offenders(self):
+        """Разбор журнала выводит перцентили и медленные запросы."""
+        now = time.time()
+        with open(self.path, 'w') as log_file:
+            for i in range(1, 101):
+                log_file.write(json.dumps({
+                    't': now - i, 'route': 'posts:index', 'm': 'GET',
+                    'p': f'/?page={i}', 's': 200, 'ms': i, 'db_ms': 1,
+                    'q': 3, 'c': 'miss',
+                }) + '\n')
+            log_file.write(json.dumps({
+                't': now - 7200, 'route': 'posts:profile', 's': 200,
+                'ms': 5000,
+            }) + '\nне json\n')
+        out = StringIO()
+        call_command(
+            'analyze_access_log', self.path, '--since', '1h', '--top', '2',
+            stdout=out,
+        )
+        report = out.getvalue()
+        self.assertIn('100 запросов', report)
+        self.assertIn('неразобранных строк: 1', report)
+        self.assertNotIn('posts:profile', report)
+        self.assertRegex(report, r'posts:index\s+100\s+0\s+50\.5\s+95\.0')
+        self.assertIn('/?page=100', report)
+        self.assertIn('/?page=99', report)
+        self.assertNotIn('/?page=98 ', report)
+
+    def test_analyzer_without_slowest_requests(self):
+        """--top 0 скрывает медленные запросы, отрицательный --top — ошибка."""
+        with open(self.path, 'w') as log_file:
+            for ms in (10, 20):
+                log_file.write(json.dumps({
+                    't': time.time(), 'route': 'posts:index', 'p': '/',
+                    's': 200, 'ms': ms,
+                }) + '\n')
+        out = StringIO()
+        call_command('analyze_access_log', self.path, '--top', '0', stdout=out)
+        self.assertIn('2 запросов', out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('analyze_access_log', self.path, '--top', '-1')
+
+
+class ProductionTemplatesTest(SimpleTestCase):
+    def test_production_profile(self):
+        """В боевых настройках нет debug, шаблоны берутся из кэша."""
+        options = settings_production.TEMPLATES[0]['OPTIONS']
+        self.assertFalse(settings_production.DEBUG)
+        self.assertNotIn(
+            'django.template.context_processors.debug',
+            options['context_processors'],
+        )
+        self.assertEqual(
+            options['loaders'][0][0], 'django.template.loaders.cached.Loader'
+        )
+
+    def test_session_cache_is_shared(self):
+        """Сессии и лимиты в боевых настройках лежат в общем кэше."""
+        self.assertTrue(settings_production.RATELIMIT_LOCK_FILE)
+        for alias in (
+            settings_production.SESSION_CACHE_ALIAS,
+            settings_production.RATELIMIT_CACHE,
+        ):
+            backend = settings_production.CACHES[alias]['BACKEND']
+            self.assertNotIn(
+                backend, settings_production.PROCESS_LOCAL_CACHES
+            )
+
+    def test_precompile_fills_cache(self):
+        """После прекомпиляции шаблоны страниц уже лежат в кэше загрузчика."""
+        backend = make_backend(settings_production)
+        self.assertGreater(precompile_templates([backend]), 0)
+        loader = backend.engine.template_loaders[0]
+        self.assertIn('posts/index.html', loader.get_template_cache)
+        self.assertIn('admin/base.html', loader.get_template_cache)
+
+
+class CachedSessionTest(TestCase):
+    def setUp(self):
+        write_behind.flush()
+
+    def test_unchanged_session_is_not_written(self):
+        """Сессия попадает в базу только после изменения данных."""
+        session = SessionStore()
+        session['cart'] = [1]
+        session.save()
+        self.assertFalse(Session.objects.filter(
+            session_key=session.session_key
+        ).exists())
+        write_behind.flush()
+        self.assertTrue(Session.objects.filter(
+            session_key=session.session_key
+        ).exists())
+        loaded = SessionStore(session.session_key)
+        self.assertEqual(loaded['cart'], [1])
+        loaded.modified = True
+        loaded.save()
+        self.assertEqual(write_behind.pending, {})
+
+    def test_session_is_loaded_from_db_on_cache_miss(self):
+        """После промаха кэша данные читаются из базы."""
+        session = SessionStore()
+        session['key'] = 'value'
+        session.save()
+        write_behind.flush()
+        session._cache.clear()
+        with self.assertNumQueries(1):
+            self.assertEqual(SessionStore(session.session_key)['key'], 'value')
+
+    def test_anonymous_request_does_not_touch_session(self):
+        """Анонимный запрос без cookie не читает и не пишет сессию."""
+        self.client.get(reverse('posts:index'))
+        self.assertEqual(write_behind.pending, {})
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, self.client.cookies)
+
+    def test_deleted_session_is_gone_everywhere(self):
+        """Удаление сразу убирает строку и не даёт вернуть сессию."""
+        session = SessionStore()
+        session['user'] = 1
+        session.save()
+        write_behind.flush()
+        key = session.session_key
+        session.delete()
+        self.assertFalse(Session.objects.filter(session_key=key).exists())
+        # Запоздалая запись той же сессии из очереди другого процесса
+        expire_date = timezone.now() + timedelta(days=1)
+        write_behind.put(key, session.encode({'user': 1}), expire_date)
+        write_behind.flush()
+        self.assertFalse(Session.objects.filter(session_key=key).exists())
+        self.assertEqual(SessionStore(key).load(), {})
+
+    def test_expired_sessions_are_purged_in_chunks(self):
+        """Просроченные сессии удаляются порциями, живые остаются."""
+        past = timezone.now() - timedelta(days=1)
+        Session.objects.bulk_create([
+            Session(
+                session_key=f'expired{i}', session_data='', expire_date=past
+            )
+            for i in range(5)
+        ])
+        session = SessionStore()
+        session['key'] = 'value'
+        session.save()
+        write_behind.flush()
+        self.assertEqual(purge_expired(chunk_size=2, max_chunks=1), 2)
+        self.assertEqual(purge_expired(chunk_size=2), 3)
+        self.assertEqual(
+            list(Session.objects.values_list('session_key', flat=True)),
+            [session.session_key],
+        )
@@ -0,0 +1,155 @@
+"""Последовательное выполнение пишущих транзакций.
+
+SQLite допускает только одного писателя. Вместо того чтобы запросы
+одновременно боролись за блокировку и падали с «database is locked»,
+они встают в очередь: сначала внутри процесса (threading.Lock),
+затем между процессами (flock на файле рядом с базой).
+
+В очереди выполняется только сама запись — write_coordinator.run
+вокруг save() или bulk_create(), а не весь view: проверка формы
+и рендеринг шаблона идут без блокировки. Вложенный run в том же
+потоке выполняется внутри уже занятой очереди.
+"""
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+
+try:
+    import fcntl
+except ImportError:  # Windows: остаётся только блокировка внутри процесса
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+def default_lock_file():
+    database = settings.DATABASES['default']
+    name = str(database.get('NAME', ''))
+    if 'sqlite' not in database['ENGINE'] or 'memory' in name:
+        return None
+    return f'{name}.write.lock'
+
+
+def is_busy_error(error):
+    return 'locked' in str(error) or 'busy' in str(error)
+
+
+class WriteCoordinator:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stats_lock = threading.Lock()
+        self.local = threading.local()  # Глубина вложенных run в потоке
+        self.waiting = 0
+        self.acquired = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+        self.retries = 0
+        self.failures = 0
+
+    @property
+    def enabled(self):
+        return settings.WRITE_SERIALIZATION and connection.vendor == 'sqlite'
+
+    @property
+    def lock_file(self):
+        if settings.WRITE_LOCK_FILE is not None:
+            return settings.WRITE_LOCK_FILE
+        return default_lock_file()
+
+    @contextmanager
+    def slot(self):
+        """Ожидает своей очереди на запись."""
+        started = time.monotonic()
+        with self.stats_lock:
+            self.waiting += 1
+        try:
+            with self.lock, self._file_lock():
+                waited = time.monotonic() - started
+                with self.stats_lock:
+                    self.waiting -= 1
+                    self.acquired += 1
+                    self.wait_time += waited
+                    self.max_wait = max(self.max_wait, waited)
+                started = None
+                yield
+        finally:
+            if started is not None:
+                with self.stats_lock:
+                    self.waiting -= 1
+
+    @contextmanager
+    def _file_lock(self):
+        path = self.lock_file
+        if fcntl is None or path is None:
+            yield
+            return
+        descriptor = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(descriptor, fcntl.LOCK_EX)
+            yield
+        finally:
+            fcntl.flock(descriptor, fcntl.LOCK_UN)
+            os.close(descriptor)
+
+    def run(self, func, *args, **kwargs):
+        """Выполняет func в транзакции в порядке очереди.
+
+        При SQLITE_BUSY транзакция повторяется не более WRITE_RETRIES раз
+        с экспоненциальной задержкой и случайным разбросом. Вызов изнутри
+        другого run выполняется сразу, в точке сохранения: очередь уже
+        занята этим потоком, а повтор выполнит внешний run.
+        """
+        if not self.enabled or getattr(self.local, 'depth', 0):
+            with transaction.atomic():
+                return func(*args, **kwargs)
+        attempt = 0
+        while True:
+            try:
+                with self.slot(), transaction.atomic():
+                    return self._call(func, *args, **kwargs)
+            except OperationalError as error:
+                retry = (
+                    is_busy_error(error)
+                    and attempt < settings.WRITE_RETRIES
+                )
+                if not retry:
+                    with self.stats_lock:
+                        self.failures += 1
+                    raise
+                attempt += 1
+                with self.stats_lock:
+                    self.retries += 1
+                delay = settings.WRITE_RETRY_BACKOFF * 2 ** (attempt - 1)
+                delay *= random.uniform(0.5, 1.5)
+                logger.warning(
+                    'База занята, повтор записи %s через %.3f с',
+                    attempt, delay,
+                )
+                time.sleep(delay)
+
+    def _call(self, func, *args, **kwargs):
+        self.local.depth = getattr(self.local, 'depth', 0) + 1
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.local.depth -= 1
+
+    def stats(self):
+        with self.stats_lock:
+            return {
+                'waiting': self.waiting,
+                'acquired': self.acquired,
+                'wait_time': self.wait_time,
+                'max_wait': self.max_wait,
+                'retries': self.retries,
+                'failures': self.failures,
+            }
+
+
+write_coordinator = WriteCoordinator()
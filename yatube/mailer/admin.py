@@ -0,0 +1,26 @@
+from django.contrib import admin
+from django.utils import timezone
+
+from .models import Email
+
+
+def requeue(modeladmin, request, queryset):
+    queryset.update(
+        status=Email.QUEUED, attempts=0, next_attempt=timezone.now()
+    )
+
+
+requeue.short_description = 'Отправить повторно'
+
+
+class EmailAdmin(admin.ModelAdmin):
+    list_display = (
+        'pk', 'subject', 'recipients', 'status', 'attempts', 'created', 'sent'
+    )
+    list_filter = ('status',)
+    search_fields = ('subject', 'recipients', 'last_error')
+    readonly_fields = ('payload', 'created', 'sent', 'locked_by')
+    actions = (requeue,)
+
+
+admin.site.register(Email, EmailAdmin)
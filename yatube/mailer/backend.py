@@ -0,0 +1,20 @@
+from django.core.mail.backends.base import BaseEmailBackend
+
+from .outbox import enqueue
+
+
+class EmailBackend(BaseEmailBackend):
+    """Почтовый бэкенд, который только ставит письма в очередь.
+
+    Отправляет их manage.py send_outbox через MAILER_BACKEND.
+    """
+
+    def send_messages(self, email_messages):
+        if not email_messages:
+            return 0
+        try:
+            return enqueue(email_messages)
+        except Exception:
+            if not self.fail_silently:
+                raise
+            return 0
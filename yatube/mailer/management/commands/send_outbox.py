@@ -0,0 +1,31 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from mailer.outbox import send_outbox
+
+
+class Command(BaseCommand):
+    help = (
+        'Отправляет письма из очереди пачками через MAILER_BACKEND. '
+        'С --loop работает постоянно, проверяя очередь каждые --sleep секунд'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int)
+        parser.add_argument('--loop', action='store_true')
+        parser.add_argument(
+            '--sleep', type=float, default=settings.MAILER_SEND_INTERVAL
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = send_outbox(batch_size=options['batch_size'])
+            if sent or failed or not options['loop']:
+                self.stdout.write(
+                    f'Отправлено писем: {sent}, с ошибкой: {failed}'
+                )
+            if not options['loop']:
+                return
+            time.sleep(options['sleep'])
@@ -0,0 +1,53 @@
+import json
+
+from django.db import models
+from django.utils import timezone
+
+
+class Email(models.Model):
+    QUEUED = 'queued'
+    SENDING = 'sending'
+    SENT = 'sent'
+    DEAD = 'dead'
+    STATUSES = (
+        (QUEUED, 'В очереди'),
+        (SENDING, 'Отправляется'),
+        (SENT, 'Отправлено'),
+        (DEAD, 'Не доставлено'),
+    )
+
+    subject = models.CharField('Тема', max_length=255, blank=True)
+    recipients = models.TextField('Получатели', blank=True)
+    # Письмо целиком: поля EmailMessage, альтернативы и вложения
+    payload = models.TextField('Письмо (JSON)')
+    status = models.CharField(
+        'Состояние', max_length=10, choices=STATUSES, default=QUEUED
+    )
+    attempts = models.PositiveSmallIntegerField('Попыток', default=0)
+    next_attempt = models.DateTimeField(
+        'Следующая попытка', default=timezone.now
+    )
+    created = models.DateTimeField('Создано', auto_now_add=True)
+    sent = models.DateTimeField('Отправлено', null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField('Последняя ошибка', blank=True)
+
+    class Meta:
+        ordering = ('next_attempt', 'id')
+        verbose_name = 'Письмо'
+        verbose_name_plural = 'Исходящие письма'
+        indexes = [
+            models.Index(
+                fields=['status', 'next_attempt'],
+                name='email_outbox_idx',
+            ),
+            models.Index(fields=['locked_by'], name='email_locked_by_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.subject} → {self.recipients}'
+
+    @property
+    def data(self):
+        return json.loads(self.payload)
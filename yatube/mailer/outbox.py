@@ -0,0 +1,264 @@
+"""Исходящие письма: очередь в базе и отправка пачками.
+
+Почтовый бэкенд (mailer.backend.EmailBackend) только записывает письма
+в таблицу, поэтому запрос не ждёт доставки. Отправитель (manage.py
+send_outbox или задача воркера) забирает пачку писем и отправляет их
+через одно соединение настоящего бэкенда MAILER_BACKEND. Неудачная
+отправка повторяется с растущей задержкой, после MAILER_MAX_ATTEMPTS
+попыток письмо помечается недоставленным и больше не отправляется.
+"""
+import base64
+import json
+import logging
+import os
+import random
+import socket
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db.models import Case, Count, F, Q, When
+from django.utils import timezone
+
+from core.metrics import registry as metrics
+from core.writes import write_coordinator
+
+from .models import Email
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_FIELDS = (
+    'subject', 'body', 'from_email', 'to', 'cc', 'bcc', 'reply_to',
+    'extra_headers',
+)
+
+
+def serialize(message):
+    """EmailMessage в JSON; вложения кодируются в base64."""
+    data = {field: getattr(message, field) for field in MESSAGE_FIELDS}
+    data['alternatives'] = getattr(message, 'alternatives', [])
+    data['attachments'] = []
+    for attachment in message.attachments:
+        if isinstance(attachment, tuple):
+            filename, content, mimetype = attachment
+        else:
+            # Готовый MIME-объект раскладываем на имя, тело и тип
+            filename = attachment.get_filename()
+            content = attachment.get_payload(decode=True)
+            mimetype = attachment.get_content_type()
+        if isinstance(content, str):
+            content = content.encode()
+        data['attachments'].append(
+            [filename, base64.b64encode(content).decode(), mimetype]
+        )
+    return json.dumps(data)
+
+
+def deserialize(payload):
+    data = json.loads(payload)
+    message = EmailMultiAlternatives(
+        alternatives=[tuple(item) for item in data.pop('alternatives')],
+        headers=data.pop('extra_headers'),
+        **{
+            field: data[field] for field in MESSAGE_FIELDS
+            if field != 'extra_headers'
+        }
+    )
+    for filename, content, mimetype in data['attachments']:
+        message.attach(filename, base64.b64decode(content), mimetype)
+    return message
+
+
+def enqueue(messages):
+    """Записывает письма в очередь; возвращает их число."""
+    emails = [
+        Email(
+            subject=str(message.subject)[:255],
+            recipients=', '.join(message.recipients()),
+            payload=serialize(message),
+        )
+        for message in messages
+        if message.recipients()
+    ]
+    write_coordinator.run(Email.objects.bulk_create, emails)
+    return len(emails)
+
+
+def retry_delay(attempts):
+    """Экспоненциальная задержка перед повтором со случайным разбросом."""
+    delay = min(
+        settings.MAILER_RETRY_BACKOFF * 2 ** (attempts - 1),
+        settings.MAILER_RETRY_MAX,
+    )
+    return delay * random.uniform(0.5, 1.5)
+
+
+def abandoned(now):
+    # Письма, отправитель которых пропал посреди отправки
+    return Q(status=Email.SENDING, locked_until__lt=now)
+
+
+def bury_abandoned(now):
+    """Откладывает брошенные письма, для которых это была последняя попытка.
+
+    Пропавшая отправка считается неудачной попыткой: иначе письмо,
+    на котором падает отправитель, повторялось бы бесконечно.
+    """
+    last = abandoned(now) & Q(attempts__gte=settings.MAILER_MAX_ATTEMPTS - 1)
+    if not Email.objects.filter(last).exists():
+        return
+    write_coordinator.run(
+        lambda: Email.objects.filter(last).update(
+            status=Email.DEAD,
+            attempts=F('attempts') + 1,
+            locked_by='',
+            locked_until=None,
+            last_error='Отправитель пропал во время отправки',
+        )
+    )
+
+
+def claim(batch_size, sender):
+    """Забирает пачку писем, которые пора отправить."""
+    now = timezone.now()
+    bury_abandoned(now)
+    ready = Q(status=Email.QUEUED, next_attempt__lte=now) | abandoned(now)
+    ids = list(
+        Email.objects.filter(ready).order_by('next_attempt', 'id')
+        .values_list('id', flat=True)[:batch_size]
+    )
+    if not ids:
+        return []
+    token = f'{sender}:{uuid.uuid4().hex}'
+    write_coordinator.run(
+        lambda: Email.objects.filter(ready, id__in=ids).update(
+            status=Email.SENDING,
+            locked_by=token,
+            locked_until=now + timedelta(seconds=settings.MAILER_LEASE),
+            attempts=Case(
+                When(abandoned(now), then=F('attempts') + 1),
+                default=F('attempts'),
+            ),
+        )
+    )
+    return list(Email.objects.filter(locked_by=token).order_by('id'))
+
+
+def renew(email):
+    """Продлевает аренду письма; False, если его забрал другой отправитель.
+
+    Аренда берётся на всю пачку, а медленный SMTP-сервер может не успеть
+    отправить её за MAILER_LEASE: без продления письма из хвоста пачки
+    отправил бы ещё и тот, кто заберёт их по истёкшей аренде.
+    """
+    return bool(
+        Email.objects.filter(
+            pk=email.pk, locked_by=email.locked_by, status=Email.SENDING
+        ).update(
+            locked_until=timezone.now() + timedelta(
+                seconds=settings.MAILER_LEASE
+            )
+        )
+    )
+
+
+def finish(email, error=None):
+    now = timezone.now()
+    attempts = email.attempts + 1
+    if error is None:
+        changes = {'status': Email.SENT, 'sent': now, 'last_error': ''}
+    elif attempts >= settings.MAILER_MAX_ATTEMPTS:
+        changes = {'status': Email.DEAD, 'last_error': error}
+    else:
+        changes = {
+            'status': Email.QUEUED,
+            'next_attempt': now + timedelta(seconds=retry_delay(attempts)),
+            'last_error': error,
+        }
+    Email.objects.filter(pk=email.pk, locked_by=email.locked_by).update(
+        attempts=attempts, locked_by='', locked_until=None, **changes
+    )
+
+
+def send_batch(emails, connection):
+    """Отправляет письма через одно соединение; возвращает (sent, failed)."""
+    sent = failed = 0
+    for email in emails:
+        if not write_coordinator.run(renew, email):
+            logger.info('Письмо %s уже отправляет другой процесс', email.pk)
+            continue
+        try:
+            # Открытое здесь соединение бэкенд не закрывает после
+            # send_messages, и следующие письма идут через него же
+            connection.open()
+            connection.send_messages([deserialize(email.payload)])
+        except Exception as error:
+            logger.warning('Письмо %s не отправлено: %s', email.pk, error)
+            error = f'{type(error).__name__}: {error}'
+            write_coordinator.run(finish, email, error)
+            failed += 1
+            # Соединение после ошибки может быть в неизвестном состоянии
+            connection.close()
+            continue
+        write_coordinator.run(finish, email)
+        sent += 1
+    return sent, failed
+
+
+def send_outbox(batch_size=None, max_batches=None):
+    """Отправляет письма из очереди пачками, пока она не опустеет.
+
+    Возвращает число отправленных и неотправленных писем.
+    """
+    batch_size = batch_size or settings.MAILER_BATCH_SIZE
+    sender = f'{socket.gethostname()}:{os.getpid()}'
+    sent = failed = batches = 0
+    connection = get_connection(settings.MAILER_BACKEND)
+    try:
+        while max_batches is None or batches < max_batches:
+            emails = claim(batch_size, sender)
+            if not emails:
+                break
+            batch_sent, batch_failed = send_batch(emails, connection)
+            sent += batch_sent
+            failed += batch_failed
+            batches += 1
+    finally:
+        connection.close()
+    return sent, failed
+
+
+def stats():
+    depth = {status: 0 for status, _ in Email.STATUSES}
+    rows = Email.objects.order_by().values('status').annotate(
+        count=Count('id')
+    )
+    for row in rows:
+        depth[row['status']] = row['count']
+    oldest = (
+        Email.objects.filter(status=Email.QUEUED)
+        .order_by('created').values_list('created', flat=True).first()
+    )
+    return {
+        'depth': depth,
+        'oldest_queued_age': (
+            (timezone.now() - oldest).total_seconds()
+            if oldest is not None else 0.0
+        ),
+    }
+
+
+@metrics.collector(scope='global')
+def collect_outbox():
+    outbox = stats()
+    for status, count in outbox['depth'].items():
+        yield (
+            'yatube_emails', 'Исходящие письма по состоянию',
+            {'status': status}, count,
+        )
+    yield (
+        'yatube_emails_oldest_queued_seconds',
+        'Сколько ждёт самое старое письмо в очереди',
+        {}, outbox['oldest_queued_age'],
+    )
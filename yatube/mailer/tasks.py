@@ -0,0 +1,11 @@
+from django.conf import settings
+
+from tasks.queue import task
+
+from .outbox import send_outbox as drain_outbox
+
+
+@task(every=settings.MAILER_SEND_INTERVAL, priority=5)
+def send_outbox():
+    """Отправляет накопившиеся письма, если запущен воркер задач."""
+    drain_outbox()
@@ -0,0 +1,127 @@
+from datetime import timedelta
+
+from django.core import mail
+from django.core.mail import (EmailMultiAlternatives, get_connection,
+                              send_mail)
+from django.core.mail.backends.locmem import EmailBackend as LocmemBackend
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from posts.models import User
+
+from .models import Email
+from .outbox import claim, send_batch, send_outbox
+
+
+class CountingBackend(LocmemBackend):
+    connections = 0
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        CountingBackend.connections += 1
+
+
+class FailingBackend(LocmemBackend):
+    def send_messages(self, messages):
+        raise ConnectionError('сервер недоступен')
+
+
+@override_settings(
+    EMAIL_BACKEND='mailer.backend.EmailBackend',
+    MAILER_BACKEND='mailer.tests.CountingBackend',
+)
+class OutboxTest(TestCase):
+    def test_backend_only_enqueues(self):
+        """Бэкенд записывает письмо в очередь и ничего не отправляет."""
+        send_mail('Тема', 'Текст', 'from@yatube.ru', ['to@yatube.ru'])
+        self.assertEqual(len(mail.outbox), 0)
+        email = Email.objects.get()
+        self.assertEqual(email.status, Email.QUEUED)
+        self.assertEqual(email.recipients, 'to@yatube.ru')
+
+    def test_password_reset_does_not_send_in_request(self):
+        """Сброс пароля ставит письмо в очередь вместо отправки."""
+        User.objects.create_user(
+            'reader', email='reader@yatube.ru', password='secret-42'
+        )
+        response = self.client.post(
+            reverse('password_reset'), {'email': 'reader@yatube.ru'}
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(Email.objects.count(), 1)
+
+    def test_outbox_is_sent_in_batches_over_one_connection(self):
+        """Очередь отправляется пачками через одно соединение."""
+        message = EmailMultiAlternatives(
+            'Письмо', 'Текст', 'from@yatube.ru', ['to@yatube.ru']
+        )
+        message.attach_alternative('<b>Текст</b>', 'text/html')
+        message.attach('file.txt', 'вложение', 'text/plain')
+        message.send()
+        for i in range(4):
+            send_mail(f'Тема {i}', 'Текст', None, [f'to{i}@yatube.ru'])
+        CountingBackend.connections = 0
+        self.assertEqual(send_outbox(batch_size=2), (5, 0))
+        self.assertEqual(CountingBackend.connections, 1)
+        self.assertEqual(len(mail.outbox), 5)
+        sent = mail.outbox[0]
+        self.assertEqual(sent.subject, 'Письмо')
+        self.assertEqual(sent.to, ['to@yatube.ru'])
+        self.assertEqual(sent.alternatives, [('<b>Текст</b>', 'text/html')])
+        self.assertEqual(sent.attachments[0][:2], ('file.txt', 'вложение'))
+        self.assertFalse(Email.objects.exclude(status=Email.SENT).exists())
+
+    @override_settings(
+        MAILER_BACKEND='mailer.tests.FailingBackend', MAILER_MAX_ATTEMPTS=2
+    )
+    def test_failed_email_is_retried_then_dead_lettered(self):
+        """Неотправленное письмо повторяется, затем откладывается."""
+        send_mail('Тема', 'Текст', None, ['to@yatube.ru'])
+        with self.assertLogs('mailer.outbox', 'WARNING'):
+            self.assertEqual(send_outbox(), (0, 1))
+        email = Email.objects.get()
+        self.assertEqual(email.status, Email.QUEUED)
+        self.assertGreater(email.next_attempt, timezone.now())
+        self.assertEqual(send_outbox(), (0, 0))
+        Email.objects.update(
+            next_attempt=timezone.now() - timedelta(seconds=1)
+        )
+        with self.assertLogs('mailer.outbox', 'WARNING'):
+            send_outbox()
+        email.refresh_from_db()
+        self.assertEqual(email.status, Email.DEAD)
+        self.assertIn('сервер недоступен', email.last_error)
+
+    @override_settings(MAILER_MAX_ATTEMPTS=2)
+    def test_abandoned_email_counts_as_attempt(self):
+        """Брошенная отправка считается попыткой и ведёт к отказу."""
+        send_mail('Тема', 'Текст', None, ['to@yatube.ru'])
+        expired = timezone.now() - timedelta(seconds=1)
+        claim(10, 'lost')
+        Email.objects.update(locked_until=expired)
+        self.assertEqual(claim(10, 'next')[0].attempts, 1)
+        Email.objects.update(locked_until=expired)
+        self.assertEqual(claim(10, 'last'), [])
+        email = Email.objects.get()
+        self.assertEqual(email.status, Email.DEAD)
+        self.assertEqual(email.attempts, 2)
+        self.assertEqual(email.locked_by, '')
+        self.assertIn('пропал', email.last_error)
+
+    def test_email_taken_over_is_not_sent_twice(self):
+        """Письмо, которое забрал другой отправитель, не отправляется."""
+        for number in range(2):
+            send_mail(f'Тема {number}', 'Текст', None, ['to@yatube.ru'])
+        emails = claim(10, 'slow')
+        # Аренда истекла, и второе письмо забрал другой отправитель
+        Email.objects.filter(pk=emails[1].pk).update(locked_by='other')
+        connection = get_connection('mailer.tests.CountingBackend')
+        with self.assertLogs('mailer.outbox', 'INFO'):
+            self.assertEqual(send_batch(emails, connection), (1, 0))
+        self.assertEqual(
+            [message.subject for message in mail.outbox], ['Тема 0']
+        )
+        self.assertEqual(
+            Email.objects.get(pk=emails[1].pk).status, Email.SENDING
+        )
@@ -0,0 +1,171 @@
+"""Read-only JSON API для мобильного клиента.
+
+Ответы собираются из строк values() с нужными столбцами, без шаблонов,
+миниатюр и моделей. Лента листается курсором по (pub_date, id),
+набор полей задаётся параметром ?fields=id,text,author. На каждый ответ
+ставится ETag, и повторный запрос с If-None-Match получает 304.
+"""
+from functools import wraps
+from http import HTTPStatus
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response, set_response_etag
+
+from core.routers import replica_reads
+
+from .cursors import cursor_page
+from .models import Comment, Group, Post, User
+
+# Поле ответа -> поле для values()
+POST_FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'image': 'image',
+}
+COMMENT_FIELDS = {
+    'id': 'id',
+    'author': 'author__username',
+    'text': 'text',
+    'created': 'created',
+}
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 100
+COMMENTS_LIMIT = 20
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=HTTPStatus.BAD_REQUEST):
+        super().__init__(message)
+        self.status = status
+
+
+def api_view(view):
+    """Превращает ApiError в JSON-ответ и ставит ETag."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            data = view(request, *args, **kwargs)
+        except ApiError as error:
+            return JsonResponse({'error': str(error)}, status=error.status)
+        response = JsonResponse(data)
+        response['Vary'] = 'Cookie'
+        set_response_etag(response)
+        return get_conditional_response(
+            request, etag=response['ETag'], response=response
+        )
+    return replica_reads(wrapper)
+
+
+def parse_fields(request):
+    """Поля из ?fields=; по умолчанию все."""
+    raw = request.GET.get('fields')
+    if not raw:
+        return list(POST_FIELDS)
+    fields = [name.strip() for name in raw.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in POST_FIELDS]
+    if unknown:
+        raise ApiError(f'Неизвестные поля: {", ".join(unknown)}')
+    return fields
+
+
+def parse_limit(request):
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise ApiError('limit должен быть числом')
+    return min(max(limit, 1), MAX_LIMIT)
+
+
+def serialize(row, fields, mapping):
+    data = {name: row[mapping[name]] for name in fields}
+    if 'image' in data:
+        data['image'] = (
+            settings.MEDIA_URL + data['image'] if data['image'] else None
+        )
+    return data
+
+
+def feed(request, queryset):
+    """Страница ленты по курсору из ?cursor=."""
+    fields = parse_fields(request)
+    # id и pub_date нужны курсору, даже если клиент их не просил
+    columns = {POST_FIELDS[name] for name in fields} | {'id', 'pub_date'}
+    try:
+        rows, next_cursor = cursor_page(
+            queryset.values(*columns),
+            'pub_date',
+            request.GET.get('cursor'),
+            parse_limit(request),
+            descending=True,
+        )
+    except ValueError:
+        raise ApiError('Неверный курсор')
+    return {
+        'results': [serialize(row, fields, POST_FIELDS) for row in rows],
+        'next_cursor': next_cursor,
+    }
+
+
+@api_view
+def index(request):
+    return feed(request, Post.objects.all())
+
+
+@api_view
+def group_posts(request, slug):
+    group = Group.objects.filter(slug=slug).values('id').first()
+    if group is None:
+        raise ApiError('Группа не найдена', HTTPStatus.NOT_FOUND)
+    return feed(request, Post.objects.filter(group_id=group['id']))
+
+
+@api_view
+def profile(request, username):
+    author = User.objects.filter(username=username).values('id').first()
+    if author is None:
+        raise ApiError('Пользователь не найден', HTTPStatus.NOT_FOUND)
+    return feed(request, Post.objects.filter(author_id=author['id']))
+
+
+@api_view
+def follow_index(request):
+    if not request.user.is_authenticated:
+        raise ApiError('Нужна авторизация', HTTPStatus.UNAUTHORIZED)
+    return feed(
+        request, Post.objects.filter(author__following__user=request.user)
+    )
+
+
+@api_view
+def post_detail(request, post_id):
+    """Пост и первая порция комментариев (дальше — по ?cursor=)."""
+    fields = parse_fields(request)
+    post = (
+        Post.objects.filter(id=post_id)
+        .values(*{POST_FIELDS[name] for name in fields})
+        .first()
+    )
+    if post is None:
+        raise ApiError('Пост не найден', HTTPStatus.NOT_FOUND)
+    try:
+        comments, next_cursor = cursor_page(
+            Comment.objects.filter(post_id=post_id)
+            .values(*COMMENT_FIELDS.values()),
+            'created',
+            request.GET.get('cursor'),
+            COMMENTS_LIMIT,
+        )
+    except ValueError:
+        raise ApiError('Неверный курсор')
+    return {
+        'post': serialize(post, fields, POST_FIELDS),
+        'comments': [
+            serialize(row, COMMENT_FIELDS, COMMENT_FIELDS)
+            for row in comments
+        ],
+        'next_cursor': next_cursor,
+    }
@@ -0,0 +1,44 @@
+from contextlib import contextmanager
+
+from django.core.cache.utils import make_template_fragment_key
+
+from core.cache import fragment_cache
+
+from .models import Comment, Post
+from .paginator import invalidate_counts
+
+DATE_FIELDS = {
+    Post: 'pub_date',
+    Comment: 'created',
+}
+FEED_FRAGMENTS = ('index_page',)  # Фрагменты {% cache %} с лентами
+
+
+def chunked(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+@contextmanager
+def keep_dates(model):
+    """Отключает auto_now_add, чтобы сохранить даты из источника."""
+    field = model._meta.get_field(DATE_FIELDS[model])
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+def invalidate_feeds():
+    """Сбрасывает кэш лент после массовой записи, не трогая остальной кэш."""
+    fragment_cache().delete_many(
+        [make_template_fragment_key(name) for name in FEED_FRAGMENTS]
+    )
+    invalidate_counts()
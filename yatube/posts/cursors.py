@@ -0,0 +1,55 @@
+"""Курсоры для постраничного вывода по ключу (дата, id).
+
+В отличие от OFFSET, выборка следующей страницы по курсору стоит
+одинаково на первой и на тысячной странице: запрос идёт по индексу.
+"""
+import base64
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+def encode_cursor(date, pk):
+    raw = f'{date.isoformat()}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Разбирает курсор; при ошибке бросает ValueError."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        date, pk = raw.split('|')
+        date = parse_datetime(date)
+        pk = int(pk)
+    except (TypeError, UnicodeDecodeError, ValueError) as error:
+        raise ValueError(f'Неверный курсор: {token}') from error
+    if date is None:
+        raise ValueError(f'Неверный курсор: {token}')
+    return date, pk
+
+
+def after_cursor(queryset, field, token, descending=False):
+    """Оставляет объекты строго после курсора в порядке (field, id)."""
+    if not token:
+        return queryset
+    date, pk = decode_cursor(token)
+    direction = 'lt' if descending else 'gt'
+    return queryset.filter(
+        Q(**{f'{field}__{direction}': date})
+        | Q(**{field: date, f'id__{direction}': pk})
+    )
+
+
+def cursor_page(queryset, field, token, size, descending=False):
+    """Страница объектов и курсор следующей страницы (или None)."""
+    order = (f'-{field}', '-id') if descending else (field, 'id')
+    queryset = after_cursor(queryset, field, token, descending)
+    items = list(queryset.order_by(*order)[:size + 1])
+    if len(items) <= size:
+        return items, None
+    items = items[:size]
+    last = items[-1]
+    if isinstance(last, dict):  # Строки values()
+        return items, encode_cursor(last[field], last['id'])
+    return items, encode_cursor(getattr(last, field), last.pk)
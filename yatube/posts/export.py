@@ -0,0 +1,81 @@
+import csv
+import json
+
+from .models import Comment, Follow, Post
+
+DEFAULT_CHUNK_SIZE = 2000  # Количество строк, читаемых за один запрос
+# Колонки выгрузки совпадают с колонками команды import_posts
+EXPORTS = {
+    'post': (Post, {
+        'id': 'id',
+        'text': 'text',
+        'pub_date': 'pub_date',
+        'author': 'author__username',
+        'group': 'group__slug',
+        'image': 'image',
+    }),
+    'comment': (Comment, {
+        'id': 'id',
+        'post': 'post_id',
+        'author': 'author__username',
+        'text': 'text',
+        'created': 'created',
+    }),
+    'follow': (Follow, {
+        'id': 'id',
+        'user': 'user__username',
+        'author': 'author__username',
+    }),
+}
+FORMATS = {
+    'jsonl': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+class Echo:
+    """Буфер для csv.writer, который просто возвращает записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def iter_rows(name, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Обходит таблицу по первичному ключу короткими запросами."""
+    model, columns = EXPORTS[name]
+    lookups = list(columns.values())
+    last_id = 0
+    while True:
+        chunk = list(
+            model.objects.filter(id__gt=last_id)
+            .order_by('id')
+            .values_list(*lookups)[:chunk_size]
+        )
+        if not chunk:
+            return
+        for values in chunk:
+            yield dict(zip(columns, values))
+        last_id = chunk[-1][0]
+
+
+def prepare(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if value is None:
+        return ''
+    return value
+
+
+def iter_export(name, fmt, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Построчно отдаёт выгрузку в формате JSONL или CSV."""
+    _, columns = EXPORTS[name]
+    rows = iter_rows(name, chunk_size)
+    if fmt == 'csv':
+        writer = csv.writer(Echo())
+        yield writer.writerow(columns)
+        for row in rows:
+            yield writer.writerow(prepare(value) for value in row.values())
+        return
+    for row in rows:
+        row = {key: prepare(value) for key, value in row.items()}
+        yield json.dumps(row, ensure_ascii=False) + '\n'
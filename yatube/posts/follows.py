@@ -0,0 +1,65 @@
+"""Подписка и отписка сразу на многих авторов.
+
+Вместо пары exists() + create() на каждого автора подписки пишутся
+одним INSERT с игнорированием конфликтов: повторная подписка и гонка
+двух одинаковых запросов упираются в unique_follow и ничего не ломают.
+"""
+from functools import partial
+
+from django.db import transaction
+
+from .models import Follow, User
+from .recommendations import follow_graph
+
+FOLLOWING = 'following'
+NOT_FOLLOWING = 'not_following'
+NOT_FOUND = 'not_found'
+SELF = 'self'
+
+
+def resolve_authors(usernames):
+    """Словарь username -> User одним запросом."""
+    return {
+        author.username: author
+        for author in User.objects.filter(username__in=set(usernames))
+    }
+
+
+def follow_authors(user, authors):
+    authors = [author for author in authors if author.pk != user.pk]
+    Follow.objects.bulk_create(
+        [Follow(user=user, author=author) for author in authors],
+        ignore_conflicts=True,
+    )
+    # bulk_create не шлёт post_save, поэтому граф обновляем сами
+    for author in authors:
+        transaction.on_commit(partial(follow_graph.add, user.pk, author.pk))
+
+
+def unfollow_authors(user, authors):
+    Follow.objects.filter(user=user, author__in=authors).delete()
+
+
+def apply_follows(user, usernames, follow=True):
+    """Подписывает или отписывает user и возвращает итоговые состояния."""
+    authors = resolve_authors(usernames)
+    if follow:
+        follow_authors(user, authors.values())
+    else:
+        unfollow_authors(user, authors.values())
+    followed = set(
+        Follow.objects.filter(user=user, author__in=authors.values())
+        .values_list('author_id', flat=True)
+    )
+    states = {}
+    for username in usernames:
+        author = authors.get(username)
+        if author is None:
+            states[username] = NOT_FOUND
+        elif author.pk == user.pk:
+            states[username] = SELF
+        elif author.pk in followed:
+            states[username] = FOLLOWING
+        else:
+            states[username] = NOT_FOLLOWING
+    return states
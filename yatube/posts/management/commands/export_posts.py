@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from posts.export import DEFAULT_CHUNK_SIZE, EXPORTS, FORMATS, iter_export
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоковая выгрузка постов, комментариев или подписок в JSONL или CSV '
+        'с постоянным расходом памяти'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', choices=EXPORTS, default='post')
+        parser.add_argument(
+            '--format', choices=FORMATS, default='jsonl', dest='fmt',
+        )
+        parser.add_argument(
+            '--output', help='Файл для выгрузки; по умолчанию stdout',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+        )
+
+    def handle(self, *args, **options):
+        lines = iter_export(
+            options['model'], options['fmt'], options['chunk_size']
+        )
+        if not options['output']:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        with open(
+            options['output'], 'w', encoding='utf-8', newline=''
+        ) as target:
+            for line in lines:
+                target.write(line)
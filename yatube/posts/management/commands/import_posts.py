@@ -0,0 +1,242 @@
+import csv
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.writes import write_coordinator
+from posts.bulk import chunked, invalidate_feeds, keep_dates
+from posts.models import Comment, Follow, Group, Post, User
+from posts.thumbnails import warm_thumbnail
+
+DEFAULT_BATCH_SIZE = 1000  # Количество строк в одной пачке bulk_create
+MAX_REPORTED_ERRORS = 20  # Сколько неверных строк показать в отчёте
+MODELS = {
+    'post': Post,
+    'comment': Comment,
+    'follow': Follow,
+}
+
+
+def read_rows(path, fmt):
+    """Построчно читает JSONL или CSV, не загружая файл в память.
+
+    Вместо строки, которая не разбирается как JSON, возвращается None.
+    """
+    with open(path, encoding='utf-8', newline='') as source:
+        if fmt == 'csv':
+            yield from csv.DictReader(source)
+            return
+        for line in source:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield None
+
+
+def parse_id(value):
+    return int(value) if value else None
+
+
+def parse_date(value):
+    if not value:
+        return timezone.now()
+    date = parse_datetime(value)
+    if date is None:
+        raise ValueError(f'Неверная дата: {value}')
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date, timezone.utc)
+    return date
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоковый импорт постов, комментариев и подписок из JSONL или CSV '
+        'пачками bulk_create'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу JSONL или CSV')
+        parser.add_argument(
+            '--model', choices=MODELS, default='post',
+            help='Что импортируем: post, comment или follow',
+        )
+        parser.add_argument(
+            '--format', choices=('jsonl', 'csv'), dest='fmt',
+            help='Формат файла; по умолчанию берётся из расширения',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+        )
+        parser.add_argument(
+            '--create-missing', action='store_true',
+            help='Создавать отсутствующих авторов и группы',
+        )
+        parser.add_argument(
+            '--thumbnails', action='store_true',
+            help='После импорта заранее создать миниатюры картинок',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['fmt'] or ('csv' if path.endswith('.csv') else 'jsonl')
+        self.model = MODELS[options['model']]
+        self.create_missing = options['create_missing']
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля')
+        # Справочники в памяти: username -> id и slug -> id
+        self.authors = dict(User.objects.values_list('username', 'id'))
+        self.groups = dict(Group.objects.values_list('slug', 'id'))
+        self.images = []
+        self.errors = []
+        build = getattr(self, f'build_{options["model"]}')
+
+        started = time.monotonic()
+        read = inserted = skipped = 0
+        rows = read_rows(path, fmt)
+        for batch in chunked(rows, options['batch_size']):
+            objects = self.build_batch(build, batch, read)
+            read += len(batch)
+            skipped += len(batch) - len(objects)
+            inserted += write_coordinator.run(self.insert, objects)
+            elapsed = time.monotonic() - started or 1e-9
+            self.stdout.write(
+                f'{read} строк, {read / elapsed:.0f} строк/с', ending='\r'
+            )
+        elapsed = time.monotonic() - started or 1e-9
+        self.stdout.write('')
+        self.rebuild_derived(options['thumbnails'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Прочитано {read}, добавлено {inserted}, пропущено {skipped} '
+            f'(из них с ошибками {len(self.errors)}) '
+            f'за {elapsed:.1f} с ({read / elapsed:.0f} строк/с)'
+        ))
+        self.report_errors()
+
+    def build_batch(self, build, batch, offset):
+        """Объекты для пачки; неверные строки пропускаются и запоминаются."""
+        if self.model is Comment:
+            # Одним запросом на пачку проверяем, что посты существуют
+            ids = set()
+            for row in batch:
+                try:
+                    ids.add(int(row['post']))
+                except (KeyError, TypeError, ValueError):
+                    pass  # Такую строку отметит build_comment
+            self.known_posts = set(
+                Post.objects.filter(id__in=ids).values_list('id', flat=True)
+            )
+        objects = []
+        for number, row in enumerate(batch, offset + 1):
+            try:
+                if not isinstance(row, dict):
+                    raise ValueError('строка не разбирается')
+                obj = build(row)
+            except (KeyError, TypeError, ValueError) as error:
+                self.errors.append((number, error))
+                continue
+            if obj is not None:
+                objects.append(obj)
+        return objects
+
+    def report_errors(self):
+        for number, error in self.errors[:MAX_REPORTED_ERRORS]:
+            self.stderr.write(
+                f'Строка {number}: {type(error).__name__}: {error}'
+            )
+        hidden = len(self.errors) - MAX_REPORTED_ERRORS
+        if hidden > 0:
+            self.stderr.write(f'И ещё неверных строк: {hidden}')
+
+    def insert(self, objects):
+        """Вставляет пачку, пропуская дубликаты по ключам и ограничениям."""
+        if self.model is Follow:
+            pairs = {(obj.user_id, obj.author_id) for obj in objects}
+            existing = set(Follow.objects.filter(
+                user_id__in={user for user, _ in pairs},
+                author_id__in={author for _, author in pairs},
+            ).values_list('user_id', 'author_id'))
+            Follow.objects.bulk_create(objects, ignore_conflicts=True)
+            return len(pairs - existing)
+        ids = set()
+        unique = []
+        for obj in objects:
+            if obj.id is None or obj.id not in ids:
+                ids.add(obj.id)
+                unique.append(obj)
+        objects = unique
+        existing = self.model.objects.filter(id__in=ids).count()
+        with keep_dates(self.model):
+            self.model.objects.bulk_create(objects, ignore_conflicts=True)
+        return len(objects) - existing
+
+    def resolve(self, mapping, key, create):
+        if not key:
+            return None
+        if key not in mapping and self.create_missing:
+            mapping[key] = create(key).id
+        return mapping.get(key)
+
+    def author_id(self, username):
+        return self.resolve(
+            self.authors, username,
+            lambda name: User.objects.create_user(username=name),
+        )
+
+    def group_id(self, slug):
+        return self.resolve(
+            self.groups, slug,
+            lambda name: Group.objects.create(
+                title=name, slug=name, description=''
+            ),
+        )
+
+    def build_post(self, row):
+        author_id = self.author_id(row.get('author'))
+        if author_id is None or not row.get('text'):
+            return None
+        image = row.get('image') or ''
+        if image:
+            self.images.append(image)
+        return Post(
+            id=parse_id(row.get('id')),
+            text=row['text'],
+            pub_date=parse_date(row.get('pub_date')),
+            author_id=author_id,
+            group_id=self.group_id(row.get('group')),
+            image=image,
+        )
+
+    def build_comment(self, row):
+        author_id = self.author_id(row.get('author'))
+        post_id = int(row['post'])
+        if author_id is None or post_id not in self.known_posts:
+            return None
+        return Comment(
+            id=parse_id(row.get('id')),
+            post_id=post_id,
+            author_id=author_id,
+            text=row.get('text') or '',
+            created=parse_date(row.get('created')),
+        )
+
+    def build_follow(self, row):
+        user_id = self.author_id(row.get('user'))
+        author_id = self.author_id(row.get('author'))
+        if None in (user_id, author_id) or user_id == author_id:
+            return None
+        return Follow(user_id=user_id, author_id=author_id)
+
+    def rebuild_derived(self, thumbnails):
+        """Пересчитывает производные данные один раз в конце импорта."""
+        invalidate_feeds()
+        if not thumbnails or not self.images:
+            return
+        for batch in chunked(self.images, DEFAULT_BATCH_SIZE):
+            for post in Post.objects.filter(image__in=batch).only('image'):
+                warm_thumbnail(post.image)
@@ -0,0 +1,246 @@
+import bisect
+import io
+import random
+import time
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from faker import Faker
+from PIL import Image
+
+from posts.bulk import chunked, invalidate_feeds, keep_dates
+from posts.models import Comment, Follow, Group, Post, User
+
+DEFAULT_BATCH_SIZE = 5000
+# Все даты отсчитываются от фиксированного момента,
+# чтобы при одном и том же seed данные совпадали полностью
+ANCHOR = datetime(2022, 10, 1, tzinfo=timezone.utc)
+SEED_PASSWORD = 'yatube-seed'
+SENTENCE_POOL_SIZE = 500
+IMAGE_POOL_SIZE = 20
+
+
+class PowerLaw:
+    """Выбор индекса с вероятностью, убывающей как 1 / (i + 1) ** alpha."""
+
+    def __init__(self, size, alpha, rng):
+        self.rng = rng
+        self.cum_weights = list(accumulate(
+            1 / (i + 1) ** alpha for i in range(size)
+        ))
+
+    def __call__(self):
+        point = self.rng.random() * self.cum_weights[-1]
+        return bisect.bisect(self.cum_weights, point)
+
+
+class Command(BaseCommand):
+    help = (
+        'Генерирует синтетические данные со степенным распределением '
+        'авторов, подписок и комментариев'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=20000)
+        parser.add_argument('--comments', type=int, default=50000)
+        parser.add_argument('--follows', type=int, default=20000)
+        parser.add_argument(
+            '--alpha', type=float, default=1.1,
+            help='Показатель степени: чем больше, тем сильнее перекос',
+        )
+        parser.add_argument(
+            '--image-ratio', type=float, default=0.1,
+            help='Доля постов с картинкой',
+        )
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.rng = random.Random(options['seed'])
+        self.faker = Faker('ru_RU')
+        self.faker.seed_instance(options['seed'])
+        self.sentences = [
+            self.faker.sentence(nb_words=12)
+            for _ in range(SENTENCE_POOL_SIZE)
+        ]
+        started = time.monotonic()
+
+        users = self.seed_users(options['users'])
+        groups = self.seed_groups(options['groups'])
+        if users:
+            # Популярность авторов: несколько «звёзд» и длинный хвост
+            self.rng.shuffle(users)
+            popular = PowerLaw(len(users), options['alpha'], self.rng)
+            self.seed_posts(users, groups, popular)
+            self.seed_comments(users)
+            self.seed_follows(users, popular)
+        else:
+            self.stdout.write(
+                'Новых пользователей нет (данные с этим --seed уже '
+                'загружены?), посты, комментарии и подписки не создаются'
+            )
+        invalidate_feeds()
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.monotonic() - started:.1f} с'
+        ))
+
+    def insert(self, label, model, objects):
+        """Вставляет объекты пачками и сообщает скорость.
+
+        Строки, нарушившие ограничения, пропускаются, поэтому добавленные
+        считаются по числу строк в таблице до и после вставки.
+        """
+        started = time.monotonic()
+        before = model.objects.count()
+        total = 0
+        for batch in chunked(objects, self.options['batch_size']):
+            with transaction.atomic():
+                model.objects.bulk_create(batch, ignore_conflicts=True)
+            total += len(batch)
+        inserted = model.objects.count() - before
+        elapsed = time.monotonic() - started or 1e-9
+        self.stdout.write(
+            f'{label}: {inserted} из {total} за {elapsed:.1f} с '
+            f'({total / elapsed:.0f} строк/с)'
+        )
+        return inserted
+
+    def new_ids(self, model, after):
+        return list(
+            model.objects.filter(id__gt=after)
+            .order_by('id')
+            .values_list('id', flat=True)
+        )
+
+    def last_id(self, model):
+        last = model.objects.order_by('-id').values_list('id', flat=True)
+        return last.first() or 0
+
+    def seed_users(self, count):
+        after = self.last_id(User)
+        # Хеш считается один раз: это самая дорогая часть создания юзера
+        password = make_password(SEED_PASSWORD)
+        prefix = f'seed{self.options["seed"]}_'
+        users = (
+            User(
+                username=f'{prefix}{number}',
+                first_name=self.faker.first_name(),
+                last_name=self.faker.last_name(),
+                password=password,
+            )
+            for number in range(count)
+        )
+        self.insert('Пользователи', User, users)
+        return self.new_ids(User, after)
+
+    def seed_groups(self, count):
+        after = self.last_id(Group)
+        groups = (
+            Group(
+                title=self.faker.catch_phrase()[:200],
+                slug=f'seed{self.options["seed"]}-{number}',
+                description=self.rng.choice(self.sentences),
+            )
+            for number in range(count)
+        )
+        self.insert('Группы', Group, groups)
+        return self.new_ids(Group, after)
+
+    def text(self, low, high):
+        return ' '.join(
+            self.rng.choice(self.sentences)
+            for _ in range(self.rng.randint(low, high))
+        )
+
+    def date(self):
+        seconds = self.rng.random() * self.options['days'] * 24 * 3600
+        return ANCHOR - timedelta(seconds=seconds)
+
+    def seed_images(self):
+        """Создаёт небольшой набор картинок, общих для постов."""
+        names = []
+        for number in range(IMAGE_POOL_SIZE):
+            name = f'posts/seed_{self.options["seed"]}_{number}.png'
+            # Цвет выбирается и для уже созданной картинки, чтобы
+            # дальнейшие данные не зависели от содержимого хранилища
+            color = tuple(self.rng.randrange(256) for _ in range(3))
+            if not default_storage.exists(name):
+                buffer = io.BytesIO()
+                Image.new('RGB', (960, 339), color).save(buffer, 'PNG')
+                name = default_storage.save(
+                    name, ContentFile(buffer.getvalue())
+                )
+            names.append(name)
+        return names
+
+    def seed_posts(self, users, groups, popular):
+        images = self.seed_images() if self.options['image_ratio'] else []
+        self.post_after = self.last_id(Post)
+
+        def posts():
+            for _ in range(self.options['posts']):
+                with_image = self.rng.random() < self.options['image_ratio']
+                yield Post(
+                    text=self.text(1, 6),
+                    pub_date=self.date(),
+                    author_id=users[popular()],
+                    group_id=(
+                        self.rng.choice(groups)
+                        if groups and self.rng.random() < 0.5 else None
+                    ),
+                    image=self.rng.choice(images) if with_image else '',
+                )
+
+        with keep_dates(Post):
+            self.insert('Посты', Post, posts())
+
+    def seed_comments(self, users):
+        # Новые посты упорядочены по id; популярные посты — в начале списка
+        post_ids = self.new_ids(Post, self.post_after)
+        if not post_ids:
+            return
+        popular_post = PowerLaw(
+            len(post_ids), self.options['alpha'], self.rng
+        )
+        comments = (
+            Comment(
+                post_id=post_ids[popular_post()],
+                author_id=self.rng.choice(users),
+                text=self.text(1, 2),
+                created=self.date(),
+            )
+            for _ in range(self.options['comments'])
+        )
+        with keep_dates(Comment):
+            self.insert('Комментарии', Comment, comments)
+
+    def seed_follows(self, users, popular):
+        """Подписчики случайны, авторы выбираются по популярности."""
+        limit = min(
+            self.options['follows'], len(users) * (len(users) - 1)
+        )
+        pairs = set()
+        attempts = 0
+        while len(pairs) < limit and attempts < limit * 10:
+            attempts += 1
+            user = self.rng.choice(users)
+            author = users[popular()]
+            if user != author:
+                pairs.add((user, author))
+        follows = (
+            Follow(user_id=user, author_id=author)
+            for user, author in sorted(pairs)
+        )
+        self.insert('Подписки', Follow, follows)
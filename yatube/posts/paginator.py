@@ -0,0 +1,84 @@
+"""Паджинатор ленты: кэш числа объектов и сокращённый список страниц.
+
+На больших лентах COUNT(*) выполняется на каждый просмотр страницы,
+а полный список страниц — это тысячи ссылок. Поэтому число объектов
+больших выборок ненадолго кэшируется, а в навигации показывается
+только окно страниц вокруг текущей.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db.models.query import QuerySet
+from django.utils.functional import cached_property
+
+ELLIPSIS = None  # Пропуск в списке страниц
+COUNT_VERSION_KEY = 'paginator:count:version'
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator, который кэширует count выборок от PAGINATOR_COUNT_MIN."""
+
+    @cached_property
+    def count(self):
+        if not isinstance(self.object_list, QuerySet):
+            return super().count
+        query = str(self.object_list.query).encode()
+        key = f'paginator:count:{hashlib.md5(query).hexdigest()}'
+        version = cache.get(COUNT_VERSION_KEY, 1)
+        count = cache.get(key, version=version)
+        if count is None:
+            count = super().count
+            if count >= settings.PAGINATOR_COUNT_MIN:
+                cache.set(
+                    key, count, settings.PAGINATOR_COUNT_TIMEOUT,
+                    version=version,
+                )
+        return count
+
+
+def invalidate_counts():
+    """Сбрасывает все закэшированные числа объектов сменой версии."""
+    try:
+        cache.incr(COUNT_VERSION_KEY)
+    except ValueError:
+        cache.set(COUNT_VERSION_KEY, 2, None)
+
+
+def elided_page_range(page, on_each_side=2, on_ends=1):
+    """Номера страниц вокруг текущей и по краям, пропуски — ELLIPSIS."""
+    number = page.number
+    num_pages = page.paginator.num_pages
+    if num_pages <= (on_each_side + on_ends) * 2 + 1:
+        return list(range(1, num_pages + 1))
+    pages = []
+    if number > on_each_side + on_ends + 2:
+        pages.extend(range(1, on_ends + 1))
+        pages.append(ELLIPSIS)
+        pages.extend(range(number - on_each_side, number + 1))
+    else:
+        pages.extend(range(1, number + 1))
+    if number < num_pages - on_each_side - on_ends - 1:
+        pages.extend(range(number + 1, number + on_each_side + 1))
+        pages.append(ELLIPSIS)
+        pages.extend(range(num_pages - on_ends + 1, num_pages + 1))
+    else:
+        pages.extend(range(number + 1, num_pages + 1))
+    return pages
+
+
+def set_link_headers(response, request, page):
+    """Заголовок Link с rel="prev" и rel="next" для соседних страниц."""
+    links = []
+    for rel, has_page, get_number in (
+        ('prev', page.has_previous, page.previous_page_number),
+        ('next', page.has_next, page.next_page_number),
+    ):
+        if has_page():
+            query = request.GET.copy()
+            query['page'] = get_number()
+            links.append(f'<{request.path}?{query.urlencode()}>; rel="{rel}"')
+    if links:
+        response['Link'] = ', '.join(links)
+    return response
@@ -0,0 +1,212 @@
+"""Рекомендации «на кого подписаться» по друзьям друзей.
+
+Граф подписок хранится в памяти процесса в формате CSR: отсортированный
+массив подписчиков users, массив смещений indptr и массив авторов
+indices. Подписки пользователя users[i] — это indices[indptr[i]:indptr[i+1]].
+Изменения после построения копятся в небольших наборах added/removed
+и применяются поверх массивов; при их разрастании или по истечении
+RECOMMENDATIONS_REFRESH секунд граф строится заново.
+
+Перестройка выполняется после ответа (request_finished), без
+блокировки и вне бюджета времени SQL запроса; пока она идёт, запросы
+получают рекомендации по старому графу. Граф живёт в памяти процесса,
+поэтому задача воркера в другом процессе его бы не обновила.
+Подписки и отписки попадают в граф только после коммита транзакции.
+"""
+import bisect
+import heapq
+import logging
+import threading
+import time
+from array import array
+from collections import Counter, defaultdict
+from functools import partial
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Follow, User
+
+logger = logging.getLogger(__name__)
+
+POPULAR_SIZE = 50  # Сколько популярных авторов хранить для новичков
+MAX_OVERLAY = 10000  # После стольких изменений граф перестраивается
+BUILD_CHUNK = 10000
+
+
+class FollowGraph:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.built_at = None
+        self.users = array('q')
+        self.indptr = array('q', [0])
+        self.indices = array('q')
+        self.popular = []
+        self.added = defaultdict(set)
+        self.removed = defaultdict(set)
+        self.overlay = 0
+        # Изменения, пришедшие во время перестройки; None — её нет
+        self.journal = None
+
+    def invalidate(self):
+        with self.lock:
+            self.built_at = None
+
+    def due(self):
+        """Пора ли перестроить граф (и не перестраивается ли он уже)."""
+        with self.lock:
+            return self.journal is None and (
+                self.built_at is None
+                or self.overlay > MAX_OVERLAY
+                or time.monotonic() - self.built_at
+                > settings.RECOMMENDATIONS_REFRESH
+            )
+
+    def rebuild(self):
+        """Строит граф из базы; до замены работает прежний граф."""
+        with self.lock:
+            if self.journal is not None:
+                return False
+            self.journal = []
+        try:
+            graph = self._load()
+        except Exception:
+            with self.lock:
+                self.journal = None
+            raise
+        with self.lock:
+            self.users, self.indptr, self.indices, self.popular = graph
+            self.added.clear()
+            self.removed.clear()
+            self.overlay = 0
+            # Изменения за время чтения могли не попасть в выборку
+            for change, user_id, author_id in self.journal:
+                change(user_id, author_id)
+            self.journal = None
+            self.built_at = time.monotonic()
+        return True
+
+    def _load(self):
+        users = array('q')
+        indptr = array('q', [0])
+        indices = array('q')
+        in_degree = Counter()
+        rows = (
+            Follow.objects.order_by('user_id', 'author_id')
+            .values_list('user_id', 'author_id')
+            .iterator(chunk_size=BUILD_CHUNK)
+        )
+        for user_id, author_id in rows:
+            if not users or users[-1] != user_id:
+                if users:
+                    indptr.append(len(indices))
+                users.append(user_id)
+            indices.append(author_id)
+            in_degree[author_id] += 1
+        if users:
+            indptr.append(len(indices))
+        popular = [
+            author for author, _ in in_degree.most_common(POPULAR_SIZE)
+        ]
+        return users, indptr, indices, popular
+
+    def following(self, user_id):
+        """Множество авторов, на которых подписан пользователь."""
+        row = bisect.bisect_left(self.users, user_id)
+        result = set()
+        if row < len(self.users) and self.users[row] == user_id:
+            result.update(
+                self.indices[self.indptr[row]:self.indptr[row + 1]]
+            )
+        result -= self.removed.get(user_id, set())
+        result |= self.added.get(user_id, set())
+        return result
+
+    def add(self, user_id, author_id):
+        with self.lock:
+            self._change(self._add, user_id, author_id)
+
+    def remove(self, user_id, author_id):
+        with self.lock:
+            self._change(self._remove, user_id, author_id)
+
+    def _change(self, change, user_id, author_id):
+        change(user_id, author_id)
+        if self.journal is not None:
+            self.journal.append((change, user_id, author_id))
+
+    def _add(self, user_id, author_id):
+        self.removed[user_id].discard(author_id)
+        self.added[user_id].add(author_id)
+        self.overlay += 1
+
+    def _remove(self, user_id, author_id):
+        self.added[user_id].discard(author_id)
+        self.removed[user_id].add(author_id)
+        self.overlay += 1
+
+    def suggest(self, user_id, limit=5):
+        """id авторов, на которых чаще всего подписаны подписки юзера."""
+        with self.lock:
+            following = self.following(user_id)
+            counts = Counter()
+            for friend in following:
+                counts.update(self.following(friend))
+            popular = self.popular
+        excluded = following | {user_id}
+        best = heapq.nlargest(
+            limit,
+            (item for item in counts.items() if item[0] not in excluded),
+            key=lambda item: (item[1], -item[0]),
+        )
+        suggestions = [author for author, _ in best]
+        # Если друзей друзей мало, добавляем просто популярных авторов
+        for author in popular:
+            if len(suggestions) >= limit:
+                break
+            if author not in excluded and author not in suggestions:
+                suggestions.append(author)
+        return suggestions
+
+
+follow_graph = FollowGraph()
+
+
+def get_suggestions(user, limit=None):
+    """Пользователи, которых стоит предложить для подписки."""
+    if not user.is_authenticated:
+        return []
+    ids = follow_graph.suggest(
+        user.id, limit or settings.RECOMMENDATIONS_LIMIT
+    )
+    users = User.objects.in_bulk(ids)
+    return [users[pk] for pk in ids if pk in users]
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(partial(
+            follow_graph.add, instance.user_id, instance.author_id
+        ))
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    transaction.on_commit(partial(
+        follow_graph.remove, instance.user_id, instance.author_id
+    ))
+
+
+@receiver(request_finished)
+def rebuild_graph_periodically(sender, **kwargs):
+    """Перестраивает устаревший граф, когда ответ уже отправлен."""
+    if not follow_graph.due():
+        return
+    try:
+        follow_graph.rebuild()
+    except Exception:
+        logger.exception('Граф подписок не перестроен')
@@ -0,0 +1,12 @@
+from tasks.queue import task
+
+from .models import Post
+from .thumbnails import warm_thumbnail
+
+
+@task(batch=True, priority=-1)
+def warm_thumbnails(arguments):
+    """Создаёт миниатюры картинок постов, чтобы не делать это при показе."""
+    post_ids = {kwargs['post_id'] for kwargs in arguments}
+    for post in Post.objects.filter(id__in=post_ids).only('image'):
+        warm_thumbnail(post.image)
@@ -0,0 +1,86 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post, User
+
+NUMBER_OF_POSTS = 13
+
+
+class ApiTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='NoName')
+        cls.reader = User.objects.create(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'Пост {i}', group=cls.group)
+            for i in range(NUMBER_OF_POSTS)
+        )
+        cls.post = Post.objects.first()
+        Comment.objects.create(post=cls.post, author=cls.reader, text='Ок')
+        Follow.objects.create(user=cls.reader, author=cls.user)
+
+    def test_feeds_walk_by_cursor(self):
+        """Ленты отдают все посты по курсору без повторов."""
+        urls = (
+            reverse('posts:api_index'),
+            reverse('posts:api_group_list', args=[self.group.slug]),
+            reverse('posts:api_profile', args=[self.user.username]),
+            reverse('posts:api_follow_index'),
+        )
+        self.client.force_login(self.reader)
+        for url in urls:
+            with self.subTest(url=url):
+                first = self.client.get(url).json()
+                second = self.client.get(
+                    url, {'cursor': first['next_cursor']}
+                ).json()
+                ids = [post['id'] for post in first['results']]
+                ids += [post['id'] for post in second['results']]
+                self.assertEqual(len(set(ids)), NUMBER_OF_POSTS)
+                self.assertIsNone(second['next_cursor'])
+
+    def test_sparse_fields(self):
+        """?fields= ограничивает поля ответа и выбираемые столбцы."""
+        url = reverse('posts:api_index')
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url, {'fields': 'text,author'})
+        self.assertEqual(
+            set(response.json()['results'][0]), {'text', 'author'}
+        )
+        self.assertEqual(response.json()['results'][0]['author'], 'NoName')
+        self.assertNotIn('"image"', captured[-1]['sql'])
+        response = self.client.get(url, {'fields': 'text,password'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_etag_gives_not_modified(self):
+        """Повторный запрос с If-None-Match получает 304."""
+        url = reverse('posts:api_post_detail', args=[self.post.id])
+        response = self.client.get(url)
+        self.assertEqual(response.json()['comments'][0]['text'], 'Ок')
+        repeated = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(repeated.status_code, 304)
+        Comment.objects.create(post=self.post, author=self.user, text='Ещё')
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+
+    def test_errors(self):
+        """Ошибки приходят в JSON с подходящим кодом."""
+        cases = (
+            (reverse('posts:api_follow_index'), 401),
+            (reverse('posts:api_group_list', args=['missing']), 404),
+            (reverse('posts:api_post_detail', args=[0]), 404),
+            (reverse('posts:api_index') + '?cursor=broken', 400),
+        )
+        for url, status in cases:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, status)
+                self.assertIn('error', response.json())
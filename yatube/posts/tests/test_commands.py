@@ -0,0 +1,176 @@
+import json
+import os
+import shutil
+import tempfile
+from http import HTTPStatus
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post, User
+
+
+class ImportPostsCommandTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='NoName')
+        cls.tmp_dir = tempfile.mkdtemp()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp_dir, ignore_errors=True)
+        super().tearDownClass()
+
+    def write(self, name, content):
+        path = os.path.join(self.tmp_dir, name)
+        with open(path, 'w', encoding='utf-8') as target:
+            target.write(content)
+        return path
+
+    def test_import_posts_keeps_dates_and_skips_duplicates(self):
+        """Импорт сохраняет даты и пропускает повторы."""
+        rows = [
+            {'id': 100, 'text': 'Первый', 'author': 'NoName',
+             'pub_date': '2020-01-01T10:00:00'},
+            {'id': 100, 'text': 'Первый', 'author': 'NoName'},
+            {'id': 101, 'text': 'Второй', 'author': 'Unknown'},
+        ]
+        path = self.write(
+            'posts.jsonl', '\n'.join(json.dumps(row) for row in rows)
+        )
+        call_command('import_posts', path, '--batch-size=1', stdout=StringIO())
+        post = Post.objects.get(id=100)
+        self.assertEqual(post.pub_date.year, 2020)
+        self.assertEqual(Post.objects.count(), 1)
+
+    def test_import_follows_and_comments_from_csv(self):
+        """CSV с подписками и комментариями импортируется без дублей."""
+        author = User.objects.create_user(username='Author')
+        post = Post.objects.create(author=author, text='Пост')
+        follows = self.write(
+            'follows.csv',
+            'user,author\nNoName,Author\nNoName,Author\nAuthor,Author\n',
+        )
+        comments = self.write(
+            'comments.csv',
+            f'post,author,text\n{post.id},NoName,Ок\n{post.id + 1},NoName,X\n',
+        )
+        call_command(
+            'import_posts', follows, '--model=follow', stdout=StringIO()
+        )
+        call_command(
+            'import_posts', comments, '--model=comment', stdout=StringIO()
+        )
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertEqual(Comment.objects.get().post, post)
+
+    def test_bad_rows_are_skipped_and_reported(self):
+        """Неверные строки пропускаются, остальные импортируются."""
+        rows = [
+            json.dumps({'id': 200, 'text': 'Первый', 'author': 'NoName'}),
+            '{не json',
+            json.dumps({'id': 'abc', 'text': 'Второй', 'author': 'NoName'}),
+            json.dumps({'text': 'Третий', 'author': 'NoName',
+                        'pub_date': 'вчера'}),
+            json.dumps({'id': 201, 'text': 'Четвёртый', 'author': 'NoName'}),
+        ]
+        path = self.write('bad.jsonl', '\n'.join(rows))
+        fragment = make_template_fragment_key('index_page')
+        cache.set(fragment, 'старая лента')
+        cache.set('ratelimit:test', 1)
+        out, err = StringIO(), StringIO()
+        call_command(
+            'import_posts', path, '--batch-size=2', stdout=out, stderr=err
+        )
+        self.assertEqual(
+            set(Post.objects.values_list('id', flat=True)), {200, 201}
+        )
+        self.assertIn('с ошибками 3', out.getvalue())
+        self.assertIn('Строка 2:', err.getvalue())
+        self.assertIn('Строка 4:', err.getvalue())
+        self.assertIsNone(cache.get(fragment))
+        self.assertEqual(cache.get('ratelimit:test'), 1)
+
+
+class ExportPostsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='NoName')
+        cls.staff = User.objects.create_user(username='Staff', is_staff=True)
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'Пост {i}') for i in range(5)
+        )
+
+    def test_export_command_walks_all_chunks(self):
+        """Выгрузка обходит таблицу небольшими порциями."""
+        out = StringIO()
+        call_command('export_posts', '--chunk-size=2', stdout=out)
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]['author'], 'NoName')
+
+    def test_export_view_is_staff_only(self):
+        """Выгрузка доступна только персоналу и отдаётся потоком."""
+        url = reverse('posts:export', kwargs={'name': 'post'})
+        self.assertEqual(self.client.get(url).status_code, HTTPStatus.FOUND)
+        self.client.force_login(self.staff)
+        response = self.client.get(url, {'format': 'csv'})
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode()
+        self.assertEqual(len(content.splitlines()), 6)
+
+
+class SeedDataCommandTest(TestCase):
+    def seed(self, seed, *args, out=None):
+        call_command(
+            'seed_data', '--users=30', '--groups=3', '--posts=300',
+            '--comments=100', '--follows=50', '--image-ratio=0',
+            f'--seed={seed}', *args, stdout=out or StringIO(),
+        )
+        return list(
+            Post.objects.order_by('id').values_list('author__username', 'text')
+        )
+
+    def test_seed_data_is_reproducible(self):
+        """С одним seed генерируются одинаковые данные."""
+        first = self.seed(7)
+        Group.objects.all().delete()
+        User.objects.all().delete()
+        self.assertEqual(first, self.seed(7))
+        self.assertEqual(Follow.objects.count(), 50)
+        self.assertEqual(Comment.objects.count(), 100)
+
+    def test_existing_images_do_not_change_data(self):
+        """Данные не зависят от того, есть ли уже картинки на диске."""
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        with override_settings(MEDIA_ROOT=media_root):
+            first = self.seed(3, '--image-ratio=0.5')
+            Group.objects.all().delete()
+            User.objects.all().delete()
+            self.assertEqual(first, self.seed(3, '--image-ratio=0.5'))
+
+    def test_repeated_seed_adds_nothing(self):
+        """Повторный запуск с тем же seed не падает и ничего не добавляет."""
+        self.seed(5)
+        out = StringIO()
+        self.seed(5, out=out)
+        self.assertEqual(Post.objects.count(), 300)
+        self.assertIn('Пользователи: 0 из 30', out.getvalue())
+        self.seed(6, '--users=0')
+        self.assertEqual(Post.objects.count(), 300)
+
+    def test_seed_data_skews_authors(self):
+        """Несколько авторов пишут заметно больше остальных."""
+        self.seed(1)
+        counts = sorted(
+            (user.posts.count() for user in User.objects.all()),
+            reverse=True,
+        )
+        self.assertGreater(counts[0], 5 * counts[len(counts) // 2])
@@ -147,3 +147,56 @@ class PostCreateFormTests(TestCase):
         self.assertEqual(Comment.objects.count(), comments_count)
         self.assertEqual(comment.text, form_data['text'])
         self.assertRedirects(response, redirect)
+
+
+class CommentFragmentTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='NoName')
+        cls.post = Post.objects.create(text='Тестовый текст', author=cls.user)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        self.url = reverse(
+            'posts:add_comment', kwargs={'post_id': self.post.id}
+        )
+
+    def test_ajax_comment_returns_fragment(self):
+        """Запрос из JavaScript получает только фрагмент комментария."""
+        response = self.authorized_client.post(
+            self.url,
+            {'text': 'Новый комментарий'},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+        )
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        self.assertTemplateUsed(response, 'posts/includes/comment_item.html')
+        self.assertTemplateNotUsed(response, 'base.html')
+        self.assertContains(
+            response, 'Новый комментарий', status_code=HTTPStatus.CREATED
+        )
+        comment = Comment.objects.get(post=self.post)
+        # По id страница убирает дубль, когда порции дойдут до комментария
+        self.assertContains(
+            response,
+            f'data-comment-id="{comment.id}"',
+            status_code=HTTPStatus.CREATED,
+        )
+
+    def test_ajax_invalid_comment_returns_errors(self):
+        """Ошибки формы возвращаются фрагментом со статусом 400."""
+        response = self.authorized_client.post(
+            self.url, {'text': ''}, HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+        )
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertTemplateUsed(response, 'posts/includes/comment_errors.html')
+        self.assertFalse(Comment.objects.exists())
+
+    def test_plain_form_still_redirects(self):
+        """Обычная отправка формы по-прежнему заканчивается редиректом."""
+        response = self.authorized_client.post(self.url, {'text': 'Текст'})
+        self.assertRedirects(
+            response,
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+        )
@@ -0,0 +1,98 @@
+import shutil
+import tempfile
+from unittest import skipUnless
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Follow, Group, Post, User
+from .utils import normalize
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+HOT_VIEWS = (
+    'posts:index', 'posts:group_list', 'posts:profile', 'posts:follow_index'
+)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@skipUnless(settings.JINJA2_AVAILABLE, 'jinja2 не установлен')
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class Jinja2ParityTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='NoName', first_name='Лев', last_name='Толстой'
+        )
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа "тест"',
+            slug='test-slug',
+            description='<b>Описание</b> & всё',
+        )
+        for i in range(12):
+            Post.objects.create(
+                author=cls.author,
+                group=cls.group if i % 2 else None,
+                text=f'Пост {i} <script>"кавычки" и \'апострофы\'</script>'
+                     '\nвторая строка',
+                image=SimpleUploadedFile(
+                    f'small{i}.gif', SMALL_GIF, content_type='image/gif'
+                ) if i % 3 == 0 else None,
+            )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def render_both(self, url):
+        pages = []
+        for engines in ({}, {name: 'jinja2' for name in HOT_VIEWS}):
+            cache.clear()
+            with override_settings(TEMPLATE_ENGINE_VIEWS=engines):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append(normalize(response.content.decode()))
+        return pages
+
+    def test_hot_pages_match_django_templates(self):
+        """Jinja2-шаблоны дают тот же HTML, что и шаблоны Django."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:index') + '?page=2',
+            reverse('posts:group_list', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.author.username]),
+            reverse('posts:follow_index'),
+        )
+        for user in (None, self.reader):
+            if user is not None:
+                self.client.force_login(user)
+            for url in urls:
+                if user is None and 'follow' in url:
+                    continue
+                with self.subTest(url=url, user=user):
+                    django_html, jinja2_html = self.render_both(url)
+                    self.assertIn('<img class="card-img', django_html)
+                    self.assertEqual(jinja2_html, django_html)
+
+    def test_jinja2_is_used_only_when_configured(self):
+        """Без настройки страница рендерится шаблонами Django."""
+        url = reverse('posts:index')
+        self.assertTemplateUsed(self.client.get(url), 'posts/index.html')
+        with override_settings(
+            TEMPLATE_ENGINE_VIEWS={'posts:index': 'jinja2'}
+        ):
+            response = self.client.get(url)
+        self.assertEqual(response.templates, [])
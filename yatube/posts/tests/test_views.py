@@ -1,10 +1,19 @@
+import json
+
 from django import forms
 from django.core.cache import cache
-from django.test import Client, TestCase
+from django.db import connection, transaction
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from ..models import Follow, Group, Post, User
-from ..views import MAX_NUM_OF_POSTS
+from ..models import Comment, Follow, Group, Post, User
+from ..paginator import (CachedCountPaginator, elided_page_range,
+                         invalidate_counts)
+from ..recommendations import follow_graph
+from ..views import COMMENTS_PER_PAGE, MAX_NUM_OF_POSTS
+from .utils import normalize
 
 NUMBER_OF_POSTS = 13  # Количество переданных постов
 POSTS_ON_THE_SEC_PAGE = 3  # Количество ожидаемых постов на второй странице
@@ -301,3 +310,351 @@ class FollowViewsTest(TestCase):
         response = self.author_client.get(
             reverse('posts:follow_index'))
         self.assertNotIn(post, response.context['page_obj'].object_list)
+
+
+class CommentsPaginationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='NoName')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.user, text=f'Комментарий {i}')
+            for i in range(COMMENTS_PER_PAGE + 5)
+        )
+
+    def test_post_detail_shows_first_page_of_comments(self):
+        """На странице поста только первая порция комментариев."""
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        )
+        self.assertEqual(len(response.context['comments']), COMMENTS_PER_PAGE)
+        self.assertIsNotNone(response.context['next_cursor'])
+
+    def test_fragment_returns_rest_of_comments(self):
+        """Фрагмент по курсору отдаёт оставшиеся комментарии."""
+        url = reverse('posts:post_comments', kwargs={'post_id': self.post.id})
+        first = self.client.get(url)
+        response = self.client.get(
+            url, {'cursor': first.context['next_cursor']}
+        )
+        self.assertTemplateUsed(response, 'posts/includes/comments.html')
+        self.assertNotIn('base.html', [t.name for t in response.templates])
+        self.assertEqual(len(response.context['comments']), 5)
+        self.assertIsNone(response.context['next_cursor'])
+        self.assertEqual(
+            self.client.get(url, {'cursor': 'broken'}).status_code, 404
+        )
+
+    def test_post_detail_query_count_does_not_grow(self):
+        """Число запросов не зависит от количества комментариев."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        quiet = Post.objects.create(author=self.user, text='Тихий пост')
+        cache.clear()
+        with CaptureQueriesContext(connection) as busy_queries:
+            self.client.get(url)
+        with CaptureQueriesContext(connection) as quiet_queries:
+            self.client.get(
+                reverse('posts:post_detail', kwargs={'post_id': quiet.id})
+            )
+        self.assertEqual(len(busy_queries), len(quiet_queries))
+
+
+class RecommendationsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader, cls.friend, cls.other, cls.star, cls.popular = (
+            User.objects.create(username=name)
+            for name in ('reader', 'friend', 'other', 'star', 'popular')
+        )
+        Follow.objects.bulk_create([
+            Follow(user=cls.reader, author=cls.friend),
+            Follow(user=cls.reader, author=cls.other),
+            Follow(user=cls.friend, author=cls.star),
+            Follow(user=cls.other, author=cls.star),
+            Follow(user=cls.friend, author=cls.popular),
+        ])
+
+    def setUp(self):
+        follow_graph.rebuild()
+        self.client.force_login(self.reader)
+
+    def test_friends_of_friends_come_first(self):
+        """Первым предлагается автор, на которого подписано больше друзей."""
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            response.context['suggestions'], [self.star, self.popular]
+        )
+
+    def test_stale_graph_is_rebuilt_after_response(self):
+        """Устаревший граф отвечает, пока не перестроен после ответа."""
+        Follow.objects.create(user=self.reader, author=self.star)
+        with override_settings(RECOMMENDATIONS_REFRESH=0):
+            response = self.client.get(reverse('posts:follow_index'))
+        # Подписка ещё не закоммичена и в граф не попала
+        self.assertEqual(
+            response.context['suggestions'], [self.star, self.popular]
+        )
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(response.context['suggestions'], [self.popular])
+
+    def test_newcomer_gets_popular_authors(self):
+        """Без подписок предлагаются самые популярные авторы."""
+        self.client.force_login(self.popular)
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            response.context['suggestions'][0], self.star
+        )
+        self.assertNotIn(self.popular, response.context['suggestions'])
+
+
+class RecommendationsCommitTest(TransactionTestCase):
+    def setUp(self):
+        self.reader, self.friend, self.star, self.popular = (
+            User.objects.create(username=name)
+            for name in ('reader', 'friend', 'star', 'popular')
+        )
+        Follow.objects.bulk_create([
+            Follow(user=self.reader, author=self.friend),
+            Follow(user=self.friend, author=self.star),
+            Follow(user=self.friend, author=self.popular),
+        ])
+        follow_graph.rebuild()
+        self.client.force_login(self.reader)
+
+    def test_graph_follows_committed_changes(self):
+        """Подписка и отписка меняют рекомендации после коммита."""
+        self.client.get(
+            reverse('posts:profile_follow', args=[self.star.username])
+        )
+        response = self.client.get(
+            reverse('posts:profile', args=[self.friend.username])
+        )
+        self.assertEqual(response.context['suggestions'], [self.popular])
+        self.client.get(
+            reverse('posts:profile_unfollow', args=[self.star.username])
+        )
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertIn(self.star, response.context['suggestions'])
+
+    def test_rolled_back_follow_is_ignored(self):
+        """Подписка из отменённой транзакции не попадает в граф."""
+        try:
+            with transaction.atomic():
+                Follow.objects.create(user=self.reader, author=self.star)
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            response.context['suggestions'], [self.star, self.popular]
+        )
+
+
+class BulkFollowTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='reader')
+        cls.authors = [
+            User.objects.create(username=f'author{i}') for i in range(3)
+        ]
+        cls.url = reverse('posts:bulk_follow')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def post_json(self, payload):
+        return self.client.post(
+            self.url, json.dumps(payload), content_type='application/json'
+        )
+
+    def test_bulk_follow_and_unfollow(self):
+        """Подписка на список авторов идемпотентна и возвращает состояния."""
+        names = [author.username for author in self.authors]
+        Follow.objects.create(user=self.user, author=self.authors[0])
+        response = self.post_json(
+            {'usernames': names + ['ghost', 'reader']}
+        )
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual(
+            [results[name] for name in names], ['following'] * 3
+        )
+        self.assertEqual(results['ghost'], 'not_found')
+        self.assertEqual(results['reader'], 'self')
+        self.assertEqual(Follow.objects.filter(user=self.user).count(), 3)
+        response = self.post_json(
+            {'action': 'unfollow', 'usernames': names[:2]}
+        )
+        self.assertEqual(
+            response.json()['results'],
+            {name: 'not_following' for name in names[:2]},
+        )
+        self.assertEqual(Follow.objects.filter(user=self.user).count(), 1)
+
+    def test_bulk_follow_query_count_does_not_grow(self):
+        """Число запросов не зависит от количества авторов."""
+        with CaptureQueriesContext(connection) as one:
+            self.post_json({'usernames': [self.authors[0].username]})
+        with CaptureQueriesContext(connection) as many:
+            self.post_json(
+                {'usernames': [author.username for author in self.authors]}
+            )
+        self.assertEqual(len(one), len(many))
+
+    def test_bad_payload(self):
+        """Неверный запрос получает ответ 400."""
+        for payload in (
+            'not json', {'names': []}, {'usernames': 'author0'},
+            {'usernames': [], 'action': 'block'},
+        ):
+            with self.subTest(payload=payload):
+                response = self.client.post(
+                    self.url,
+                    payload if isinstance(payload, str)
+                    else json.dumps(payload),
+                    content_type='application/json',
+                )
+                self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(self.url).status_code, 405)
+
+
+class ElidedPaginatorTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='NoName')
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'Пост {i}')
+            for i in range(MAX_NUM_OF_POSTS * 30)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_elided_page_range(self):
+        """Показывается только окно страниц вокруг текущей."""
+        paginator = CachedCountPaginator(range(1000), 10)
+        self.assertEqual(
+            elided_page_range(paginator.page(1)), [1, 2, 3, None, 100]
+        )
+        self.assertEqual(
+            elided_page_range(paginator.page(50)),
+            [1, None, 48, 49, 50, 51, 52, None, 100],
+        )
+        self.assertEqual(
+            elided_page_range(paginator.page(99)),
+            [1, None, 97, 98, 99, 100],
+        )
+        paginator = CachedCountPaginator(range(50), 10)
+        self.assertEqual(
+            elided_page_range(paginator.page(3)), [1, 2, 3, 4, 5]
+        )
+
+    def test_page_has_link_headers_and_short_navigation(self):
+        """Ссылки rel=prev/next в заголовке, в навигации не все страницы."""
+        response = self.client.get(reverse('posts:index'), {'page': 2})
+        self.assertEqual(
+            response['Link'],
+            '</?page=1>; rel="prev", </?page=3>; rel="next"',
+        )
+        self.assertNotContains(response, '?page=15"')
+        self.assertContains(response, '?page=30"')
+        self.assertIsInstance(
+            response.context['page_obj'].paginator, CachedCountPaginator
+        )
+        last = self.client.get(reverse('posts:index'), {'page': 30})
+        self.assertEqual(last['Link'], '</?page=29>; rel="prev"')
+
+    @override_settings(PAGINATOR_COUNT_MIN=100)
+    def test_large_count_is_cached(self):
+        """COUNT(*) большой ленты не повторяется на каждой странице."""
+        self.client.get(reverse('posts:index'))
+        with CaptureQueriesContext(connection) as captured:
+            self.client.get(reverse('posts:index'), {'page': 2})
+        self.assertFalse([q for q in captured if 'COUNT(*)' in q['sql']])
+        invalidate_counts()
+        with CaptureQueriesContext(connection) as captured:
+            self.client.get(reverse('posts:index'), {'page': 2})
+        self.assertTrue([q for q in captured if 'COUNT(*)' in q['sql']])
+
+
+class StreamingRenderTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='NoName')
+        cls.group = Group.objects.create(title='Группа', slug='test-slug')
+        Post.objects.bulk_create(
+            Post(author=cls.user, group=cls.group, text=f'Пост {i}')
+            for i in range(MAX_NUM_OF_POSTS + 3)
+        )
+        Follow.objects.create(
+            user=User.objects.create(username='reader'), author=cls.user
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_streamed_pages_match_rendered(self):
+        """Потоковый ответ содержит ту же страницу, что и render()."""
+        self.client.force_login(User.objects.get(username='reader'))
+        pages = {
+            'posts:index': reverse('posts:index'),
+            'posts:group_list': reverse(
+                'posts:group_list', args=[self.group.slug]
+            ),
+            'posts:profile': reverse(
+                'posts:profile', args=[self.user.username]
+            ),
+            'posts:follow_index': reverse('posts:follow_index'),
+        }
+        for view_name, url in pages.items():
+            with self.subTest(view_name=view_name):
+                cache.clear()
+                rendered = self.client.get(url)
+                cache.clear()
+                with override_settings(STREAMING_VIEWS={view_name}):
+                    streamed = self.client.get(url)
+                self.assertFalse(rendered.streaming)
+                self.assertTrue(streamed.streaming)
+                chunks = list(streamed.streaming_content)
+                # head, карточки постов и остаток страницы
+                self.assertEqual(len(chunks), MAX_NUM_OF_POSTS + 2)
+                self.assertIn(b'bootstrap.min.css', chunks[0])
+                self.assertEqual(
+                    normalize(b''.join(chunks).decode()),
+                    normalize(rendered.content.decode()),
+                )
+
+    @override_settings(STREAMING_VIEWS={'posts:index'})
+    def test_head_is_sent_before_posts_are_fetched(self):
+        """Посты выбираются после отправки head, список берётся из кэша."""
+        response = self.client.get(reverse('posts:index'))
+        chunks = iter(response.streaming_content)
+        with CaptureQueriesContext(connection) as head_queries:
+            next(chunks)
+        self.assertEqual(len(head_queries), 0)
+        with CaptureQueriesContext(connection) as body_queries:
+            list(chunks)
+        self.assertEqual(len(body_queries), 1)
+        response = self.client.get(reverse('posts:index'))
+        with CaptureQueriesContext(connection) as cached_queries:
+            chunks = list(response.streaming_content)
+        self.assertEqual(len(cached_queries), 0)
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(
+            b''.join(chunks).count('<p>Пост '.encode()), MAX_NUM_OF_POSTS
+        )
+
+    @override_settings(STREAMING_VIEWS={'posts:index'})
+    def test_content_is_available_to_middleware(self):
+        """Middleware, читающие content, получают тело целиком."""
+        response = self.client.get(reverse('posts:index'))
+        content = response.content
+        self.assertEqual(
+            content.count('<p>Пост '.encode()), MAX_NUM_OF_POSTS
+        )
+        self.assertEqual(b''.join(response.streaming_content), content)
@@ -0,0 +1,7 @@
+import re
+
+
+def normalize(html):
+    """Убирает различия в пробелах между движками."""
+    html = re.sub(r'\s+', ' ', html)
+    return re.sub(r'>\s+<', '><', html).strip()
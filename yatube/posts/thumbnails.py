@@ -0,0 +1,44 @@
+import threading
+import time
+
+from sorl.thumbnail import get_thumbnail
+from sorl.thumbnail.base import ThumbnailBackend
+
+from core.metrics import THUMBNAIL_TIME
+
+# Те же параметры, что и в тегах {% thumbnail %} шаблонов ленты
+THUMBNAIL_GEOMETRY = '960x339'
+THUMBNAIL_OPTIONS = {
+    'crop': 'center',
+    'upscale': True,
+}
+
+# Бэкенд sorl — один объект на процесс, поэтому признак «миниатюра
+# создана» хранится отдельно для каждого потока
+_state = threading.local()
+
+
+def warm_thumbnail(image):
+    """Заранее создаёт миниатюру картинки поста."""
+    if not image:
+        return None
+    return get_thumbnail(image, THUMBNAIL_GEOMETRY, **THUMBNAIL_OPTIONS)
+
+
+class TimedThumbnailBackend(ThumbnailBackend):
+    """Бэкенд sorl-thumbnail, который замеряет получение миниатюр."""
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        started = time.perf_counter()
+        _state.generated = False
+        try:
+            return super().get_thumbnail(file_, geometry_string, **options)
+        finally:
+            THUMBNAIL_TIME.observe(
+                time.perf_counter() - started,
+                result='generated' if _state.generated else 'stored',
+            )
+
+    def _create_thumbnail(self, *args, **kwargs):
+        _state.generated = True
+        return super()._create_thumbnail(*args, **kwargs)
@@ -1,30 +1,59 @@
+import json
+from http import HTTPStatus
+
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.views.decorators.http import require_POST
+
+from core.routers import replica_reads
+from core.streaming import render_streaming
+from core.templates import engine_for
+from core.writes import write_coordinator
 
+from .cursors import cursor_page
+from .export import EXPORTS, FORMATS, iter_export
+from .follows import apply_follows, follow_authors
 from .forms import CommentForm, PostForm
 from .models import Follow, Group, Post, User
+from .paginator import (CachedCountPaginator, elided_page_range,
+                        set_link_headers)
+from .recommendations import get_suggestions
+from .tasks import warm_thumbnails
 
 MAX_NUM_OF_POSTS = 10  # Максимальное количество постов на странице
+COMMENTS_PER_PAGE = 20  # Комментариев на одной порции в post_detail
+MAX_BULK_FOLLOWS = 100  # Сколько авторов можно передать в одном запросе
 
 
 def get_page_context(post_list, request):
-    paginator = Paginator(post_list, MAX_NUM_OF_POSTS)
+    paginator = CachedCountPaginator(post_list, MAX_NUM_OF_POSTS)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     return {
         'paginator': paginator,
         'page_number': page_number,
         'page_obj': page_obj,
+        'page_range': elided_page_range(page_obj),
     }
 
 
+@replica_reads
 def index(request):
     """Выводит шаблон главной страницы"""
-    context = get_page_context(Post.objects.all(), request)
-    return render(request, 'posts/index.html', context)
+    context = get_page_context(
+        Post.objects.select_related('author', 'group'), request
+    )
+    response = render_streaming(
+        request, 'posts/index.html', context,
+        'posts/includes/post_card.html', using=engine_for(request),
+        fragment=(20, 'index_page'),
+    )
+    return set_link_headers(response, request, context['page_obj'])
 
 
+@replica_reads
 def group_posts(request, slug):
     """Выводит шаблон с группами постов"""
     group = get_object_or_404(Group, slug=slug)
@@ -33,10 +62,17 @@ def group_posts(request, slug):
         'group': group,
         'post_list': post_list,
     }
-    context.update(get_page_context(group.posts.all(), request))
-    return render(request, 'posts/group_list.html', context)
+    context.update(
+        get_page_context(group.posts.select_related('author'), request)
+    )
+    response = render_streaming(
+        request, 'posts/group_list.html', context,
+        'posts/includes/group_post_card.html', using=engine_for(request),
+    )
+    return set_link_headers(response, request, context['page_obj'])
 
 
+@replica_reads
 def profile(request, username):
     """Выводит шаблон профайла пользователя"""
     template_name = 'posts/profile.html'
@@ -50,29 +86,70 @@ def profile(request, username):
         'post_count': post_count,
         'author': user,
         'following': following,
+        'suggestions': get_suggestions(request.user),
+    }
+    context.update(get_page_context(posts, request))
+    response = render_streaming(
+        request, template_name, context,
+        'posts/includes/profile_post_card.html', using=engine_for(request),
+    )
+    return set_link_headers(response, request, context['page_obj'])
+
+
+def get_comments_context(post, request):
+    """Порция комментариев после курсора из GET-параметра cursor."""
+    try:
+        comments, next_cursor = cursor_page(
+            post.comment.select_related('author'),
+            'created',
+            request.GET.get('cursor'),
+            COMMENTS_PER_PAGE,
+        )
+    except ValueError:
+        raise Http404('Неверный курсор')
+    return {
+        'post': post,
+        'comments': comments,
+        'next_cursor': next_cursor,
     }
-    context.update(get_page_context(user.posts.all(), request))
-    return render(request, template_name, context)
 
 
+@replica_reads
 def post_detail(request, post_id):
     template_name = 'posts/post_detail.html'
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'group'), id=post_id
+    )
     context = {
-        'post': post,
         'form': CommentForm(),
-        'comments': post.comment.all(),
     }
+    context.update(get_comments_context(post, request))
     return render(request, template_name, context)
 
 
+@replica_reads
+def post_comments(request, post_id):
+    """Фрагмент со следующей порцией комментариев."""
+    post = get_object_or_404(Post.objects.only('id'), id=post_id)
+    context = get_comments_context(post, request)
+    return render(request, 'posts/includes/comments.html', context)
+
+
+def save_post(form, image_changed):
+    """Сохраняет пост и ставит в очередь миниатюры новой картинки."""
+    post = form.save()
+    if image_changed and post.image:
+        warm_thumbnails.delay(post_id=post.id, key=str(post.id))
+    return post
+
+
 @login_required
 def post_create(request):
     post = Post(author=request.user)
     form = PostForm(request.POST or None, instance=post)
     if request.method == "POST":
         if form.is_valid():
-            form.save()
+            write_coordinator.run(save_post, form, True)
             return redirect("posts:profile", request.user.username)
     context = {
         "form": form,
@@ -92,7 +169,9 @@ def post_edit(request, post_id):
     )
     if request.method == 'POST':
         if form.is_valid():
-            form.save()
+            write_coordinator.run(
+                save_post, form, 'image' in form.changed_data
+            )
             return redirect('posts:post_detail', post_id)
     context = {
         'post': post,
@@ -104,27 +183,53 @@ def post_edit(request, post_id):
 
 @login_required
 def add_comment(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    """Добавляет комментарий.
+
+    Запрос из JavaScript получает в ответ только фрагмент с новым
+    комментарием или с ошибками формы; обычная форма — редирект на пост.
+    """
+    post = get_object_or_404(Post.objects.only('id'), id=post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        write_coordinator.run(comment.save)
+        if request.is_ajax():
+            return render(
+                request,
+                'posts/includes/comment_item.html',
+                {'comment': comment},
+                status=HTTPStatus.CREATED,
+            )
+    elif request.is_ajax():
+        return render(
+            request,
+            'posts/includes/comment_errors.html',
+            {'form': form},
+            status=HTTPStatus.BAD_REQUEST,
+        )
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
+@replica_reads
 def follow_index(request):
     # информация о текущем пользователе доступна в переменной request.user
     # ...
     post = Post.objects.filter(
-        author__following__user=request.user)
+        author__following__user=request.user
+    ).select_related('author', 'group')
     context = {
         'post': post,
+        'suggestions': get_suggestions(request.user),
     }
     context.update(get_page_context(post, request))
-    return render(request, 'posts/follow.html', context)
+    response = render_streaming(
+        request, 'posts/follow.html', context,
+        'posts/includes/post_card.html', using=engine_for(request),
+    )
+    return set_link_headers(response, request, context['page_obj'])
 
 
 @login_required
@@ -136,16 +241,7 @@ def profile_follow(request, username):
             'posts:profile',
             username=username
         )
-    follower = Follow.objects.filter(
-        user=request.user,
-        author=author
-    ).exists()
-    if follower:
-        return redirect(
-            'posts:profile',
-            username=username
-        )
-    Follow.objects.create(user=request.user, author=author)
+    write_coordinator.run(follow_authors, request.user, [author])
     return redirect(
         'posts:profile',
         username=username
@@ -162,8 +258,57 @@ def profile_unfollow(request, username):
             username=username
         )
     following = get_object_or_404(Follow, user=request.user, author=author)
-    following.delete()
+    write_coordinator.run(following.delete)
     return redirect(
         'posts:profile',
         username=username
     )
+
+
+@login_required
+@require_POST
+def bulk_follow(request):
+    """Подписка или отписка на список авторов, JSON на входе и выходе."""
+    try:
+        payload = json.loads(request.body)
+        usernames = payload['usernames']
+        action = payload.get('action', 'follow')
+    except (ValueError, TypeError, KeyError):
+        return JsonResponse(
+            {'error': 'Ожидается JSON с полем usernames'},
+            status=HTTPStatus.BAD_REQUEST,
+        )
+    if (
+        action not in ('follow', 'unfollow')
+        or not isinstance(usernames, list)
+        or not all(isinstance(name, str) for name in usernames)
+    ):
+        return JsonResponse(
+            {'error': 'usernames — список имён, action — follow или unfollow'},
+            status=HTTPStatus.BAD_REQUEST,
+        )
+    if len(usernames) > MAX_BULK_FOLLOWS:
+        return JsonResponse(
+            {'error': f'Не больше {MAX_BULK_FOLLOWS} авторов за раз'},
+            status=HTTPStatus.BAD_REQUEST,
+        )
+    states = write_coordinator.run(
+        apply_follows, request.user, usernames, follow=action == 'follow'
+    )
+    return JsonResponse({'action': action, 'results': states})
+
+
+@staff_member_required
+def export_data(request, name):
+    """Потоковая выгрузка постов, комментариев или подписок."""
+    fmt = request.GET.get('format', 'jsonl')
+    if name not in EXPORTS or fmt not in FORMATS:
+        raise Http404
+    response = StreamingHttpResponse(
+        iter_export(name, fmt),
+        content_type=FORMATS[fmt],
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="{name}s.{fmt}"'
+    )
+    return response
@@ -0,0 +1,49 @@
+import json
+import signal
+
+from django.core.management.base import BaseCommand
+
+from tasks.queue import Worker, stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Воркер фоновых задач: забирает задачи из базы и выполняет их. '
+        'Останавливается по SIGTERM или Ctrl+C после текущей задачи'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--name', help='Имя воркера в задачах')
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Выйти, когда очередь опустеет',
+        )
+        parser.add_argument(
+            '--max-tasks', type=int,
+            help='Выйти после выполнения стольких задач',
+        )
+        parser.add_argument(
+            '--no-periodic', action='store_true',
+            help='Не ставить периодические задачи (их ставит другой воркер)',
+        )
+        parser.add_argument(
+            '--stats', action='store_true',
+            help='Показать глубину очереди и задержки и выйти',
+        )
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self.stdout.write(json.dumps(stats(), indent=2))
+            return
+        worker = Worker(options['name'], periodic=not options['no_periodic'])
+
+        def stop(signum, frame):
+            worker.stopping = True
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        self.stdout.write(f'Воркер {worker.name} запущен')
+        worker.run(burst=options['burst'], max_tasks=options['max_tasks'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Выполнено задач: {worker.processed}, с ошибкой: {worker.failed}'
+        ))
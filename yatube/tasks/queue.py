@@ -0,0 +1,391 @@
+"""Очередь фоновых задач в базе данных.
+
+Задачи регистрируются декоратором @task в модулях tasks.py приложений
+и ставятся в очередь вызовом .delay() — в транзакции вызывающего кода,
+так что задача появится, только если изменения закоммичены. Воркер
+(manage.py run_tasks) забирает задачи условным UPDATE: задачу получает
+тот воркер, чей UPDATE изменил строку, поэтому несколько воркеров
+не выполнят одну задачу дважды и не нужен SELECT ... FOR UPDATE.
+"""
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from core.metrics import registry as metrics
+from core.stats import summarize
+from core.writes import write_coordinator
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+
+
+class TaskSpec:
+    """Зарегистрированная задача.
+
+    Пакетная задача (batch=True) получает список аргументов сразу
+    нескольких задач с тем же именем; периодическая (every=секунды)
+    ставится в очередь самим воркером.
+    """
+
+    def __init__(self, func, name, priority=0, max_attempts=None,
+                 batch=False, every=None):
+        self.func = func
+        self.name = name
+        self.priority = priority
+        self.max_attempts = max_attempts
+        self.batch = batch
+        self.every = every
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def __repr__(self):
+        return f'<TaskSpec {self.name}>'
+
+    def delay(self, key='', priority=None, countdown=0, **kwargs):
+        return enqueue(
+            self.name, kwargs, key=key, priority=priority, countdown=countdown
+        )
+
+    def execute(self, arguments):
+        """Выполняет задачу для списка аргументов из очереди."""
+        if self.batch:
+            return self.func(arguments)
+        for kwargs in arguments:
+            self.func(**kwargs)
+
+
+def task(name=None, **options):
+    """Регистрирует функцию как фоновую задачу."""
+    def decorator(func):
+        spec = TaskSpec(
+            func, name or f'{func.__module__}.{func.__name__}', **options
+        )
+        registry[spec.name] = spec
+        return spec
+    return decorator
+
+
+def enqueue(name, arguments=None, key='', priority=None, countdown=0):
+    """Ставит задачу в очередь; при TASKS_EAGER выполняет сразу."""
+    spec = registry[name]
+    arguments = arguments or {}
+    if settings.TASKS_EAGER:
+        spec.execute([arguments])
+        return None
+    if key:
+        queued = Task.objects.filter(
+            name=name, key=key, status=Task.QUEUED
+        ).first()
+        if queued is not None:
+            return queued
+    return Task.objects.create(
+        name=name,
+        payload=json.dumps(arguments),
+        key=key,
+        priority=spec.priority if priority is None else priority,
+        max_attempts=spec.max_attempts or settings.TASKS_MAX_ATTEMPTS,
+        run_at=timezone.now() + timedelta(seconds=countdown),
+    )
+
+
+def retry_delay(attempts):
+    """Экспоненциальная задержка перед повтором со случайным разбросом."""
+    delay = min(
+        settings.TASKS_RETRY_BACKOFF * 2 ** (attempts - 1),
+        settings.TASKS_RETRY_MAX,
+    )
+    return delay * random.uniform(0.5, 1.5)
+
+
+def claimable(now):
+    # В очереди и пора выполнять, либо воркер взял задачу и пропал,
+    # а попытки ещё остались
+    return (
+        Q(status=Task.QUEUED, run_at__lte=now)
+        | Q(
+            status=Task.RUNNING,
+            locked_until__lt=now,
+            attempts__lt=F('max_attempts'),
+        )
+    )
+
+
+def abandoned(now):
+    # Воркер пропал на последней попытке: задача, скорее всего, сама
+    # его и уронила, повторять её нельзя
+    return Task.objects.filter(
+        status=Task.RUNNING,
+        locked_until__lt=now,
+        attempts__gte=F('max_attempts'),
+    )
+
+
+class Heartbeat:
+    """Продлевает аренду задач, пока воркер их выполняет.
+
+    Без продления задачу, которая выполняется дольше TASKS_LEASE,
+    забрал бы другой воркер и выполнил её второй раз.
+    """
+
+    def __init__(self, token):
+        self.token = token
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(
+            target=self.run, name='tasks-heartbeat', daemon=True
+        )
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+
+    def run(self):
+        try:
+            while not self.stopped.wait(settings.TASKS_LEASE / 3):
+                try:
+                    self.extend()
+                except Exception:
+                    logger.exception('Аренда задач не продлена')
+        finally:
+            connection.close()
+
+    def extend(self):
+        return write_coordinator.run(
+            lambda: Task.objects.filter(
+                status=Task.RUNNING, locked_by=self.token
+            ).update(
+                locked_until=timezone.now() + timedelta(
+                    seconds=settings.TASKS_LEASE
+                )
+            )
+        )
+
+
+class Worker:
+    def __init__(self, name=None, periodic=True):
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}'
+        # Ставить ли периодические задачи; достаточно одного такого воркера
+        self.periodic = periodic
+        self.stopping = False
+        self.processed = 0
+        self.failed = 0
+        self.next_maintenance = 0
+
+    def claim(self):
+        """Забирает следующую задачу, а для пакетной — пачку таких же."""
+        now = timezone.now()
+        self.fail_abandoned(now)
+        head = (
+            Task.objects.filter(claimable(now))
+            .order_by('-priority', 'run_at', 'id')
+            .values('id', 'name')
+            .first()
+        )
+        if head is None:
+            return []
+        ids = [head['id']]
+        spec = registry.get(head['name'])
+        if spec is not None and spec.batch:
+            ids = list(
+                Task.objects.filter(claimable(now), name=head['name'])
+                .order_by('-priority', 'run_at', 'id')
+                .values_list('id', flat=True)[:settings.TASKS_BATCH_SIZE]
+            )
+        token = f'{self.name}:{uuid.uuid4().hex}'
+        claimed = write_coordinator.run(
+            lambda: Task.objects.filter(claimable(now), id__in=ids).update(
+                status=Task.RUNNING,
+                locked_by=token,
+                locked_until=now + timedelta(seconds=settings.TASKS_LEASE),
+                started=now,
+                attempts=F('attempts') + 1,
+            )
+        )
+        if not claimed:
+            return []
+        return list(Task.objects.filter(locked_by=token).order_by('id'))
+
+    def execute(self, tasks):
+        """Выполняет взятые задачи; возвращает True при успехе."""
+        name = tasks[0].name
+        token = tasks[0].locked_by
+        spec = registry.get(name)
+        try:
+            if spec is None:
+                raise LookupError(f'Задача {name} не зарегистрирована')
+            with Heartbeat(token):
+                spec.execute([item.arguments for item in tasks])
+        except Exception:
+            logger.exception('Задача %s не выполнена', name)
+            error = traceback.format_exc()
+            write_coordinator.run(
+                self.fail, tasks, error, retry=spec is not None
+            )
+            self.failed += len(tasks)
+            return False
+        write_coordinator.run(
+            lambda: Task.objects.filter(locked_by=token).update(
+                status=Task.DONE,
+                finished=timezone.now(),
+                locked_by='',
+                locked_until=None,
+                last_error='',
+            )
+        )
+        self.processed += len(tasks)
+        return True
+
+    def fail(self, tasks, error, retry=True):
+        now = timezone.now()
+        for item in tasks:
+            if retry and item.attempts < item.max_attempts:
+                changes = {
+                    'status': Task.QUEUED,
+                    'run_at': now + timedelta(
+                        seconds=retry_delay(item.attempts)
+                    ),
+                }
+            else:
+                changes = {'status': Task.FAILED, 'finished': now}
+            # Если срок аренды истёк и задачу взял другой воркер,
+            # его результат не трогаем
+            Task.objects.filter(pk=item.pk, locked_by=item.locked_by).update(
+                locked_by='', locked_until=None, last_error=error, **changes
+            )
+
+    def fail_abandoned(self, now):
+        """Помечает ошибкой задачи, исчерпавшие попытки вместе с воркером."""
+        if not abandoned(now).exists():
+            return
+        write_coordinator.run(
+            lambda: abandoned(now).update(
+                status=Task.FAILED,
+                finished=now,
+                locked_by='',
+                locked_until=None,
+                last_error='Воркер пропал во время последней попытки',
+            )
+        )
+
+    def maintain(self):
+        """Ставит периодические задачи и удаляет старые выполненные."""
+        if time.monotonic() < self.next_maintenance:
+            return
+        self.next_maintenance = (
+            time.monotonic() + settings.TASKS_POLL_INTERVAL
+        )
+        now = timezone.now()
+        for spec in registry.values():
+            if spec.every is None or not self.periodic:
+                continue
+            recent = Task.objects.filter(name=spec.name).filter(
+                Q(status__in=(Task.QUEUED, Task.RUNNING))
+                | Q(finished__gte=now - timedelta(seconds=spec.every))
+            )
+            if not recent.exists():
+                write_coordinator.run(enqueue, spec.name, key='periodic')
+        old = list(
+            Task.objects.filter(
+                status=Task.DONE,
+                finished__lt=now - timedelta(seconds=settings.TASKS_KEEP_DONE),
+            ).values_list('id', flat=True)[:500]
+        )
+        if old:
+            write_coordinator.run(
+                lambda: Task.objects.filter(id__in=old).delete()
+            )
+
+    def run_once(self):
+        """Выполняет одну задачу или пачку; False, если очередь пуста."""
+        self.maintain()
+        tasks = self.claim()
+        if not tasks:
+            return False
+        self.execute(tasks)
+        return True
+
+    def run(self, burst=False, max_tasks=None):
+        """Цикл воркера; burst — выйти, когда очередь опустеет."""
+        while not self.stopping:
+            if max_tasks is not None and self.processed >= max_tasks:
+                return
+            if not self.run_once():
+                if burst:
+                    return
+                time.sleep(settings.TASKS_POLL_INTERVAL)
+
+
+def stats(window=3600):
+    """Глубина очереди и задержки выполненных за window секунд задач.
+
+    wait — от времени, когда задачу пора выполнять, до её начала,
+    run — длительность выполнения, обе в секундах.
+    """
+    now = timezone.now()
+    depth = {status: 0 for status, _ in Task.STATUSES}
+    rows = Task.objects.order_by().values('status').annotate(count=Count('id'))
+    for row in rows:
+        depth[row['status']] = row['count']
+    queued = Task.objects.filter(status=Task.QUEUED)
+    ready = queued.filter(run_at__lte=now).order_by('run_at').values_list(
+        'run_at', flat=True
+    ).first()
+    done = Task.objects.filter(
+        status=Task.DONE, finished__gte=now - timedelta(seconds=window)
+    ).values_list('run_at', 'started', 'finished')[:10000]
+    waits, runs = [], []
+    for run_at, started, finished in done:
+        waits.append(max((started - run_at).total_seconds(), 0))
+        runs.append((finished - started).total_seconds())
+    return {
+        'depth': depth,
+        'queued_by_name': dict(
+            queued.order_by().values_list('name')
+            .annotate(count=Count('id'))
+        ),
+        'oldest_ready_age': (
+            (now - ready).total_seconds() if ready is not None else 0.0
+        ),
+        'wait': summarize(waits),
+        'run': summarize(runs),
+    }
+
+
+@metrics.collector(scope='global')
+def collect_tasks():
+    queue = stats()
+    for status, count in queue['depth'].items():
+        yield (
+            'yatube_tasks', 'Задачи в очереди по состоянию',
+            {'status': status}, count,
+        )
+    yield (
+        'yatube_tasks_oldest_ready_seconds',
+        'Сколько ждёт самая старая готовая к выполнению задача',
+        {}, queue['oldest_ready_age'],
+    )
+    for field, quantile in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99)):
+        yield (
+            'yatube_tasks_wait_seconds',
+            'Ожидание задач в очереди за последний час',
+            {'quantile': quantile}, queue['wait'][field],
+        )
@@ -0,0 +1,129 @@
+from datetime import timedelta
+
+from django.db.models import F
+from django.test import TestCase
+from django.utils import timezone
+
+from .models import Task
+from .queue import Heartbeat, Worker, registry, stats, task
+
+calls = []
+
+
+@task(name='tests.record')
+def record(value):
+    calls.append(value)
+
+
+@task(name='tests.record_batch', batch=True)
+def record_batch(arguments):
+    calls.append([kwargs['value'] for kwargs in arguments])
+
+
+@task(name='tests.broken', max_attempts=2)
+def broken():
+    raise ValueError('сломано')
+
+
+class TaskQueueTest(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_worker_runs_tasks_by_priority(self):
+        """Воркер выполняет задачи в порядке приоритета и отмечает их."""
+        record.delay(value='low')
+        record.delay(value='high', priority=5)
+        Worker(periodic=False).run(burst=True)
+        self.assertEqual(calls, ['high', 'low'])
+        self.assertEqual(
+            Task.objects.filter(name='tests.record', status=Task.DONE).count(),
+            2,
+        )
+        self.assertEqual(stats()['depth'][Task.QUEUED], 0)
+
+    def test_task_is_claimed_by_one_worker(self):
+        """Задачу получает только один воркер."""
+        record.delay(value=1)
+        first, second = Worker('first', False), Worker('second', False)
+        self.assertEqual(len(first.claim()), 1)
+        self.assertEqual(second.claim(), [])
+
+    def test_similar_tasks_are_batched(self):
+        """Пакетная задача получает аргументы всех однотипных задач."""
+        for value in range(3):
+            record_batch.delay(value=value)
+        self.assertTrue(Worker(periodic=False).run_once())
+        self.assertEqual(calls, [[0, 1, 2]])
+
+    def test_same_key_is_queued_once(self):
+        """Повторная задача с тем же ключом не создаётся."""
+        record.delay(value=1, key='post-1')
+        record.delay(value=1, key='post-1')
+        self.assertEqual(Task.objects.count(), 1)
+
+    def test_failed_task_is_retried_with_backoff(self):
+        """Упавшая задача повторяется позже, затем помечается ошибкой."""
+        broken.delay()
+        worker = Worker(periodic=False)
+        with self.assertLogs('tasks.queue', 'ERROR'):
+            worker.run_once()
+        queued = Task.objects.get(name='tests.broken')
+        self.assertEqual(queued.status, Task.QUEUED)
+        self.assertEqual(queued.attempts, 1)
+        self.assertGreater(queued.run_at, timezone.now())
+        self.assertIn('сломано', queued.last_error)
+        Task.objects.filter(pk=queued.pk).update(
+            run_at=timezone.now() - timedelta(seconds=1)
+        )
+        with self.assertLogs('tasks.queue', 'ERROR'):
+            worker.run_once()
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Task.FAILED)
+
+    def test_expired_lease_is_reclaimed(self):
+        """Задачу пропавшего воркера после истечения аренды берёт другой."""
+        queued = record.delay(value=1)
+        Worker('lost', False).claim()
+        Task.objects.filter(pk=queued.pk).update(
+            locked_until=timezone.now() - timedelta(seconds=1)
+        )
+        Worker(periodic=False).run(burst=True)
+        self.assertEqual(calls, [1])
+        queued.refresh_from_db()
+        self.assertEqual(queued.attempts, 2)
+
+    def test_abandoned_last_attempt_fails(self):
+        """Задачу, уронившую воркер на последней попытке, не повторяют."""
+        queued = record.delay(value=1)
+        Worker('lost', False).claim()
+        Task.objects.filter(pk=queued.pk).update(
+            attempts=F('max_attempts'),
+            locked_until=timezone.now() - timedelta(seconds=1),
+        )
+        Worker(periodic=False).run(burst=True)
+        self.assertEqual(calls, [])
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Task.FAILED)
+        self.assertEqual(queued.locked_by, '')
+
+    def test_heartbeat_extends_lease(self):
+        """Пульс продлевает аренду только задач своего воркера."""
+        record.delay(value=1)
+        record.delay(value=2)
+        first = Worker('first', False).claim()[0]
+        second = Worker('second', False).claim()[0]
+        expired = timezone.now() - timedelta(seconds=1)
+        Task.objects.update(locked_until=expired)
+        self.assertEqual(Heartbeat(first.locked_by).extend(), 1)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertGreater(first.locked_until, timezone.now())
+        self.assertEqual(second.locked_until, expired)
+
+    def test_periodic_tasks_are_scheduled(self):
+        """Воркер сам ставит периодические задачи."""
+        self.assertIn('core.tasks.purge_sessions', registry)
+        Worker().maintain()
+        self.assertTrue(Task.objects.filter(
+            name='core.tasks.purge_sessions'
+        ).exists())
@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -46,17 +48,25 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
+    'tasks.apps.TasksConfig',
+    'mailer.apps.MailerConfig',
     'sorl.thumbnail',
 ]
 
 MIDDLEWARE = [
+    'core.accesslog.AccessLogMiddleware',
+    'core.metrics.MetricsMiddleware',
+    'core.ratelimit.ConcurrencyLimitMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'core.routers.PrimaryStickinessMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.deadlines.QueryDeadlineMiddleware',
+    'core.ratelimit.RateLimitMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
@@ -81,18 +91,186 @@ TEMPLATES = [
     },
 ]
 
+# Jinja2 — необязательный движок для горячих шаблонов ленты (jinja2/).
+# Подключается, только если пакет jinja2 установлен
+try:
+    import jinja2  # noqa: F401
+except ImportError:
+    JINJA2_AVAILABLE = False
+else:
+    JINJA2_AVAILABLE = True
+    TEMPLATES.append({
+        'BACKEND': 'django.template.backends.jinja2.Jinja2',
+        'DIRS': [os.path.join(BASE_DIR, 'jinja2')],
+        'APP_DIRS': False,
+        'OPTIONS': {
+            'environment': 'core.jinja2.environment',
+            'context_processors': [
+                'django.contrib.auth.context_processors.auth',
+                'core.context_processors.year.year',
+            ],
+        },
+    })
+# Движок шаблонов для отдельных view: {'posts:index': 'jinja2', ...}.
+# Если движок не настроен, страница рендерится движком Django
+TEMPLATE_ENGINE_VIEWS = {}
+# View, страницы которых отдаются потоком: head сразу, карточки по одной
+# (см. core/streaming.py), например {'posts:index', 'posts:profile'}
+STREAMING_VIEWS = set()
+
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
+# Компилировать все шаблоны при старте WSGI-процесса (см. core/templates.py)
+PRECOMPILE_TEMPLATES = False
+
 
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
+# Профиль базы задаётся переменными окружения YATUBE_DB_*.
+# По умолчанию — SQLite рядом с проектом
+DB_ENGINE = os.environ.get('YATUBE_DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get(
+                'YATUBE_DB_NAME', os.path.join(BASE_DIR, 'db.sqlite3')
+            ),
+            # Соединение переиспользуется между запросами
+            'CONN_MAX_AGE': 60,
+        }
+    }
+elif DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            # PostgreSQL с пулом соединений (см. core/backends/postgresql)
+            'ENGINE': 'core.backends.postgresql',
+            'NAME': os.environ.get('YATUBE_DB_NAME', 'yatube'),
+            'USER': os.environ.get('YATUBE_DB_USER', 'yatube'),
+            'PASSWORD': os.environ.get('YATUBE_DB_PASSWORD', ''),
+            'HOST': os.environ.get('YATUBE_DB_HOST', 'localhost'),
+            'PORT': os.environ.get('YATUBE_DB_PORT', '5432'),
+            # Соединение возвращается в пул после каждого запроса
+            'CONN_MAX_AGE': 0,
+            'POOL': {
+                'size': int(os.environ.get('YATUBE_DB_POOL_SIZE', 10)),
+                'timeout': float(os.environ.get('YATUBE_DB_POOL_TIMEOUT', 5)),
+                'health_check': (
+                    os.environ.get('YATUBE_DB_HEALTH_CHECK', '1') == '1'
+                ),
+            },
+        }
+    }
+else:
+    raise ImproperlyConfigured(
+        f'Неизвестный YATUBE_DB_ENGINE: {DB_ENGINE}'
+    )
+
+# Реплики только для чтения. Для проверки на локальной машине достаточно
+# копии SQLite, которую обновляет команда sync_replicas
+DATABASE_REPLICAS = []
+if os.environ.get('YATUBE_REPLICA_DB'):
+    DATABASES['replica'] = {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'NAME': os.environ['YATUBE_REPLICA_DB'],
+        'CONN_MAX_AGE': 60,
+        'TEST': {'MIRROR': 'default'},
     }
+    DATABASE_REPLICAS.append('replica')
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+# Приложения, модели которых можно читать с реплик
+REPLICA_READ_APPS = ('posts', 'auth')
+# После записи клиент столько секунд читает только из primary
+REPLICA_STICKY_COOKIE = 'use_primary'
+REPLICA_STICKY_SECONDS = 10
+
+# PRAGMA для каждого нового соединения с SQLite (см. core/sqlite.py)
+# busy_timeout идёт первым: переключение в WAL само может ждать блокировку
+SQLITE_PRAGMAS = {
+    'busy_timeout': 5000,
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -20000,
+    'temp_store': 'MEMORY',
+}
+# Как часто, в секундах, обновлять статистику через PRAGMA optimize
+SQLITE_OPTIMIZE_INTERVAL = 3600
+
+# Очередь пишущих транзакций для SQLite (см. core/writes.py)
+WRITE_SERIALIZATION = True
+# Файл межпроцессной блокировки; None — рядом с файлом базы
+WRITE_LOCK_FILE = None
+# Повторы при «database is locked» и начальная задержка в секундах
+WRITE_RETRIES = 3
+WRITE_RETRY_BACKOFF = 0.05
+
+# Бюджет времени на SQL в рамках запроса, в секундах (core/deadlines.py).
+# Ключ — имя маршрута; None снимает ограничение
+QUERY_DEADLINE_DEFAULT = 5
+QUERY_DEADLINES = {
+    'posts:profile': 2,
+    'posts:group_list': 2,
+    'posts:index': 2,
+    'admin:posts_post_changelist': 10,
+}
+# Через сколько секунд клиенту предлагается повторить запрос
+QUERY_DEADLINE_RETRY_AFTER = 5
+
+# Лимиты частоты запросов (см. core/ratelimit.py). Ключ — имя маршрута,
+# значение — (запросов, за секунд[, методы]); по умолчанию считается POST.
+# Считается на пользователя, для анонимов — на IP-адрес. Кэш корзин
+# должен быть общим для процессов, иначе лимит умножается на их число;
+# в settings_production это файловый кэш
+RATELIMIT_ENABLED = True
+RATELIMIT_CACHE = 'default'
+# Файл блокировки корзин между процессами; None — только внутри процесса
+RATELIMIT_LOCK_FILE = None
+RATELIMITS = {
+    'posts:post_create': (10, 60),
+    'posts:add_comment': (30, 60),
+    'posts:profile_follow': (60, 60, ('GET', 'POST')),
+    'posts:profile_unfollow': (60, 60, ('GET', 'POST')),
+    'posts:bulk_follow': (10, 60),
+    'users:signup': (5, 600),
 }
+# Заголовок с адресом клиента за прокси, например 'HTTP_X_FORWARDED_FOR';
+# None — брать REMOTE_ADDR
+RATELIMIT_IP_HEADER = None
+# Сколько доверенных прокси дописывают адрес в этот заголовок: клиентом
+# считается адрес на этом месте справа, левее адреса подделываемы
+RATELIMIT_TRUSTED_PROXIES = 1
+# Сколько запросов процесс обрабатывает одновременно; остальные сразу
+# получают 503. None снимает ограничение
+MAX_CONCURRENT_REQUESTS = 64
+CONCURRENCY_RETRY_AFTER = 1
+
+# Число постов в ленте кэшируется, если их не меньше PAGINATOR_COUNT_MIN
+PAGINATOR_COUNT_MIN = 1000
+PAGINATOR_COUNT_TIMEOUT = 60
+
+# Рекомендации «на кого подписаться» (см. posts/recommendations.py)
+# Раз в сколько секунд граф подписок перестраивается из базы целиком
+RECOMMENDATIONS_REFRESH = 600
+RECOMMENDATIONS_LIMIT = 5
+
+# Фоновые задачи в базе (см. tasks/queue.py, воркер — manage.py run_tasks)
+# True — выполнять задачи сразу при постановке, без воркера
+TASKS_EAGER = False
+TASKS_MAX_ATTEMPTS = 5
+# Задержка перед повтором в секундах: удваивается с каждой попыткой
+TASKS_RETRY_BACKOFF = 10
+TASKS_RETRY_MAX = 3600
+# Через сколько секунд задачу пропавшего воркера может взять другой
+TASKS_LEASE = 300
+# Сколько однотипных задач отдаётся пакетной задаче за раз
+TASKS_BATCH_SIZE = 50
+# Пауза воркера при пустой очереди, в секундах
+TASKS_POLL_INTERVAL = 1
+# Сколько секунд хранить выполненные задачи для статистики
+TASKS_KEEP_DONE = 86400
 
 
 # Password validation
@@ -139,8 +317,20 @@ LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
 # LOGOUT_REDIRECT_URL = 'posts:index'
 
-#  подключаем движок filebased.EmailBackend
-EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+# Письма не отправляются из запроса, а ставятся в очередь (mailer/outbox.py)
+EMAIL_BACKEND = 'mailer.backend.EmailBackend'
+#  подключаем движок filebased.EmailBackend для отправки из очереди
+MAILER_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+# Писем в одной пачке и пауза отправителя между проверками, в секундах
+MAILER_BATCH_SIZE = 100
+MAILER_SEND_INTERVAL = 10
+# После стольких неудачных попыток письмо считается недоставленным
+MAILER_MAX_ATTEMPTS = 5
+# Задержка перед повтором в секундах: удваивается с каждой попыткой
+MAILER_RETRY_BACKOFF = 60
+MAILER_RETRY_MAX = 3600
+# Через сколько секунд письма пропавшего отправителя берёт другой
+MAILER_LEASE = 300
 # указываем директорию, в которую будут складываться файлы писем
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
@@ -150,7 +340,52 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 CACHES = {
+    # core.cache.LocMemCache — locmem со счётчиками попаданий для метрик
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': 'core.cache.LocMemCache',
+        'LOCATION': 'default',
+    },
+    # Сессии (см. core/sessions.py); при нескольких процессах кэш должен
+    # быть общим — в settings_production это файловый кэш
+    'sessions': {
+        'BACKEND': 'core.cache.LocMemCache',
+        'LOCATION': 'sessions',
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
 }
+
+# Миниатюры с замером времени для метрик (см. posts/thumbnails.py)
+THUMBNAIL_BACKEND = 'posts.thumbnails.TimedThumbnailBackend'
+
+# Метрики Prometheus на /metrics (см. core/metrics.py)
+# Каталог снимков метрик процессов; None — только метрики этого процесса.
+# При нескольких воркерах (gunicorn и т. п.) каталог нужен общий
+METRICS_DIR = os.environ.get('YATUBE_METRICS_DIR') or None
+# Как часто, в секундах, процесс обновляет свой снимок
+METRICS_FLUSH_INTERVAL = 5
+# Датчики процесса, не обновлявшего снимок дольше, не учитываются
+METRICS_STALE_AFTER = 60
+# Кроме сотрудников, /metrics доступен с этих адресов
+METRICS_ALLOWED_IPS = ('127.0.0.1', '::1')
+METRICS_LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+
+# Журнал запросов JSONL (см. core/accesslog.py); None — не вести.
+# Разбор: manage.py analyze_access_log
+ACCESS_LOG_FILE = os.environ.get('YATUBE_ACCESS_LOG') or None
+# Сколько записей ждут в памяти; лишние отбрасываются, а не тормозят запрос
+ACCESS_LOG_QUEUE_SIZE = 10000
+# Как часто, в секундах, фоновый поток дописывает файл
+ACCESS_LOG_FLUSH_INTERVAL = 1
+
+# Сессии в кэше с отложенной записью в базу (см. core/sessions.py)
+SESSION_ENGINE = 'core.sessions'
+SESSION_CACHE_ALIAS = 'sessions'
+# Как часто, в секундах, записывать изменённые сессии в базу
+SESSION_WRITE_BEHIND_INTERVAL = 5
+# Записывать раньше, если накопилось столько изменённых сессий
+SESSION_WRITE_BEHIND_BATCH = 200
+# Как часто, в секундах, удалять просроченные сессии из базы
+SESSION_PURGE_INTERVAL = 3600
@@ -0,0 +1,111 @@
+"""Настройки для боевого запуска.
+
+DJANGO_SETTINGS_MODULE=yatube.settings_production.
+
+Отличия от settings.py: выключен DEBUG, все шаблоны загружаются через
+кэширующий загрузчик и компилируются при старте процесса, из контекст-
+процессоров убран debug. Кэши, состояние которых должны видеть все
+процессы (сессии, счётчики лимитов), лежат в общем для процессов
+хранилище.
+"""
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, CACHES, TEMPLATES, TEMPLATES_DIR
+
+DEBUG = False
+
+SECRET_KEY = os.environ.get('YATUBE_SECRET_KEY', SECRET_KEY)  # noqa: F405
+
+ALLOWED_HOSTS = os.environ.get(
+    'YATUBE_ALLOWED_HOSTS', ','.join(ALLOWED_HOSTS)  # noqa: F405
+).split(',')
+
+DEBUG_CONTEXT_PROCESSORS = (
+    'django.template.context_processors.debug',
+)
+
+TEMPLATES = [
+    {
+        'BACKEND': TEMPLATES[0]['BACKEND'],
+        'DIRS': [TEMPLATES_DIR],
+        # С явным списком loaders APP_DIRS должен быть выключен
+        'APP_DIRS': False,
+        'OPTIONS': {
+            'debug': False,
+            'context_processors': [
+                processor
+                for processor in TEMPLATES[0]['OPTIONS']['context_processors']
+                if processor not in DEBUG_CONTEXT_PROCESSORS
+            ],
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
+        },
+    },
+    # Остальные движки (Jinja2, если установлен) остаются как есть
+    *TEMPLATES[1:],
+]
+
+# Отладочных middleware (debug_toolbar и т. п.) в проекте нет;
+# если появятся, их нужно перечислить здесь
+DEBUG_MIDDLEWARE = ()
+MIDDLEWARE = [
+    middleware
+    for middleware in MIDDLEWARE  # noqa: F405
+    if middleware not in DEBUG_MIDDLEWARE
+]
+
+# Все шаблоны компилируются при импорте yatube.wsgi
+PRECOMPILE_TEMPLATES = True
+
+# Воркеров несколько, а locmem у каждого свой: сессии в нём не видны
+# другим процессам, а выход из аккаунта не сбрасывает их копии; лимиты
+# частоты запросов в нём умножались бы на число процессов.
+# На одной машине с SQLite хватает файлового кэша; вместо него можно
+# указать memcached и т. п. — лишь бы кэш был общим
+CACHES = {
+    **CACHES,
+    'sessions': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get(
+            'YATUBE_SESSION_CACHE_DIR',
+            os.path.join(BASE_DIR, 'cache', 'sessions'),
+        ),
+        'TIMEOUT': None,
+    },
+    'ratelimit': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get(
+            'YATUBE_RATELIMIT_CACHE_DIR',
+            os.path.join(BASE_DIR, 'cache', 'ratelimit'),
+        ),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+RATELIMIT_CACHE = 'ratelimit'
+# Без блокировки одновременные запросы разных процессов затирают
+# корзины друг друга
+RATELIMIT_LOCK_FILE = os.environ.get(
+    'YATUBE_RATELIMIT_LOCK_FILE',
+    os.path.join(BASE_DIR, 'ratelimit.lock'),
+)
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+    'core.cache.LocMemCache',
+)
+SHARED_CACHE_ALIASES = (SESSION_CACHE_ALIAS, RATELIMIT_CACHE)  # noqa: F405
+for alias in SHARED_CACHE_ALIASES:
+    if CACHES[alias]['BACKEND'] in PROCESS_LOCAL_CACHES:
+        raise ImproperlyConfigured(
+            f'Кэш {alias} должен быть общим для процессов, '
+            f'а не {CACHES[alias]["BACKEND"]}'
+        )
+if not RATELIMIT_LOCK_FILE:
+    raise ImproperlyConfigured('Нужен RATELIMIT_LOCK_FILE')
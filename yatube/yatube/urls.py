@@ -4,6 +4,8 @@ from django.contrib import admin
 # импорт include позволит использовать адреса, включенные в приложения
 from django.urls import include, path
 
+from core.metrics import metrics_view
+
 urlpatterns = [
     # импорт правил из приложения posts
     path('', include('posts.urls', namespace='posts')),
@@ -15,6 +17,7 @@ urlpatterns = [
     # Django пойдёт искать его в django.contrib.auth
     path('auth/', include('django.contrib.auth.urls')),
     path('about/', include('about.urls', namespace='about')),
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 handler404 = 'core.views.page_not_found'
@@ -7,10 +7,20 @@ For more information on this file, see
 https://docs.djangoproject.com/en/2.2/howto/deployment/wsgi/
 """
 
+import atexit
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
 
 application = get_wsgi_application()
+
+if settings.PRECOMPILE_TEMPLATES:
+    from core.templates import precompile_templates
+    precompile_templates()
+
+if settings.SESSION_ENGINE == 'core.sessions':
+    from core.sessions import write_sessions_on_exit
+    atexit.register(write_sessions_on_exit)